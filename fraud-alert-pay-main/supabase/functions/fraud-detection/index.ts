@@ -59,15 +59,13 @@ serve(async (req) => {
       )
     }
     
-    // Enrich transaction with real-time features
-    // In a real system, these would be derived from historical data
-    // For now, we'll simulate them
+    // Behavioural features (hour of day, time since last transaction,
+    // recipient frequency, distance) are derived from the sender's history
+    // by the scoring server's feature store (ml_model/feature_store.py), so
+    // only the account ids and payment time are passed on
     const enrichedTransaction = {
       ...transaction,
-      hour_of_day: new Date().getHours(),
-      time_since_last_tx: Math.random() * 48, // Random hours since last transaction
-      recipient_frequency: Math.random(), // How often this recipient is paid (0-1)
-      distance_to_recipient_km: Math.random() * 50, // Random distance in km
+      date: transaction.date || new Date().toISOString(),
     }
     
     // Call our Go microservice to process the payment
@@ -80,7 +78,7 @@ serve(async (req) => {
     
     const processedTransaction = {
       id: transaction.id || `TX${Math.floor(Math.random() * 900000) + 100000}`,
-      date: transaction.date || new Date().toISOString(),
+      date: enrichedTransaction.date,
       sender_id: transaction.sender_id,
       recipient_id: transaction.recipient_id,
       amount: transaction.amount,
@@ -0,0 +1,432 @@
+# ml_model/async_scoring.py
+"""Asyncio scoring with per-request deadlines, fallbacks and backpressure.
+
+``AsyncScorer.score`` runs a ``ScoringService`` request on a thread pool
+and waits for it only until the request's deadline. A request that
+misses its deadline, arrives when ``max_pending`` requests are already
+queued or running, or fails with an exception is answered with a
+*fallback* result instead, taken from the first of ``fallback`` that
+applies:
+
+* ``last_known``: the most recent model score for the same transaction
+  id, or else for the same ``sender_id``, if it is younger than
+  ``last_known_ttl``;
+* ``rules``: ``rules_score``, a handful of fixed thresholds on the raw
+  features that needs no model;
+* ``review``: no score, ``"status": "review"``, so the caller holds the
+  payment for manual review.
+
+Every result carries ``"fallback"``; fallbacks also carry
+``"fallback_reason"`` (``deadline``, ``overloaded`` or ``error``) and
+``"fallback_source"``. Work that has not started when its deadline
+passes, or whose caller is cancelled, is dropped from the pool; work
+already running finishes in the background and its score becomes the
+last-known score for later requests.
+
+``serve`` exposes the scorer as line-delimited JSON over a Unix socket or
+TCP, the same framing as ``scoring_server.py --unix``. A request may set
+``"timeout_ms"``; otherwise ``--timeout-ms`` applies.
+
+    python async_scoring.py --unix /tmp/fraud-scorer.sock --timeout-ms 500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fraud_detection import FRAUD_SCORE_THRESHOLD, get_models, parse_request
+from metrics import METRICS
+from micro_batcher import MicroBatcher
+from score_cache import ScoreCache, request_transaction_id
+from scoring_server import ScoringService, parse_address
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_ORDER = ("last_known", "rules", "review")
+FALLBACK_REASONS = ("deadline", "overloaded", "error")
+
+# (feature, threshold, fires_above, points); points sum to 100. Thresholds
+# sit between the normal and fraudulent profiles in synthetic_data.
+RULES = (
+    ("amount", 300.0, True, 20),
+    ("hour_of_day", 5.0, False, 15),
+    ("time_since_last_tx", 2.0, False, 15),
+    ("recipient_frequency", 0.02, False, 15),
+    ("distance_to_recipient_km", 100.0, True, 10),
+    ("user_account_age_days", 120.0, False, 10),
+    ("recipient_account_age_days", 60.0, False, 10),
+    ("is_foreign_transaction", 0.5, True, 5),
+)
+
+
+def rules_score(transaction):
+    """Score a transaction from ``RULES`` alone; returns None if no rule could be checked.
+
+    Points for features the transaction does not carry are left out, and
+    the score is scaled up to the rules that could be checked.
+    """
+    points = 0
+    possible = 0
+    for name, threshold, above, weight in RULES:
+        try:
+            value = float(transaction[name])
+        except (KeyError, TypeError, ValueError):
+            continue
+        possible += weight
+        if (value > threshold) if above else (value < threshold):
+            points += weight
+    if not possible:
+        return None
+    return int(round(100 * points / possible))
+
+
+class AsyncScorer:
+    """Scores requests from asyncio code under a deadline, degrading to fallbacks."""
+
+    def __init__(self, service=None, max_workers=8, max_pending=256, timeout=1.0,
+                 fallback=FALLBACK_ORDER, last_known_entries=100000, last_known_ttl=3600.0):
+        unknown = set(fallback) - set(FALLBACK_ORDER)
+        if unknown:
+            raise ValueError(f"Unknown fallback: {', '.join(sorted(unknown))} "
+                             f"(expected some of {', '.join(FALLBACK_ORDER)})")
+        self.service = service if service is not None else ScoringService()
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.fallback = tuple(fallback)
+        self.last_known_entries = last_known_entries
+        self.last_known_ttl = last_known_ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-scorer")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_known = OrderedDict()  # key -> (stored_at, result)
+
+        self.requests = 0
+        self.completed = 0
+        self.late = 0
+        self.cancelled = 0
+        self.outcomes = dict.fromkeys(FALLBACK_REASONS, 0)
+        self.sources = dict.fromkeys(FALLBACK_ORDER, 0)
+
+    async def score(self, input_json, deadline=None, timeout=None):
+        """Score one decoded request (any shape ``parse_request`` accepts).
+
+        ``deadline`` is an absolute ``time.monotonic()`` value; otherwise
+        the request gets ``timeout`` seconds (default ``self.timeout``,
+        None for no limit). Returns the model result, or a fallback result
+        if the deadline passes, the scorer is overloaded or scoring fails.
+        """
+        if deadline is None:
+            timeout = self.timeout if timeout is None else timeout
+            deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self.requests += 1
+            if self._pending >= self.max_pending:
+                overloaded = True
+            else:
+                overloaded = False
+                self._pending += 1
+        if overloaded:
+            return self._fallback(input_json, "overloaded")
+
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            self._finish(None)
+            return self._fallback(input_json, "deadline")
+
+        abandoned = threading.Event()
+        future = self._executor.submit(self.service.score, input_json)
+        future.add_done_callback(lambda future: self._finish(future, input_json, abandoned))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except asyncio.TimeoutError:
+            abandoned.set()
+            return self._fallback(input_json, "deadline")
+        except asyncio.CancelledError:
+            # wait_for has already cancelled the pool work if it had not started
+            with self._lock:
+                self.cancelled += 1
+            raise
+        except Exception as e:
+            logger.error(f"Error scoring request: {str(e)}")
+            return self._fallback(input_json, "error")
+
+        with self._lock:
+            self.completed += 1
+        return dict(result, fallback=False)
+
+    def _finish(self, future, input_json=None, abandoned=None):
+        """Release a pending slot; remember the score of work that completed."""
+        with self._lock:
+            self._pending -= 1
+        if future is None or future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if "error" not in result:
+            if abandoned.is_set():
+                with self._lock:
+                    self.late += 1
+            self._remember(input_json, result)
+
+    def _keys(self, input_json):
+        try:
+            transaction, _, _ = parse_request(input_json)
+            transaction_id = request_transaction_id(input_json, transaction)
+            sender_id = transaction.get("sender_id")
+        except Exception:
+            return {}, []
+        keys = []
+        if transaction_id is not None:
+            keys.append(("id", str(transaction_id)))
+        if sender_id is not None:
+            keys.append(("sender", str(sender_id)))
+        return transaction, keys
+
+    def _remember(self, input_json, result):
+        _, keys = self._keys(input_json)
+        if not keys:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._last_known[key] = (now, result)
+                self._last_known.move_to_end(key)
+            while len(self._last_known) > self.last_known_entries:
+                self._last_known.popitem(last=False)
+
+    def _recall(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._last_known.get(key)
+                if entry is not None and now - entry[0] <= self.last_known_ttl:
+                    return entry[1]
+        return None
+
+    def _fallback(self, input_json, reason):
+        """Build the fallback result for a request that could not be scored in time."""
+        transaction, keys = self._keys(input_json)
+        result = None
+        for source in self.fallback:
+            if source == "last_known":
+                known = self._recall(keys)
+                if known is not None:
+                    result = {
+                        "transaction": transaction,
+                        "fraud_score": known["fraud_score"],
+                        "is_fraud": known["is_fraud"],
+                        "model_type": known.get("model_type"),
+                        "model_version": known.get("model_version"),
+                    }
+            elif source == "rules":
+                fraud_score = rules_score(transaction)
+                if fraud_score is not None:
+                    result = {
+                        "transaction": transaction,
+                        "fraud_score": fraud_score,
+                        "is_fraud": fraud_score > FRAUD_SCORE_THRESHOLD,
+                        "model_type": "rules",
+                        "model_version": None,
+                    }
+            else:
+                result = {"transaction": transaction, "fraud_score": None, "is_fraud": None,
+                          "status": "review"}
+            if result is not None:
+                break
+        if result is None:
+            source = "review"
+            result = {"transaction": transaction, "fraud_score": None, "is_fraud": None, "status": "review"}
+
+        with self._lock:
+            self.outcomes[reason] += 1
+            self.sources[source] += 1
+        METRICS.inc("fraud_async_fallbacks_total", (("reason", reason), ("source", source)))
+        return dict(result, fallback=True, fallback_reason=reason, fallback_source=source)
+
+    def stats(self):
+        """Return request, fallback and queue counters."""
+        with self._lock:
+            return {
+                "max_pending": self.max_pending,
+                "timeout": self.timeout,
+                "fallback": list(self.fallback),
+                "pending": self._pending,
+                "requests": self.requests,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "late": self.late,
+                "deadline_missed": self.outcomes["deadline"],
+                "overloaded": self.outcomes["overloaded"],
+                "errors": self.outcomes["error"],
+                "fallback_sources": dict(self.sources),
+                "last_known_entries": len(self._last_known),
+            }
+
+    def metric_samples(self):
+        """Scorer counters as ``(name, type, labels, value)`` samples for ``METRICS``."""
+        s = self.stats()
+        return [
+            ("fraud_async_pending", "gauge", (), s["pending"]),
+            ("fraud_async_requests_total", "counter", (), s["requests"]),
+            ("fraud_async_completed_total", "counter", (), s["completed"]),
+            ("fraud_async_cancelled_total", "counter", (), s["cancelled"]),
+            ("fraud_async_late_results_total", "counter", (), s["late"]),
+        ]
+
+    def close(self):
+        """Wait for running work and release the thread pool."""
+        self._executor.shutdown(wait=True)
+
+
+async def score_line(scorer, line):
+    """Score one line-delimited JSON request and return the encoded response line."""
+    try:
+        input_json = scorer.service.decode(line)
+        timeout_ms = input_json.get("timeout_ms") if isinstance(input_json, dict) else None
+    except Exception as e:
+        result = {"error": f"Failed to parse input: {str(e)}"}
+    else:
+        timeout = float(timeout_ms) / 1000.0 if timeout_ms is not None else None
+        result = await scorer.score(input_json, timeout=timeout)
+    return (json.dumps(result) + "\n").encode("utf-8")
+
+
+async def handle_connection(scorer, reader, writer, max_in_flight=64):
+    """Score a connection's requests concurrently and answer them in order.
+
+    Reading stops while ``max_in_flight`` responses are outstanding, so a
+    client that pipelines faster than it reads is held back by the socket.
+    """
+    responses = asyncio.Queue(maxsize=max_in_flight)
+
+    async def respond():
+        connected = True
+        while True:
+            task = await responses.get()
+            if task is None:
+                return
+            if not connected:
+                task.cancel()
+                continue
+            try:
+                writer.write(await task)
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+    responder = asyncio.ensure_future(respond())
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                await responses.put(asyncio.ensure_future(score_line(scorer, line)))
+        await responses.put(None)
+        await responder
+    except ConnectionError:
+        pass
+    finally:
+        responder.cancel()
+        writer.close()
+
+
+async def run_servers(scorer, unix_path=None, tcp_address=None, max_in_flight=64):
+    """Serve until SIGINT/SIGTERM."""
+    def handle(reader, writer):
+        return handle_connection(scorer, reader, writer, max_in_flight)
+
+    servers = []
+    if unix_path:
+        # Remove a stale socket left behind by a previous run
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        servers.append(await asyncio.start_unix_server(handle, path=unix_path))
+        logger.info(f"Async scoring server listening on unix://{unix_path}")
+    if tcp_address:
+        host, port = parse_address(tcp_address)
+        servers.append(await asyncio.start_server(handle, host, port))
+        logger.info(f"Async scoring server listening on tcp://{tcp_address}")
+    if not servers:
+        raise ValueError("At least one of unix_path or tcp_address is required")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Shutting down async scoring server")
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
+
+
+def serve(unix_path=None, tcp_address=None, model_dir="model", preload=(), workers=8, max_pending=256,
+          timeout_ms=1000.0, fallback=FALLBACK_ORDER, batch_size=64, batch_wait_ms=2.0,
+          score_cache_entries=10000, score_cache_ttl=300.0, max_in_flight=64):
+    """Run the asyncio endpoints in front of a ``ScoringService``."""
+    batcher = MicroBatcher(batch_size, batch_wait_ms) if batch_size > 0 else None
+    score_cache = ScoreCache(score_cache_entries, score_cache_ttl) if score_cache_entries > 0 else None
+    service = ScoringService(model_dir=model_dir, batcher=batcher, score_cache=score_cache)
+    scorer = AsyncScorer(service, max_workers=workers, max_pending=max_pending,
+                         timeout=timeout_ms / 1000.0 if timeout_ms else None, fallback=fallback)
+    METRICS.add_collector(scorer.metric_samples)
+    for model_type in preload:
+        get_models(model_type)
+
+    try:
+        asyncio.run(run_servers(scorer, unix_path, tcp_address, max_in_flight))
+    finally:
+        scorer.close()
+        if batcher is not None:
+            batcher.close()
+        if score_cache is not None:
+            score_cache.close()
+        logger.info(f"Async scorer stats: {json.dumps(scorer.stats())}")
+
+
+METRICS.describe("fraud_async_fallbacks_total", "Requests answered with a fallback, by reason and source")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio fraud scoring server with per-request deadlines")
+    parser.add_argument("--unix", metavar="PATH", help="serve line-delimited JSON on this Unix socket")
+    parser.add_argument("--tcp", metavar="HOST:PORT", help="serve line-delimited JSON on this TCP address")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--preload", nargs="*", default=["isolation_forest"],
+                        help="model types to load before accepting requests")
+    parser.add_argument("--workers", type=int, default=8, help="threads running model work")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="requests queued or running before new ones get an overloaded fallback")
+    parser.add_argument("--timeout-ms", type=float, default=1000.0,
+                        help="deadline for requests without timeout_ms (0 for none)")
+    parser.add_argument("--fallback", nargs="*", default=list(FALLBACK_ORDER), choices=FALLBACK_ORDER,
+                        help="fallbacks tried in order when a request cannot be scored in time")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="flush a micro-batch at this many requests (0 disables batching)")
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0)
+    parser.add_argument("--score-cache-entries", type=int, default=10000,
+                        help="responses kept for retried requests (0 disables the cache)")
+    parser.add_argument("--score-cache-ttl", type=float, default=300.0)
+    parser.add_argument("--max-in-flight", type=int, default=64,
+                        help="pipelined requests per connection before reading pauses")
+    args = parser.parse_args()
+
+    if not args.unix and not args.tcp:
+        args.tcp = "127.0.0.1:8501"
+
+    serve(args.unix, args.tcp, model_dir=args.model_dir, preload=args.preload, workers=args.workers,
+          max_pending=args.max_pending, timeout_ms=args.timeout_ms, fallback=args.fallback,
+          batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms,
+          score_cache_entries=args.score_cache_entries, score_cache_ttl=args.score_cache_ttl,
+          max_in_flight=args.max_in_flight)
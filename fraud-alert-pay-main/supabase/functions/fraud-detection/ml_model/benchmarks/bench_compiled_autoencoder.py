@@ -0,0 +1,145 @@
+# ml_model/benchmarks/bench_compiled_autoencoder.py
+"""Compare the NumPy autoencoder forward pass against Keras ``model.predict``.
+
+Trains ``build_autoencoder`` briefly on ``generate_synthetic_data``, exports
+it, checks that reconstructions and per-row MSE agree within
+``--tolerance``, then reports latency at batch size 1 and throughput at
+larger batches for both paths. Exits non-zero on a mismatch.
+
+Without TensorFlow installed, ``--numpy-only`` times the NumPy path on
+randomly initialised weights of the same architecture.
+
+It also publishes the export in a scratch model directory whose
+``current`` link points at a forest-only version, as after training both
+models, and checks that ``"latest"`` autoencoder requests are scored by
+the export through ``current_autoencoder``.
+
+    python ml_model/benchmarks/bench_compiled_autoencoder.py --batch-sizes 1 64 10000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compiled_autoencoder import COMPILED_AUTOENCODER_DIR, CompiledAutoencoder, export_autoencoder  # noqa: E402
+from fraud_detection import (generate_synthetic_data, get_registry, score_transactions,  # noqa: E402
+                             update_current_symlink)
+from model_artifacts import save_artifact, scaler_arrays  # noqa: E402
+
+# build_autoencoder's layer widths after the input
+LAYER_WIDTHS = [32, 16, 8, 16, 32]
+
+
+def time_call(fn, X, min_seconds=0.5):
+    """Return the median seconds per call of ``fn(X)`` over repeated runs."""
+    fn(X)  # warm up
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < 5 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def random_autoencoder(scaler, seed=42):
+    """Export-shaped arrays for an untrained autoencoder of the production architecture."""
+    rng = np.random.default_rng(seed)
+    arrays, attrs = scaler_arrays(scaler)
+    widths = [scaler.n_features_in_] + LAYER_WIDTHS + [scaler.n_features_in_]
+    for i, (fan_in, fan_out) in enumerate(zip(widths[:-1], widths[1:])):
+        arrays[f"dense_{i}_kernel"] = rng.normal(0, np.sqrt(2.0 / fan_in), (fan_in, fan_out)).astype(np.float32)
+        arrays[f"dense_{i}_bias"] = rng.normal(0, 0.01, fan_out).astype(np.float32)
+    attrs.update({"activations": ["relu"] * len(LAYER_WIDTHS) + ["linear"], "threshold": 0.05})
+    return arrays, attrs
+
+
+def latest_mismatches(arrays, attrs, df, compiled):
+    """Score ``df`` as ``"latest"`` autoencoder requests; returns rows that disagree with ``compiled``."""
+    with tempfile.TemporaryDirectory() as model_dir:
+        os.makedirs(os.path.join(model_dir, "forest"))
+        update_current_symlink(model_dir, "forest")
+        save_artifact(os.path.join(model_dir, "ae", COMPILED_AUTOENCODER_DIR), "autoencoder", arrays, attrs)
+        update_current_symlink(model_dir, "ae", "autoencoder")
+        get_registry(model_dir)
+        results = score_transactions(df.to_dict(orient="records"), "autoencoder", "latest")
+    expected = np.clip(compiled.reconstruction_error(compiled.scaler.transform(df.to_numpy())) * 100,
+                       0, 100).astype(int)
+    return sum(result.get("fraud_score") != score for result, score in zip(results, expected.tolist()))
+
+
+if __name__ == "__main__":
+    from sklearn.preprocessing import StandardScaler
+
+    parser = argparse.ArgumentParser(description="NumPy vs Keras autoencoder scoring")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 64, 10000])
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--numpy-only", action="store_true",
+                        help="skip Keras and time the NumPy path on random weights")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    df, _ = generate_synthetic_data(n_samples=max(5000, max(args.batch_sizes)))
+    scaler = StandardScaler().fit(df)
+    X = scaler.transform(df)
+
+    keras_model = None
+    if args.numpy_only:
+        arrays, attrs = random_autoencoder(scaler)
+    else:
+        from fraud_detection import build_autoencoder
+        keras_model = build_autoencoder(X.shape[1])
+        keras_model.fit(X, X, epochs=args.epochs, batch_size=32, verbose=0)
+        arrays, attrs = export_autoencoder(keras_model, scaler, 0.05)
+    compiled = CompiledAutoencoder(arrays, attrs)
+
+    report = {"tolerance": args.tolerance, "results": [],
+              "latest_mismatches": latest_mismatches(arrays, attrs, df[:1000], compiled)}
+    if keras_model is not None:
+        keras_recon = keras_model.predict(X, batch_size=8192, verbose=0)
+        numpy_recon = compiled.predict(X)
+        keras_mse = np.mean(np.power(X - keras_recon, 2), axis=1)
+        numpy_mse = compiled.reconstruction_error(X)
+        report["max_abs_reconstruction_diff"] = float(np.abs(keras_recon - numpy_recon).max())
+        report["max_abs_mse_diff"] = float(np.abs(keras_mse - numpy_mse).max())
+        report["fraud_score_mismatches"] = int(np.sum(
+            np.clip(keras_mse * 100, 0, 100).astype(int) != np.clip(numpy_mse * 100, 0, 100).astype(int)
+        ))
+
+    for batch_size in args.batch_sizes:
+        batch = X[:batch_size]
+        result = {"batch_size": batch_size}
+        result["numpy_seconds"] = time_call(compiled.predict, batch)
+        result["numpy_rows_per_second"] = batch_size / result["numpy_seconds"]
+        if keras_model is not None:
+            # Same call the scoring path made before the NumPy engine
+            result["keras_seconds"] = time_call(
+                lambda b: keras_model.predict(b, batch_size=min(len(b), 8192), verbose=0), batch)
+            result["keras_rows_per_second"] = batch_size / result["keras_seconds"]
+            result["speedup"] = result["keras_seconds"] / result["numpy_seconds"]
+        report["results"].append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"\"latest\" autoencoder requests disagreeing with the export: {report['latest_mismatches']}")
+    failed = report["latest_mismatches"] > 0
+    if keras_model is not None:
+        print(f"max |reconstruction diff| = {report['max_abs_reconstruction_diff']:.3g}, "
+              f"max |MSE diff| = {report['max_abs_mse_diff']:.3g} (tolerance {args.tolerance:g}), "
+              f"fraud_score mismatches = {report['fraud_score_mismatches']}")
+        failed = failed or report["max_abs_reconstruction_diff"] > args.tolerance
+    print(f"{'batch':>8} {'numpy ms':>10} {'numpy rows/s':>14} {'keras ms':>10} {'keras rows/s':>14} {'speedup':>8}")
+    for r in report["results"]:
+        keras = (f"{r['keras_seconds'] * 1000:>10.3f} {r['keras_rows_per_second']:>14.0f} {r['speedup']:>7.1f}x"
+                 if "keras_seconds" in r else f"{'-':>10} {'-':>14} {'-':>8}")
+        print(f"{r['batch_size']:>8} {r['numpy_seconds'] * 1000:>10.3f} {r['numpy_rows_per_second']:>14.0f} {keras}")
+    sys.exit(1 if failed else 0)
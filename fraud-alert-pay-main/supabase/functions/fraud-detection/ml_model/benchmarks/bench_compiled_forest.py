@@ -0,0 +1,104 @@
+# ml_model/benchmarks/bench_compiled_forest.py
+"""Compare the NumPy forest engine against sklearn's IsolationForest.
+
+Trains the production configuration on ``generate_synthetic_data``,
+exports it, checks that ``decision_function`` agrees within ``--tolerance``
+and times both engines at several batch sizes. Both engines are also run
+through ``score_feature_array``, which must give the same fraud scores
+and reject a batch with a NaN or infinite row with ``ValueError``. Exits
+non-zero on a mismatch.
+
+    python ml_model/benchmarks/bench_compiled_forest.py --batch-sizes 1 64 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compiled_forest import CompiledIsolationForest, export_isolation_forest  # noqa: E402
+from fraud_detection import generate_synthetic_data, score_feature_array  # noqa: E402
+
+
+def time_call(fn, X, min_seconds=0.5):
+    """Return the median seconds per call of ``fn(X)`` over repeated runs."""
+    fn(X)  # warm up
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < 5 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def engines_agree(model, scaler, compiled, X):
+    """Whether both engines score ``X`` alike and both reject non-finite rows."""
+    engines = ((model, scaler, "sklearn"), (compiled, compiled.scaler, "compiled"))
+    scores = [score_feature_array(X, models=models, cascade=False)[0] for models in engines]
+    if not np.array_equal(*scores):
+        return False
+    for bad in (np.nan, np.inf):
+        X_bad = X.copy()
+        X_bad[len(X) // 2, 0] = bad
+        for models in engines:
+            try:
+                score_feature_array(X_bad, models=models, cascade=False)
+            except ValueError:
+                continue
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    parser = argparse.ArgumentParser(description="NumPy vs sklearn IsolationForest scoring")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 64, 10000])
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    df, _ = generate_synthetic_data(n_samples=max(5000, max(args.batch_sizes)))
+    scaler = StandardScaler().fit(df)
+    X = scaler.transform(df)
+    model = IsolationForest(contamination=0.05, n_estimators=100, max_samples='auto',
+                            random_state=42).fit(X)
+    compiled = CompiledIsolationForest(*export_isolation_forest(model, scaler))
+
+    max_abs_diff = float(np.abs(model.decision_function(X) - compiled.decision_function(X)).max())
+    raw = df.to_numpy(dtype=np.float64)
+    agree = engines_agree(model, scaler, compiled, raw)
+
+    results = []
+    for batch_size in args.batch_sizes:
+        batch = X[:batch_size]
+        sklearn_seconds = time_call(model.decision_function, batch)
+        compiled_seconds = time_call(compiled.decision_function, batch)
+        results.append({
+            "batch_size": batch_size,
+            "sklearn_seconds": sklearn_seconds,
+            "compiled_seconds": compiled_seconds,
+            "sklearn_rows_per_second": batch_size / sklearn_seconds,
+            "compiled_rows_per_second": batch_size / compiled_seconds,
+            "speedup": sklearn_seconds / compiled_seconds,
+        })
+
+    report = {"max_abs_diff": max_abs_diff, "tolerance": args.tolerance, "engines_agree": agree,
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"max |decision_function diff| = {max_abs_diff:.3g} (tolerance {args.tolerance:g})")
+    print(f"score_feature_array scores and non-finite rejection agree: {agree}")
+    print(f"{'batch':>8} {'sklearn ms':>12} {'numpy ms':>12} {'speedup':>8}")
+    for r in results:
+        print(f"{r['batch_size']:>8} {r['sklearn_seconds'] * 1000:>12.3f} "
+              f"{r['compiled_seconds'] * 1000:>12.3f} {r['speedup']:>7.1f}x")
+    sys.exit(0 if max_abs_diff <= args.tolerance and agree else 1)
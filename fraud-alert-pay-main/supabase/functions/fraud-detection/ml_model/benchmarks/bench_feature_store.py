@@ -0,0 +1,86 @@
+# ml_model/benchmarks/bench_feature_store.py
+"""Time feature store enrichment, lookup and snapshot/restore.
+
+Registers ``--accounts`` accounts, replays ``--transactions`` random
+payments through ``FeatureStore.enrich`` and reports the mean cost per
+call, then snapshots and restores the store and checks that lookups match.
+
+    python ml_model/benchmarks/bench_feature_store.py --accounts 100000 --transactions 500000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_store import FeatureStore  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feature store enrichment cost")
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=500000)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    start_time = 1.7e9
+    account_ids = [f"acct-{i}" for i in range(args.accounts)]
+    store = FeatureStore()
+    for account_id, created_at, lat, lon in zip(account_ids,
+                                                start_time - rng.uniform(0, 3e7, args.accounts),
+                                                rng.uniform(-60, 60, args.accounts),
+                                                rng.uniform(-180, 180, args.accounts)):
+        store.register_account(account_id, created_at, lat, lon)
+
+    senders = rng.integers(0, args.accounts, args.transactions).tolist()
+    # Most payments go to a small set of regular recipients per sender
+    recipients = ((np.array(senders) + rng.zipf(2.0, args.transactions)) % args.accounts).tolist()
+    timestamps = (start_time + np.cumsum(rng.exponential(0.5, args.transactions))).tolist()
+    transactions = [{"sender_id": account_ids[s], "recipient_id": account_ids[r], "timestamp": t,
+                     "amount": 10.0}
+                    for s, r, t in zip(senders, recipients, timestamps)]
+
+    begin = time.perf_counter()
+    for transaction in transactions:
+        store.enrich(transaction)
+    enrich_seconds = (time.perf_counter() - begin) / args.transactions
+
+    begin = time.perf_counter()
+    for transaction in transactions[:100000]:
+        store.lookup(transaction["sender_id"], transaction["recipient_id"], transaction["timestamp"])
+    lookup_seconds = (time.perf_counter() - begin) / min(100000, args.transactions)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "features.npz")
+        begin = time.perf_counter()
+        store.snapshot(path)
+        snapshot_seconds = time.perf_counter() - begin
+        snapshot_bytes = os.path.getsize(path)
+        begin = time.perf_counter()
+        restored = FeatureStore.restore(path)
+        restore_seconds = time.perf_counter() - begin
+
+    now = timestamps[-1] + 60
+    mismatches = sum(
+        store.lookup(t["sender_id"], t["recipient_id"], now) != restored.lookup(t["sender_id"], t["recipient_id"], now)
+        for t in transactions[:10000]
+    )
+
+    report = dict(store.stats(), enrich_microseconds=enrich_seconds * 1e6,
+                  lookup_microseconds=lookup_seconds * 1e6, snapshot_seconds=snapshot_seconds,
+                  snapshot_bytes=snapshot_bytes, restore_seconds=restore_seconds,
+                  restore_mismatches=mismatches)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{report['accounts']} accounts, {report['pairs']} pairs")
+    print(f"enrich {report['enrich_microseconds']:.1f} us/tx, lookup {report['lookup_microseconds']:.1f} us/tx")
+    print(f"snapshot {snapshot_seconds:.2f}s ({snapshot_bytes / 1e6:.1f} MB), restore {restore_seconds:.2f}s, "
+          f"mismatches after restore: {mismatches}")
+    sys.exit(1 if mismatches else 0)
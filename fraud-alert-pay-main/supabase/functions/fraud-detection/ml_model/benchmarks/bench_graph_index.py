@@ -0,0 +1,90 @@
+# ml_model/benchmarks/bench_graph_index.py
+"""Time graph index updates, lookups and snapshot/restore at scale.
+
+Replays ``--payments`` random payments among ``--accounts`` accounts
+through ``GraphIndex.record`` (most senders pay a few regular recipients,
+so repeat payments along an edge are common), then times ``lookup`` on
+random pairs with the graph at full size, compaction, and a
+snapshot/restore round trip, and checks that lookups match after restore.
+Account ids are integers here to keep the driver's own memory down.
+
+    python ml_model/benchmarks/bench_graph_index.py --accounts 2000000 --payments 20000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph_index import GraphIndex  # noqa: E402
+
+CHUNK = 1000000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Graph index update and lookup cost")
+    parser.add_argument("--accounts", type=int, default=2000000)
+    parser.add_argument("--payments", type=int, default=20000000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    graph = GraphIndex()
+    record_seconds = 0.0
+    for start in range(0, args.payments, CHUNK):
+        n = min(CHUNK, args.payments - start)
+        senders = rng.integers(0, args.accounts, n)
+        recipients = ((senders + rng.zipf(1.5, n)) % args.accounts).tolist()
+        ages = rng.exponential(300, n).tolist()
+        begin = time.perf_counter()
+        for sender, recipient, age in zip(senders.tolist(), recipients, ages):
+            graph.record(sender, recipient, age, None)
+        record_seconds += time.perf_counter() - begin
+
+    pairs = rng.integers(0, args.accounts, (args.lookups, 2)).tolist()
+    latencies = np.empty(len(pairs))
+    for i, (sender, recipient) in enumerate(pairs):
+        begin = time.perf_counter()
+        graph.lookup(sender, recipient)
+        latencies[i] = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    graph.compact()
+    compact_seconds = time.perf_counter() - begin
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "graph.npz")
+        begin = time.perf_counter()
+        graph.snapshot(path)
+        snapshot_seconds = time.perf_counter() - begin
+        snapshot_bytes = os.path.getsize(path)
+        begin = time.perf_counter()
+        restored = GraphIndex.restore(path)
+        restore_seconds = time.perf_counter() - begin
+
+    mismatches = sum(graph.lookup(s, r) != restored.lookup(s, r) for s, r in pairs[:10000])
+
+    stats = graph.stats()
+    report = dict(stats, records_per_second=args.payments / record_seconds,
+                  record_microseconds=record_seconds / args.payments * 1e6,
+                  lookup_p50_microseconds=float(np.percentile(latencies, 50)) * 1e6,
+                  lookup_p99_microseconds=float(np.percentile(latencies, 99)) * 1e6,
+                  compact_seconds=compact_seconds, snapshot_seconds=snapshot_seconds,
+                  snapshot_bytes=snapshot_bytes, restore_seconds=restore_seconds,
+                  restore_mismatches=mismatches)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{stats['accounts']} accounts, {stats['edges']} edges from {args.payments} payments, "
+          f"{stats['bytes'] / 1e6:.0f} MB of arrays, {stats['compactions']} compactions")
+    print(f"record {report['record_microseconds']:.1f} us ({report['records_per_second']:,.0f}/s), "
+          f"lookup p50 {report['lookup_p50_microseconds']:.1f} us, p99 {report['lookup_p99_microseconds']:.1f} us")
+    print(f"final compaction {compact_seconds:.2f}s, snapshot {snapshot_seconds:.2f}s "
+          f"({snapshot_bytes / 1e6:.0f} MB), restore {restore_seconds:.2f}s, mismatches after restore: {mismatches}")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,105 @@
+# ml_model/benchmarks/bench_online_refresh.py
+"""Compare an online refresh against a full retrain after drift.
+
+Trains a base forest, then draws a drifted stream (amounts scaled by
+``--drift``) and, for each ``--trees`` count K, feeds ``--window`` rows
+to an ``OnlineRefresher`` and refreshes K trees. A full
+``train_isolation_forest`` on the same rows is the baseline. Every model
+is scored on a held-out drifted sample. It reports the wall time of each
+refresh (and separately of feeding the stream, which in production is
+spread over the refresh interval) and its F1 on the fraud class.
+
+First it checks that a refresh replacing no trees leaves the base
+forest's scores unchanged while the scaler moves: the threshold remap
+must be exact. It exits non-zero if that fails.
+
+    python ml_model/benchmarks/bench_online_refresh.py --trees 5 10 25 --window 50000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fraud_detection import FEATURE_NAMES, generate_synthetic_data, load_model, train_isolation_forest  # noqa: E402
+from online_refresh import OnlineRefresher  # noqa: E402
+
+
+def drifted(n_samples, drift, seed):
+    np.random.seed(seed)
+    df, labels = generate_synthetic_data(n_samples=n_samples)
+    X = df[FEATURE_NAMES].to_numpy(dtype=np.float64)
+    X[:, FEATURE_NAMES.index("amount")] *= drift
+    return X, labels
+
+
+def fraud_f1(model_dir, version, X, y):
+    from sklearn.metrics import f1_score
+
+    model, scaler, _ = load_model(model_version=version, model_dir=model_dir)
+    return float(f1_score(y, model.predict(scaler.transform(X)) == -1))
+
+
+if __name__ == "__main__":
+    from sklearn.model_selection import train_test_split
+
+    parser = argparse.ArgumentParser(description="Online refresh vs full retrain")
+    parser.add_argument("--trees", type=int, nargs="+", default=[5, 10, 25])
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--window", type=int, default=50000)
+    parser.add_argument("--drift", type=float, default=2.0, help="factor applied to amounts after the base model")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    X_stream, y_stream = drifted(args.window, args.drift, seed=1)
+    X_eval, y_eval = drifted(20000, args.drift, seed=2)
+    results = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        train_isolation_forest(model_dir=model_dir, model_version="base", n_estimators=args.n_estimators)
+        base_f1 = fraud_f1(model_dir, "base", X_eval, y_eval)
+
+        refresher = OnlineRefresher(model_dir, "base", trees_per_refresh=0, window_size=args.window)
+        refresher.update(X_stream, y_stream)
+        version = refresher.refresh("remap_only", set_current=False)
+        base, base_scaler, _ = load_model(model_version="base", model_dir=model_dir)
+        remapped, remapped_scaler, _ = load_model(model_version=version, model_dir=model_dir)
+        remap_diff = float(np.abs(base.score_samples(base_scaler.transform(X_eval))
+                                  - remapped.score_samples(remapped_scaler.transform(X_eval))).max())
+        scaler_shift = float(np.abs(remapped_scaler.mean_ - base_scaler.mean_).max())
+
+        for trees in args.trees:
+            refresher = OnlineRefresher(model_dir, "base", trees_per_refresh=trees, window_size=args.window)
+            begin = time.perf_counter()
+            refresher.update(X_stream, y_stream)
+            update_seconds = time.perf_counter() - begin
+            version = refresher.refresh(f"refresh_{trees}", set_current=False)
+            results.append({"mode": f"refresh {trees} trees", "seconds": time.perf_counter() - begin - update_seconds,
+                            "update_seconds": update_seconds, "f1": fraud_f1(model_dir, version, X_eval, y_eval)})
+
+        begin = time.perf_counter()
+        data = (*train_test_split(X_stream, y_stream, test_size=0.3, random_state=42, stratify=y_stream),
+                FEATURE_NAMES)
+        train_isolation_forest(model_dir=model_dir, model_version="full", n_estimators=args.n_estimators,
+                               data=data, set_current=False)
+        results.append({"mode": f"full retrain {args.n_estimators} trees", "seconds": time.perf_counter() - begin,
+                        "f1": fraud_f1(model_dir, "full", X_eval, y_eval)})
+
+    report = {"base_f1": base_f1, "remap_max_abs_diff": remap_diff, "scaler_mean_shift": scaler_shift,
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"base model F1 on drifted data {base_f1:.3f}")
+    print(f"threshold remap: scaler mean moved by up to {scaler_shift:.2f}, score difference {remap_diff:.2e}")
+    for r in results:
+        update = f" (+{r['update_seconds']:.2f}s feeding the stream)" if "update_seconds" in r else ""
+        print(f"{r['mode']:<26} {r['seconds']:>7.2f}s  F1 {r['f1']:.3f}{update}")
+    sys.exit(1 if remap_diff > 1e-9 else 0)
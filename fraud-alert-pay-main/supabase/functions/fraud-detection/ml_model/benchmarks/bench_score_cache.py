@@ -0,0 +1,85 @@
+# ml_model/benchmarks/bench_score_cache.py
+"""Time retried requests with and without the score cache.
+
+Trains a forest into a scratch directory, scores ``--transactions``
+distinct requests through a ``ScoringService`` and then replays them as
+retries, once with an in-memory cache and once backed by SQLite. Reports
+the mean cost per request for first attempts and retries, and exits
+non-zero if any retry returns a different ``fraud_score``.
+
+    python ml_model/benchmarks/bench_score_cache.py --transactions 5000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fraud_detection import generate_synthetic_data, train_isolation_forest  # noqa: E402
+from score_cache import ScoreCache  # noqa: E402
+from scoring_server import ScoringService  # noqa: E402
+
+
+def replay(service, requests):
+    """Score ``requests`` one at a time; returns ``(seconds_per_request, scores)``."""
+    start = time.perf_counter()
+    scores = [service.score(request).get("fraud_score") for request in requests]
+    return (time.perf_counter() - start) / len(requests), scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score cache cost for retried requests")
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    df, _ = generate_synthetic_data(n_samples=args.transactions)
+    requests = [{"transaction_id": f"tx-{i}", "transaction": transaction}
+                for i, transaction in enumerate(df.to_dict(orient="records"))]
+
+    report = {}
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = os.path.join(tmp, "model")
+        train_isolation_forest(model_dir=model_dir, model_version="bench")
+
+        uncached_seconds, expected = replay(ScoringService(model_dir), requests)
+        report["uncached_microseconds"] = uncached_seconds * 1e6
+
+        for name, path in (("memory", None), ("sqlite", os.path.join(tmp, "scores.sqlite"))):
+            score_cache = ScoreCache(max_entries=len(requests), path=path)
+            service = ScoringService(model_dir, score_cache=score_cache)
+            first_seconds, first_scores = replay(service, requests)
+            retry_seconds, retry_scores = replay(service, requests)
+            report[f"{name}_first_microseconds"] = first_seconds * 1e6
+            report[f"{name}_retry_microseconds"] = retry_seconds * 1e6
+            report[f"{name}_hits"] = score_cache.stats()["hits"]
+            mismatches += sum(a != b for a, b in zip(expected, first_scores))
+            mismatches += sum(a != b for a, b in zip(expected, retry_scores))
+
+            if path is not None:
+                # A fresh process sharing the file answers from disk
+                score_cache.close()
+                score_cache = ScoreCache(max_entries=len(requests), path=path)
+                disk_seconds, disk_scores = replay(ScoringService(model_dir, score_cache=score_cache), requests)
+                report["sqlite_reopened_retry_microseconds"] = disk_seconds * 1e6
+                mismatches += sum(a != b for a, b in zip(expected, disk_scores))
+                score_cache.close()
+    report["mismatches"] = mismatches
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"uncached {report['uncached_microseconds']:.1f} us/request")
+    for name in ("memory", "sqlite"):
+        print(f"{name:>7}: first {report[f'{name}_first_microseconds']:.1f} us/request, "
+              f"retry {report[f'{name}_retry_microseconds']:.1f} us/request")
+    print(f"sqlite retry after reopen {report['sqlite_reopened_retry_microseconds']:.1f} us/request")
+    print(f"score mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
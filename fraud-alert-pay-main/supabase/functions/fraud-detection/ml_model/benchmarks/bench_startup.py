@@ -0,0 +1,152 @@
+# ml_model/benchmarks/bench_startup.py
+"""Cold-start benchmark for ``predict.py``.
+
+Spawns ``predict.py`` the way ``payment_service.go`` does, once per run,
+and records wall time and peak RSS for each model type. It also checks
+which heavy libraries the isolation-forest path imports. Exits non-zero
+when a budget is exceeded or TensorFlow shows up on the isolation-forest
+path, so it can gate CI.
+
+Run from the service directory (where ``model/`` lives):
+
+    python ml_model/benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ML_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICT_SCRIPT = os.path.join(ML_MODEL_DIR, "predict.py")
+
+SAMPLE_TRANSACTION = {
+    "amount": 30.0,
+    "hour_of_day": 14.0,
+    "time_since_last_tx": 28.0,
+    "recipient_frequency": 0.2,
+    "distance_to_recipient_km": 5.0,
+    "user_account_age_days": 400.0,
+    "recipient_account_age_days": 350.0,
+    "is_foreign_transaction": 0,
+}
+
+HEAVY_MODULES = ["tensorflow", "keras", "pandas", "sklearn", "scipy"]
+
+# Scores one transaction in-process and reports which heavy modules it pulled in
+IMPORT_PROBE = """
+import json, sys
+sys.path.insert(0, {ml_model_dir!r})
+from fraud_detection import score_transaction
+result = score_transaction({transaction!r}, {model_type!r})
+loaded = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"loaded": loaded, "error": result.get("error")}}))
+"""
+
+
+def run_predict(model_type, cwd):
+    """Run predict.py once; return (wall seconds, peak RSS MB, response)."""
+    payload = json.dumps({"transaction": SAMPLE_TRANSACTION, "model_type": model_type})
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, PREDICT_SCRIPT], cwd=cwd,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    proc.stdin.write(payload.encode("utf-8"))
+    proc.stdin.close()
+    stdout = proc.stdout.read()
+    # wait4 gives this child's own rusage rather than the max over all children
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    return wall, rusage.ru_maxrss / 1024.0, stdout.decode("utf-8", "replace").strip()
+
+
+def probe_imports(model_type, cwd):
+    """Return the heavy modules imported while scoring one transaction."""
+    code = IMPORT_PROBE.format(ml_model_dir=ML_MODEL_DIR, transaction=SAMPLE_TRANSACTION,
+                               model_type=model_type, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+    try:
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {"loaded": None, "error": out.stderr.strip().splitlines()[-1:] or "probe failed"}
+
+
+def benchmark(model_type, runs, cwd):
+    walls = []
+    rss = []
+    last_response = None
+    for _ in range(runs):
+        wall, peak_rss, last_response = run_predict(model_type, cwd)
+        walls.append(wall)
+        rss.append(peak_rss)
+    return {
+        "model_type": model_type,
+        "runs": runs,
+        "wall_seconds_median": statistics.median(walls),
+        "wall_seconds_max": max(walls),
+        "peak_rss_mb_median": statistics.median(rss),
+        "peak_rss_mb_max": max(rss),
+        "imports": probe_imports(model_type, cwd),
+        "sample_response": last_response,
+    }
+
+
+def check_budget(result, max_seconds, max_rss_mb, forbidden_modules=(), require_success=False):
+    """Return a list of budget violations for one model type."""
+    failures = []
+    if require_success and '"error"' in (result["sample_response"] or '"error"'):
+        failures.append(f"{result['model_type']}: predict.py failed: {result['sample_response']}")
+    if max_seconds is not None and result["wall_seconds_median"] > max_seconds:
+        failures.append(f"{result['model_type']}: median wall time "
+                        f"{result['wall_seconds_median']:.3f}s > {max_seconds:.3f}s")
+    if max_rss_mb is not None and result["peak_rss_mb_median"] > max_rss_mb:
+        failures.append(f"{result['model_type']}: median peak RSS "
+                        f"{result['peak_rss_mb_median']:.1f}MB > {max_rss_mb:.1f}MB")
+    loaded = result["imports"].get("loaded") or []
+    for module in forbidden_modules:
+        if module in loaded:
+            failures.append(f"{result['model_type']}: imported {module}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for predict.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cwd", default=".", help="directory containing model/")
+    parser.add_argument("--model-types", nargs="*", default=["isolation_forest", "autoencoder"])
+    parser.add_argument("--max-seconds", type=float, default=3.0,
+                        help="isolation_forest median wall time budget")
+    parser.add_argument("--max-rss-mb", type=float, default=250.0,
+                        help="isolation_forest median peak RSS budget")
+    parser.add_argument("--autoencoder-max-seconds", type=float, default=None)
+    parser.add_argument("--autoencoder-max-rss-mb", type=float, default=None)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = [benchmark(model_type, args.runs, args.cwd) for model_type in args.model_types]
+
+    failures = []
+    for result in results:
+        if result["model_type"] == "autoencoder":
+            failures += check_budget(result, args.autoencoder_max_seconds, args.autoencoder_max_rss_mb)
+        else:
+            failures += check_budget(result, args.max_seconds, args.max_rss_mb,
+                                     forbidden_modules=("tensorflow", "keras"), require_success=True)
+
+    report = {"results": results, "failures": failures}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for result in results:
+        print(f"{result['model_type']:>17}: wall {result['wall_seconds_median'] * 1000:8.1f} ms "
+              f"(max {result['wall_seconds_max'] * 1000:.1f})  "
+              f"peak RSS {result['peak_rss_mb_median']:7.1f} MB  "
+              f"heavy imports {result['imports'].get('loaded')}")
+    for failure in failures:
+        print(f"BUDGET EXCEEDED: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,272 @@
+# ml_model/benchmarks/bench_suite.py
+"""Benchmark suite for scoring, model loading and training.
+
+Measures, for each model type that can be built here:
+
+* ``score_transaction`` latency: cold (first call in a fresh process,
+  after ``load_model``) and warm (median over repeated calls);
+* ``score_transactions`` throughput at several batch sizes;
+* ``load_model`` wall time and the RSS it adds, in a fresh process;
+* ``train_isolation_forest``/``train_autoencoder`` wall time at several
+  dataset sizes.
+
+Models are trained into a scratch directory from ``generate_synthetic_data``
+with its fixed seed, unless ``--model-dir`` points at existing ones, so two
+runs on the same code and host score the same models. Autoencoder cases
+are skipped when TensorFlow is not installed.
+
+Results are written as JSON (``--output``). With ``--baseline`` every
+metric is compared with a stored result and the run exits non-zero when
+one regresses by more than ``--threshold``.
+
+    python ml_model/benchmarks/bench_suite.py --output bench.json
+    python ml_model/benchmarks/bench_suite.py --baseline bench.json --threshold 0.15
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ML_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_MODEL_DIR)
+
+from fraud_detection import (generate_synthetic_data, get_models, get_registry,  # noqa: E402
+                             score_transaction, score_transactions, train_autoencoder,
+                             train_isolation_forest)
+
+SAMPLE_TRANSACTION = {
+    "amount": 30.0,
+    "hour_of_day": 14.0,
+    "time_since_last_tx": 28.0,
+    "recipient_frequency": 0.2,
+    "distance_to_recipient_km": 5.0,
+    "user_account_age_days": 400.0,
+    "recipient_account_age_days": 350.0,
+    "is_foreign_transaction": 0,
+}
+
+# Loads one model and scores one transaction in a fresh interpreter
+COLD_PROBE = """
+import json, os, sys, time
+sys.path.insert(0, {ml_model_dir!r})
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+from fraud_detection import load_model, score_transaction
+rss_before = rss_mb()
+start = time.perf_counter()
+models = load_model({model_type!r}, "latest", {model_dir!r})
+loaded = time.perf_counter()
+rss_loaded = rss_mb()
+result = score_transaction({transaction!r}, {model_type!r}, models=models)
+scored = time.perf_counter()
+print(json.dumps({{
+    "load_seconds": loaded - start,
+    "load_rss_mb": rss_loaded - rss_before,
+    "first_score_rss_mb": rss_mb() - rss_before,
+    "cold_score_seconds": scored - loaded,
+    "error": result.get("error"),
+}}))
+"""
+
+
+def metric(value, unit, better="lower"):
+    return {"value": float(value), "unit": unit, "better": better}
+
+
+def time_call(fn, min_seconds=0.5, min_runs=5):
+    """Return the median seconds per call of ``fn()`` over repeated runs."""
+    fn()  # warm up
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def training_data(n_samples):
+    """Fixed-seed synthetic data split the way the trainers split it."""
+    from sklearn.model_selection import train_test_split
+
+    df, labels = generate_synthetic_data(n_samples=n_samples)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df.to_numpy(dtype=np.float64), labels, test_size=0.3, random_state=42, stratify=labels
+    )
+    return X_train, X_test, y_train, y_test, list(df.columns)
+
+
+def train(model_type, model_dir, model_version, data=None, set_current=False):
+    if model_type == "autoencoder":
+        return train_autoencoder(model_dir=model_dir, model_version=model_version, data=data,
+                                 set_current=set_current)
+    return train_isolation_forest(model_dir=model_dir, model_version=model_version, data=data,
+                                  set_current=set_current)
+
+
+def bench_cold(model_type, model_dir, runs):
+    """Median load time, added RSS and first-score latency over fresh processes."""
+    code = COLD_PROBE.format(ml_model_dir=ML_MODEL_DIR, model_type=model_type,
+                             model_dir=os.path.abspath(model_dir), transaction=SAMPLE_TRANSACTION)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        lines = out.stdout.strip().splitlines()
+        if out.returncode != 0 or not lines:
+            raise RuntimeError(f"cold probe failed: {out.stderr.strip()[-500:]}")
+        sample = json.loads(lines[-1])
+        if sample["error"]:
+            raise RuntimeError(f"cold probe failed to score: {sample['error']}")
+        samples.append(sample)
+
+    def median(key):
+        return statistics.median(sample[key] for sample in samples)
+
+    return {
+        f"load.{model_type}.seconds": metric(median("load_seconds"), "s"),
+        f"load.{model_type}.rss_mb": metric(median("load_rss_mb"), "MB"),
+        f"load.{model_type}.first_score_rss_mb": metric(median("first_score_rss_mb"), "MB"),
+        f"score.{model_type}.cold_ms": metric(median("cold_score_seconds") * 1e3, "ms"),
+    }
+
+
+def bench_warm(model_type, batch_sizes, min_seconds=0.5):
+    """Warm single-transaction latency and batch throughput in this process."""
+    models = get_models(model_type)
+    results = {
+        f"score.{model_type}.warm_us": metric(
+            time_call(lambda: score_transaction(SAMPLE_TRANSACTION, model_type, models=models),
+                      min_seconds) * 1e6, "us"),
+    }
+    df, _ = generate_synthetic_data(n_samples=max(batch_sizes))
+    X = df.to_numpy(dtype=np.float64)
+    for batch_size in batch_sizes:
+        batch = X[:batch_size]
+        seconds = time_call(lambda: score_transactions(batch, model_type, models=models), min_seconds)
+        results[f"batch.{model_type}.rows_per_s.{batch_size}"] = metric(batch_size / seconds, "rows/s", "higher")
+    return results
+
+
+def bench_training(model_type, sizes, repeats):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_train_") as model_dir:
+        for n_samples in sizes:
+            data = training_data(n_samples)
+            timings = []
+            for i in range(repeats):
+                start = time.perf_counter()
+                train(model_type, model_dir, f"{n_samples}_{i}", data=data)
+                timings.append(time.perf_counter() - start)
+            results[f"train.{model_type}.seconds.{n_samples}"] = metric(statistics.median(timings), "s")
+    return results
+
+
+def environment():
+    versions = {}
+    for name in ("numpy", "sklearn", "pandas", "tensorflow"):
+        # Only report what was imported; importing TensorFlow just for its version is slow
+        module = sys.modules.get(name)
+        versions[name] = getattr(module, "__version__", None) if module else None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return ``(rows, regressions)`` comparing results with a baseline."""
+    rows = []
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            rows.append((name, current, None, None))
+            continue
+        ratio = current["value"] / previous["value"]
+        # Positive change means worse, whichever direction is better
+        change = ratio - 1 if current["better"] == "lower" else 1 - ratio
+        rows.append((name, current, previous, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scoring, loading and training benchmark suite")
+    parser.add_argument("--model-dir", help="score existing models here instead of training fresh ones")
+    parser.add_argument("--model-types", nargs="*", default=["isolation_forest", "autoencoder"])
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[1, 64, 1024, 10000])
+    parser.add_argument("--train-sizes", type=int, nargs="*", default=[5000, 20000])
+    parser.add_argument("--train-repeats", type=int, default=1)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--min-seconds", type=float, default=0.5,
+                        help="minimum timing window per warm measurement; raise it on noisy hosts")
+    parser.add_argument("--skip-training", action="store_true")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative regression per metric (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    model_types = list(args.model_types)
+    skipped = {}
+    if "autoencoder" in model_types and importlib.util.find_spec("tensorflow") is None:
+        model_types.remove("autoencoder")
+        skipped["autoencoder"] = "tensorflow is not installed"
+
+    scratch = None
+    model_dir = args.model_dir
+    if model_dir is None:
+        scratch = tempfile.TemporaryDirectory(prefix="bench_models_")
+        model_dir = scratch.name
+        # Both models share one version so "latest" resolves to it for either type
+        for model_type in model_types:
+            train(model_type, model_dir, "bench", set_current=True)
+    get_registry(model_dir)
+
+    results = {}
+    for model_type in model_types:
+        results.update(bench_cold(model_type, model_dir, args.cold_runs))
+        results.update(bench_warm(model_type, args.batch_sizes, args.min_seconds))
+        if not args.skip_training:
+            results.update(bench_training(model_type, args.train_sizes, args.train_repeats))
+    if scratch is not None:
+        scratch.cleanup()
+
+    report = {"environment": environment(), "skipped": skipped, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f"{'metric':<48} {'current':>14} {'baseline':>14} {'change':>8}")
+        for name, current, previous, change in rows:
+            base = f"{previous['value']:>14.4g}" if previous else f"{'-':>14}"
+            delta = f"{change * 100:>+7.1f}%" if change is not None else f"{'new':>8}"
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<48} {current['value']:>14.4g} {base} {delta}{flag}")
+    else:
+        for name, current in results.items():
+            print(f"{name:<48} {current['value']:>14.4g} {current['unit']}")
+    for model_type, reason in skipped.items():
+        print(f"skipped {model_type}: {reason}")
+    sys.exit(1 if regressions else 0)
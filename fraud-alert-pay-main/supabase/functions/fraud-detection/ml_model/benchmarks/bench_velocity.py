@@ -0,0 +1,109 @@
+# ml_model/benchmarks/bench_velocity.py
+"""Time velocity aggregate updates and lookups at millions of active keys.
+
+Fills a ``VelocityAggregator`` with ``--keys`` accounts, each one active
+as both a sender and a recipient, then replays ``--transactions`` random
+payments among them over a simulated day. It reports batched
+(``record_many``/``lookup_many``, ``--batch`` payments per call) and
+single-payment (``record``/``lookup``) rates, plus the memory per key,
+and checks that the batched and single-payment lookups agree.
+
+    python ml_model/benchmarks/bench_velocity.py --keys 1000000 --transactions 2000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from velocity import BUCKETS, VELOCITY_FEATURES, VelocityAggregator  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Velocity aggregate update and lookup rates")
+    parser.add_argument("--keys", type=int, default=1000000)
+    parser.add_argument("--transactions", type=int, default=2000000)
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--single", type=int, default=100000,
+                        help="payments replayed one at a time through record/lookup")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    start_time = 1.7e9
+    account_ids = [f"acct-{i}" for i in range(args.keys)]
+    aggregator = VelocityAggregator(capacity=args.keys)
+
+    # Make every account active on both sides before timing
+    begin = time.perf_counter()
+    for i in range(0, args.keys, args.batch):
+        batch = account_ids[i:i + args.batch]
+        next_ids = [account_ids[(j + 1) % args.keys] for j in range(i, i + len(batch))]
+        aggregator.record_many(batch, next_ids, np.full(len(batch), 10.0), np.full(len(batch), start_time))
+    fill_seconds = time.perf_counter() - begin
+
+    senders = rng.integers(0, args.keys, args.transactions)
+    recipients = (senders + rng.zipf(2.0, args.transactions)) % args.keys
+    timestamps = start_time + np.sort(rng.uniform(0, 86400, args.transactions))
+    amounts = rng.gamma(2.0, 20, args.transactions)
+    sender_ids = [account_ids[i] for i in senders.tolist()]
+    recipient_ids = [account_ids[i] for i in recipients.tolist()]
+
+    begin = time.perf_counter()
+    for i in range(0, args.transactions, args.batch):
+        stop = i + args.batch
+        aggregator.record_many(sender_ids[i:stop], recipient_ids[i:stop], amounts[i:stop], timestamps[i:stop])
+    record_many_seconds = time.perf_counter() - begin
+
+    now = timestamps[-1]
+    begin = time.perf_counter()
+    for i in range(0, args.transactions, args.batch):
+        stop = i + args.batch
+        aggregator.lookup_many(sender_ids[i:stop], recipient_ids[i:stop], np.full(len(sender_ids[i:stop]), now))
+    lookup_many_seconds = time.perf_counter() - begin
+
+    single = min(args.single, args.transactions)
+    begin = time.perf_counter()
+    for s, r, t in zip(sender_ids[:single], recipient_ids[:single], timestamps[:single].tolist()):
+        aggregator.lookup(s, r, t)
+    lookup_seconds = (time.perf_counter() - begin) / single
+
+    # Record the last payments again, one at a time, after the batched replay
+    begin = time.perf_counter()
+    for s, r, a, t in zip(sender_ids[-single:], recipient_ids[-single:], amounts[-single:].tolist(),
+                          timestamps[-single:].tolist()):
+        aggregator.record(s, r, a, t)
+    record_seconds = (time.perf_counter() - begin) / single
+
+    # Batched and single lookups must agree
+    sample = rng.integers(0, args.transactions, 2000).tolist()
+    batched = aggregator.lookup_many([sender_ids[i] for i in sample], [recipient_ids[i] for i in sample],
+                                     np.full(len(sample), now))
+    mismatches = 0
+    for j, i in enumerate(sample):
+        features = aggregator.lookup(sender_ids[i], recipient_ids[i], now)
+        mismatches += not all(np.isclose(batched[name][j], features[name], rtol=1e-5)
+                              for name in VELOCITY_FEATURES)
+
+    stats = aggregator.stats()
+    active_keys = stats["senders"] + stats["recipients"]
+    report = dict(stats, active_keys=active_keys, buckets_per_key=BUCKETS,
+                  bytes_per_key=stats["bytes"] / active_keys, fill_seconds=fill_seconds,
+                  record_many_per_second=args.transactions / record_many_seconds,
+                  lookup_many_per_second=args.transactions / lookup_many_seconds,
+                  record_microseconds=record_seconds * 1e6, lookup_microseconds=lookup_seconds * 1e6,
+                  mismatches=mismatches)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{active_keys} active keys, {report['bytes_per_key']:.0f} bytes/key "
+          f"({stats['bytes'] / 1e6:.0f} MB)")
+    print(f"record_many {report['record_many_per_second']:,.0f} updates/s, "
+          f"lookup_many {report['lookup_many_per_second']:,.0f} lookups/s (batch {args.batch})")
+    print(f"record {report['record_microseconds']:.1f} us, lookup {report['lookup_microseconds']:.1f} us")
+    print(f"batched/single lookup mismatches: {mismatches}")
+    sys.exit(1 if mismatches else 0)
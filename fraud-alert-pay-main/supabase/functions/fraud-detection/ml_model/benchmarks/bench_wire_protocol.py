@@ -0,0 +1,120 @@
+# ml_model/benchmarks/bench_wire_protocol.py
+"""Serialization cost of JSON versus binary frames per 10k transactions.
+
+Times everything on the wire path except the model itself, for a batch of
+``--rows`` synthetic transactions:
+
+* JSON (NDJSON, as ``POST /score`` with ``application/x-ndjson``): the
+  client's ``json.dumps`` per request, the server's ``json.loads`` per
+  line and ``prepare_features`` packing the dicts into an array, the
+  server's ``json.dumps`` per result (echoing the transaction, as
+  ``score_transactions`` does) and the client's ``json.loads`` per line.
+* binary (see ``wire_protocol.py``), float32 and float64 records:
+  ``encode_request``, ``decode_request``, ``encode_response`` and
+  ``decode_response``.
+
+Each stage is the median of ``--repeats`` runs, scaled to 10k rows. It
+exits non-zero if either format fails to round-trip the scores and flags.
+
+    python ml_model/benchmarks/bench_wire_protocol.py --rows 10000 --repeats 20
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fraud_detection import (FEATURE_NAMES, FRAUD_SCORE_THRESHOLD, generate_synthetic_data,  # noqa: E402
+                             prepare_features)
+from wire_protocol import FLAG_FRAUD, decode_request, decode_response, encode_request, encode_response  # noqa: E402
+
+PER = 10000
+
+
+def timed(fn, repeats):
+    seconds = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - begin)
+    return result, float(np.median(seconds))
+
+
+def bench_json(transactions, fraud_scores, repeats):
+    requests = [{"transaction": tx, "model_type": "isolation_forest", "model_version": "latest"}
+                for tx in transactions]
+    results = [{"transaction": tx, "fraud_score": score, "is_fraud": score > FRAUD_SCORE_THRESHOLD,
+                "model_type": "isolation_forest", "model_version": "20250101_000000"}
+               for tx, score in zip(transactions, fraud_scores.tolist())]
+
+    body, encode_request_s = timed(lambda: "".join(json.dumps(r) + "\n" for r in requests).encode("utf-8"),
+                                   repeats)
+    decoded, decode_request_s = timed(lambda: [json.loads(line) for line in body.splitlines()], repeats)
+    _, pack_s = timed(lambda: prepare_features([r["transaction"] for r in decoded], FEATURE_NAMES), repeats)
+    payload, encode_response_s = timed(lambda: "".join(json.dumps(r) + "\n" for r in results).encode("utf-8"),
+                                       repeats)
+    answers, decode_response_s = timed(lambda: [json.loads(line) for line in payload.splitlines()], repeats)
+    ok = ([a["fraud_score"] for a in answers] == fraud_scores.tolist()
+          and [a["is_fraud"] for a in answers] == (fraud_scores > FRAUD_SCORE_THRESHOLD).tolist())
+    return {"format": "json", "request_bytes": len(body), "response_bytes": len(payload),
+            "encode_request": encode_request_s, "decode_request": decode_request_s + pack_s,
+            "encode_response": encode_response_s, "decode_response": decode_response_s, "round_trip_ok": ok}
+
+
+def bench_binary(X, fraud_scores, dtype, repeats):
+    flags = np.where(fraud_scores > FRAUD_SCORE_THRESHOLD, FLAG_FRAUD, 0).astype(np.uint8)
+
+    frame, encode_request_s = timed(lambda: encode_request(X, dtype=dtype), repeats)
+    (decoded, _, _), decode_request_s = timed(lambda: decode_request(frame), repeats)
+    payload, encode_response_s = timed(lambda: encode_response(fraud_scores, flags, "20250101_000000"), repeats)
+    (scores, answer_flags, _), decode_response_s = timed(lambda: decode_response(payload), repeats)
+    ok = (np.array_equal(decoded, X.astype(dtype)) and np.array_equal(scores, fraud_scores)
+          and np.array_equal(answer_flags, flags))
+    return {"format": f"binary {np.dtype(dtype).name}", "request_bytes": len(frame), "response_bytes": len(payload),
+            "encode_request": encode_request_s, "decode_request": decode_request_s,
+            "encode_response": encode_response_s, "decode_response": decode_response_s, "round_trip_ok": ok}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON vs binary frame serialization cost")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    np.random.seed(42)
+    df, _ = generate_synthetic_data(n_samples=args.rows)
+    X = df[FEATURE_NAMES].to_numpy(dtype=np.float64)[:args.rows]
+    transactions = [dict(zip(FEATURE_NAMES, row)) for row in X.tolist()]
+    fraud_scores = np.random.randint(0, 101, len(X)).astype(np.uint8)
+
+    results = [bench_json(transactions, fraud_scores, args.repeats),
+               bench_binary(X, fraud_scores, np.float32, args.repeats),
+               bench_binary(X, fraud_scores, np.float64, args.repeats)]
+    stages = ("encode_request", "decode_request", "encode_response", "decode_response")
+    for r in results:
+        scale = PER / len(X)
+        for stage in stages:
+            r[stage] *= scale
+        r["total"] = sum(r[stage] for stage in stages)
+        r["bytes_per_row"] = (r["request_bytes"] + r["response_bytes"]) / len(X)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"rows": len(X), "results": results}, f, indent=2)
+
+    print(f"milliseconds per {PER:,} transactions ({len(X):,} rows, median of {args.repeats})")
+    print(f"{'format':<16}" + "".join(f"{stage:>17}" for stage in stages) + f"{'total':>10}{'bytes/row':>11}")
+    for r in results:
+        print(f"{r['format']:<16}" + "".join(f"{r[stage] * 1e3:>17.2f}" for stage in stages)
+              + f"{r['total'] * 1e3:>10.2f}{r['bytes_per_row']:>11.1f}")
+    json_total = results[0]["total"]
+    for r in results[1:]:
+        print(f"{r['format']} is {json_total / r['total']:,.0f}x cheaper than JSON")
+    sys.exit(0 if all(r["round_trip_ok"] for r in results) else 1)
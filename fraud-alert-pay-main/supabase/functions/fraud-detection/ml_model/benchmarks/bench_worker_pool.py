@@ -0,0 +1,130 @@
+# ml_model/benchmarks/bench_worker_pool.py
+"""Per-worker memory of the pre-fork scoring server.
+
+Trains a forest into a scratch directory and starts
+``scoring_server.py --workers N`` for each ``--workers`` count. Each
+count runs twice: once with the models preloaded in the parent and
+shared copy-on-write, and once with ``--preload`` empty, so every worker
+loads its own copy on its first request. After ``--requests`` scoring
+requests have gone through, it reads each worker's RSS, PSS and USS
+(see ``worker_pool.process_memory``) from the pool's stats file.
+
+The figure to size a host with is the preloaded mean USS per worker,
+which is what each additional worker costs, plus the parent's RSS once.
+
+    python ml_model/benchmarks/bench_worker_pool.py --workers 1 2 4
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ML_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_MODEL_DIR)
+
+from fraud_detection import generate_synthetic_data, train_isolation_forest  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, json.dumps(payload).encode("utf-8"),
+                                     {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def measure(model_dir, workers, preload, transactions, tmp):
+    """Run a pool, send traffic through it and return its memory stats."""
+    port = free_port()
+    stats_file = os.path.join(tmp, f"pool-{workers}-{int(preload)}.json")
+    cmd = [sys.executable, os.path.join(ML_MODEL_DIR, "scoring_server.py"), "--model-dir", model_dir,
+           "--http", f"127.0.0.1:{port}", "--workers", str(workers), "--memory-interval", "0.5",
+           "--stats-file", stats_file, "--preload"] + (["isolation_forest"] if preload else [])
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}/score"
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                post(url, {"transaction": transactions[0]})
+                break
+            except OSError:
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError("scoring server did not start")
+                time.sleep(0.2)
+
+        # One connection per request, so the kernel spreads them over the workers
+        start = time.perf_counter()
+        for transaction in transactions:
+            post(url, {"transaction": transaction})
+        seconds = time.perf_counter() - start
+
+        # Wait for a report written after the traffic
+        if os.path.exists(stats_file):
+            os.unlink(stats_file)
+        deadline = time.monotonic() + 30
+        while not os.path.exists(stats_file):
+            if time.monotonic() > deadline:
+                raise RuntimeError("worker pool wrote no stats")
+            time.sleep(0.1)
+        with open(stats_file) as f:
+            stats = json.load(f)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+    memory = [worker["memory"] for worker in stats["workers"]]
+    return {
+        "workers": workers,
+        "preload": preload,
+        "requests_per_second": len(transactions) / seconds,
+        "parent_rss_mb": stats["parent_memory"]["rss"] / MB,
+        "mean_worker_uss_mb": stats["mean_worker_uss"] / MB,
+        "mean_worker_pss_mb": stats["mean_worker_pss"] / MB,
+        "mean_worker_rss_mb": sum(m["rss"] for m in memory) / len(memory) / MB,
+        # Everything the pool costs, with shared pages counted once
+        "total_pss_mb": (stats["parent_memory"]["pss"] + sum(m["pss"] for m in memory)) / MB,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker memory of the pre-fork scoring server")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    df, _ = generate_synthetic_data(n_samples=args.requests)
+    transactions = df.to_dict(orient="records")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = os.path.join(tmp, "model")
+        train_isolation_forest(model_dir=model_dir, model_version="bench")
+        for workers in args.workers:
+            for preload in (True, False):
+                results.append(measure(model_dir, workers, preload, transactions, tmp))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    print(f"{'workers':>7} {'preload':>7} {'USS/worker':>10} {'PSS/worker':>10} {'RSS/worker':>10} "
+          f"{'total PSS':>9} {'parent RSS':>10} {'req/s':>7}")
+    for r in results:
+        print(f"{r['workers']:>7} {str(r['preload']):>7} {r['mean_worker_uss_mb']:>8.1f}MB "
+              f"{r['mean_worker_pss_mb']:>8.1f}MB {r['mean_worker_rss_mb']:>8.1f}MB {r['total_pss_mb']:>7.1f}MB "
+              f"{r['parent_rss_mb']:>8.1f}MB {r['requests_per_second']:>7.0f}")
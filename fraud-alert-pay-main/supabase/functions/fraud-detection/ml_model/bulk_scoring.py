@@ -0,0 +1,275 @@
+# ml_model/bulk_scoring.py
+"""Streaming bulk re-scoring of historical transaction files.
+
+Reads a CSV, NDJSON or Parquet file in fixed-size chunks, scores each chunk
+with the vectorised ``score_feature_array`` path and appends the results to
+the output file as soon as the chunk is done, so memory stays bounded by
+``chunk_size`` (times the number of chunks in flight) whatever the input
+size.
+
+With ``--workers N`` chunks are spread over a process pool. Each worker
+opens the model through its own registry; the compiled artifacts are
+memory-mapped, so the model pages are shared rather than copied. At most
+``2 * N`` chunks are in flight and results are written in input order.
+
+``"latest"`` is resolved to the ``current`` version once at start-up, so
+every chunk is scored by the same model even if a new one is published
+mid-run.
+
+    python fraud_detection.py score-file history.csv scored.csv --workers 4
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fraud_detection import (FRAUD_SCORE_THRESHOLD, get_models, get_registry, model_feature_names,
+                             score_feature_array)
+from model_registry import current_link
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson", "parquet")
+FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def detect_format(path):
+    """Infer the file format from its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Cannot infer the format of {path}; pass --input-format/--output-format")
+    return FORMAT_EXTENSIONS[extension]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet files need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def read_chunks(path, file_format, chunk_size):
+    """Yield DataFrames of at most ``chunk_size`` rows from ``path``."""
+    if file_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif file_format == "ndjson":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    elif file_format == "parquet":
+        pyarrow = _import_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def format_chunk(df, file_format, header=True):
+    """Serialise a scored chunk for appending to a CSV or NDJSON file.
+
+    Parquet chunks are returned unchanged and encoded by ``ChunkWriter``.
+    Formatting floats as text costs more than scoring them, so workers do
+    it before handing the chunk back.
+    """
+    if file_format == "csv":
+        return df.to_csv(header=header, index=False)
+    if file_format == "ndjson":
+        if not len(df):
+            return ""
+        # pandas defaults to 10 significant digits; keep echoed inputs as precise as the CSV path
+        text = df.to_json(orient="records", lines=True, double_precision=15)
+        return text if text.endswith("\n") else text + "\n"
+    return df
+
+
+class ChunkWriter:
+    """Appends formatted chunks to a CSV, NDJSON or Parquet file."""
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        self._parquet_writer = None
+        self._file = None
+        if file_format == "parquet":
+            self._pyarrow = _import_pyarrow()
+        elif file_format in ("csv", "ndjson"):
+            self._file = open(path, "w", newline="")
+        else:
+            raise ValueError(f"Unsupported format: {file_format}")
+
+    def write(self, chunk):
+        """Append ``format_chunk`` output."""
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+        table = self._pyarrow.Table.from_pandas(chunk, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = self._pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def resolve_version(model_dir, model_version, model_type="isolation_forest"):
+    """Pin ``"latest"`` to the version the model type's ``current`` link points at right now."""
+    if model_version != "latest":
+        return model_version
+    try:
+        return os.readlink(os.path.join(model_dir, current_link(model_type)))
+    except OSError:
+        return model_version
+
+
+def score_chunk(df, model_type="isolation_forest", model_version="latest", keep_columns=None):
+    """Score one DataFrame chunk; returns the output rows for that chunk.
+
+    Rows with missing, non-numeric or non-finite features get an ``error``
+    message and no score instead of failing the chunk.
+    """
+    models = get_models(model_type, model_version)
+    feature_names = model_feature_names(models[1])
+
+    missing = [name for name in feature_names if name not in df.columns]
+    if missing:
+        raise ValueError(f"Input is missing feature columns: {', '.join(missing)}")
+
+    X = df[feature_names].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    valid = np.isfinite(X).all(axis=1)
+    fraud_scores, scored_version = score_feature_array(X[valid], model_type, model_version, models=models)
+
+    out = df if keep_columns is None else df[[c for c in keep_columns if c in df.columns]]
+    out = out.reset_index(drop=True).copy()
+    scores = pd.array([pd.NA] * len(df), dtype="Int64")
+    scores[valid] = fraud_scores
+    out["fraud_score"] = scores
+    out["is_fraud"] = out["fraud_score"] > FRAUD_SCORE_THRESHOLD
+    out["model_type"] = model_type
+    out["model_version"] = scored_version
+    out["error"] = np.where(valid, None, "Missing, non-numeric or non-finite feature value")
+    return out
+
+
+def process_chunk(df, model_type, model_version, keep_columns, output_format, header):
+    """Score and format one chunk; returns ``(payload, rows, flagged, errors)``."""
+    out = score_chunk(df, model_type, model_version, keep_columns)
+    return (format_chunk(out, output_format, header), len(out),
+            int(out["is_fraud"].sum()), int(out["error"].notna().sum()))
+
+
+def _init_worker(model_dir):
+    """Process pool initializer: point the worker's registry at ``model_dir``."""
+    logging.basicConfig(level=logging.WARNING)
+    get_registry(model_dir)
+
+
+def score_file(input_path, output_path, model_type="isolation_forest", model_version="latest",
+               model_dir="model", chunk_size=100000, workers=1, input_format=None,
+               output_format=None, keep_columns=None, progress_interval=5.0):
+    """Stream ``input_path`` through the model into ``output_path``.
+
+    Returns a summary dict with row counts, elapsed time and throughput.
+    """
+    input_format = input_format or detect_format(input_path)
+    output_format = output_format or detect_format(output_path)
+    model_version = resolve_version(model_dir, model_version, model_type)
+    get_registry(model_dir)
+
+    start = time.perf_counter()
+    last_report = start
+    totals = {"rows": 0, "chunks": 0, "flagged": 0, "errors": 0}
+
+    def record(result):
+        nonlocal last_report
+        payload, rows, flagged, errors = result
+        writer.write(payload)
+        totals["rows"] += rows
+        totals["chunks"] += 1
+        totals["flagged"] += flagged
+        totals["errors"] += errors
+        now = time.perf_counter()
+        if now - last_report >= progress_interval:
+            last_report = now
+            logger.info(f"Scored {totals['rows']} rows in {totals['chunks']} chunks "
+                        f"({totals['rows'] / (now - start):.0f} rows/s)")
+
+    writer = ChunkWriter(output_path, output_format)
+    try:
+        chunks = enumerate(read_chunks(input_path, input_format, chunk_size))
+        if workers <= 1:
+            for i, df in chunks:
+                record(process_chunk(df, model_type, model_version, keep_columns, output_format, i == 0))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_dir,)) as pool:
+                # Bounded window of chunks in flight; written back in order
+                pending = deque()
+                for i, df in chunks:
+                    pending.append(pool.submit(process_chunk, df, model_type, model_version,
+                                               keep_columns, output_format, i == 0))
+                    if len(pending) >= 2 * workers:
+                        record(pending.popleft().result())
+                while pending:
+                    record(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    summary = dict(totals, model_type=model_type, model_version=model_version, seconds=elapsed,
+                   rows_per_second=totals["rows"] / elapsed if elapsed > 0 else 0.0)
+    logger.info(f"Scored {summary['rows']} rows ({summary['flagged']} flagged, "
+                f"{summary['errors']} errors) in {elapsed:.1f}s "
+                f"({summary['rows_per_second']:.0f} rows/s) with {model_type} version {model_version}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fraud_detection.py score-file",
+                                     description="Re-score a historical transaction file")
+    parser.add_argument("input", help="CSV, NDJSON or Parquet file with one transaction per row")
+    parser.add_argument("output", help="where to write the scored rows")
+    parser.add_argument("--model-type", default="isolation_forest",
+                        choices=["isolation_forest", "autoencoder"])
+    parser.add_argument("--model-version", default="latest")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="scoring processes")
+    parser.add_argument("--input-format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--output-format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--keep-columns", nargs="*",
+                        help="input columns to copy to the output (default: all)")
+    parser.add_argument("--progress-interval", type=float, default=5.0,
+                        help="seconds between progress log lines")
+    args = parser.parse_args(argv)
+
+    try:
+        score_file(args.input, args.output, model_type=args.model_type,
+                   model_version=args.model_version, model_dir=args.model_dir,
+                   chunk_size=args.chunk_size, workers=args.workers,
+                   input_format=args.input_format, output_format=args.output_format,
+                   keep_columns=args.keep_columns, progress_interval=args.progress_interval)
+    except Exception as e:
+        logger.error(f"Error scoring file: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
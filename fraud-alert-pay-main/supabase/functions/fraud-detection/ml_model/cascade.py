@@ -0,0 +1,214 @@
+# ml_model/cascade.py
+"""Distil and evaluate the prescreen tier of the scoring cascade.
+
+Most traffic scores far below ``FRAUD_SCORE_THRESHOLD``, so a shallow
+tree can answer it without the full model. ``distill_prescreen`` scores
+synthetic traffic (``synthetic_data.generate_chunk``, its own seed) with
+the full model, labels every row whose full score is above
+``clear_below`` as "escalate", and fits a depth-limited
+``DecisionTreeClassifier`` on the raw features. Only leaves that
+contained no escalated rows become clear leaves; their score is the
+highest full-model score seen in them.
+
+``evaluate_prescreen`` replays held-out rows from
+``generate_synthetic_data`` through both tiers and reports the clear
+rate, the false-clear rate (cleared rows the full model would have
+flagged, per cleared row and per flag), cleared true frauds, and the
+throughput of each tier and of the cascade as a whole. The prescreen is
+only written to ``model/<version>/prescreen`` when its false-clear rate
+is within ``--max-false-clear-rate``. Scoring uses it once
+``FRAUD_CASCADE=1`` is set (or the scoring server runs with
+``--cascade``).
+
+    python fraud_detection.py distill-prescreen --model-version 20240101_120000
+    python fraud_detection.py distill-prescreen --evaluate-only --output cascade.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from fraud_detection import (FEATURE_NAMES, FRAUD_SCORE_THRESHOLD, generate_synthetic_data, load_model,
+                             score_feature_array)
+from model_registry import current_link
+from prescreen import Prescreen, export_prescreen, prescreen_exists, save_prescreen
+from synthetic_data import generate_chunk
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_version(model_dir, model_version, model_type="isolation_forest"):
+    """Pin ``"latest"`` to the version the model type's ``current`` link points at."""
+    if model_version != "latest":
+        return model_version
+    try:
+        return os.readlink(os.path.join(model_dir, current_link(model_type)))
+    except OSError:
+        raise ValueError(f"{model_dir} has no current model version")
+
+
+def full_scores(X, model_type, models):
+    """Full-model scores, bypassing any prescreen."""
+    scores, _ = score_feature_array(X, model_type, models=models, cascade=False)
+    return scores
+
+
+def distill_prescreen(model_type="isolation_forest", model_dir="model", model_version="latest",
+                      n_samples=200000, clear_below=50, max_depth=8, min_samples_leaf=200, seed=7):
+    """Fit a prescreen for a model version; returns ``(prescreen, arrays, attrs)``."""
+    from sklearn.tree import DecisionTreeClassifier
+
+    model_version = resolve_version(model_dir, model_version, model_type)
+    models = load_model(model_type, model_version, model_dir)
+    X, _ = generate_chunk(0, n_samples, chunk_size=n_samples, seed=seed)
+    scores = full_scores(X, model_type, models)
+    escalate = scores > clear_below
+
+    # Escalations are rare, so weight them up to keep them out of clear leaves
+    tree = DecisionTreeClassifier(max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                  class_weight="balanced", random_state=seed)
+    tree.fit(X.astype(np.float32), escalate)
+
+    n_nodes = tree.tree_.node_count
+    leaves = tree.apply(X.astype(np.float32))
+    escalated_in_leaf = np.bincount(leaves, weights=escalate, minlength=n_nodes)
+    rows_in_leaf = np.bincount(leaves, minlength=n_nodes)
+    leaf_score = np.zeros(n_nodes, dtype=np.int64)
+    np.maximum.at(leaf_score, leaves, scores)
+    clear = (rows_in_leaf > 0) & (escalated_in_leaf == 0)
+
+    attrs = {
+        "model_type": model_type,
+        "model_version": model_version,
+        "features": FEATURE_NAMES,
+        "clear_below": clear_below,
+        "n_samples": n_samples,
+        "seed": seed,
+        "train_clear_rate": float(clear[leaves].mean()),
+    }
+    arrays, attrs = export_prescreen(tree, clear, leaf_score, attrs)
+    logger.info(f"Distilled a depth-{attrs['max_depth']} prescreen for {model_type} {model_version}; "
+                f"clears {attrs['train_clear_rate']:.1%} of the distillation set")
+    return Prescreen(arrays, attrs), arrays, attrs
+
+
+def time_rows(fn, X, min_seconds=0.5):
+    """Rows per second of ``fn(X)``, from the median of repeated runs."""
+    fn(X)  # warm up
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < 3 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return len(X) / float(np.median(timings))
+
+
+def evaluate_prescreen(prescreen, model_type="isolation_forest", model_dir="model", model_version="latest",
+                       n_samples=20000):
+    """Measure a prescreen against the full model on held-out synthetic data."""
+    model_version = resolve_version(model_dir, model_version, model_type)
+    models = load_model(model_type, model_version, model_dir)
+    df, labels = generate_synthetic_data(n_samples=n_samples)
+    X = df[prescreen.attrs["features"]].to_numpy(dtype=np.float64)
+
+    scores = full_scores(X, model_type, models)
+    cleared, cleared_scores = prescreen.screen(X)
+    flagged = scores > FRAUD_SCORE_THRESHOLD
+    fraud = labels == 1
+    false_clears = int((cleared & flagged).sum())
+    n_cleared = int(cleared.sum())
+
+    def cascade(X):
+        cleared, cascade_scores = prescreen.screen(X)
+        escalated = np.flatnonzero(~cleared)
+        cascade_scores[escalated] = full_scores(X[escalated], model_type, models)
+        return cascade_scores
+
+    return {
+        "model_type": model_type,
+        "model_version": model_version,
+        "n_samples": n_samples,
+        "clear_below": prescreen.attrs["clear_below"],
+        "max_depth": prescreen.max_depth,
+        "clear_rate": n_cleared / n_samples,
+        "false_clears": false_clears,
+        # Cleared rows the full model would have flagged, per cleared row and per flag
+        "false_clear_rate": false_clears / max(1, n_cleared),
+        "missed_flag_rate": false_clears / max(1, int(flagged.sum())),
+        "cleared_frauds": int((cleared & fraud).sum()),
+        "full_model_fraud_recall": float((flagged & fraud).sum() / max(1, fraud.sum())),
+        "cascade_fraud_recall": float((flagged & ~cleared & fraud).sum() / max(1, fraud.sum())),
+        "cleared_score_below_full": int((cleared & (cleared_scores < scores)).sum()),
+        "prescreen_rows_per_second": time_rows(prescreen.screen, X),
+        "full_rows_per_second": time_rows(lambda X: full_scores(X, model_type, models), X),
+        "cascade_rows_per_second": time_rows(cascade, X),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fraud_detection.py distill-prescreen",
+                                     description="Distil and evaluate the cascade prescreen for a model version")
+    parser.add_argument("--model-type", default="isolation_forest", choices=["isolation_forest", "autoencoder"])
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--model-version", default="latest")
+    parser.add_argument("--n-samples", type=int, default=200000, help="rows used for distillation")
+    parser.add_argument("--holdout-samples", type=int, default=20000,
+                        help="held-out rows from generate_synthetic_data used for evaluation")
+    parser.add_argument("--clear-below", type=int, default=50,
+                        help="rows the full model scores above this are never cleared in training")
+    parser.add_argument("--max-depth", type=int, default=8)
+    parser.add_argument("--min-samples-leaf", type=int, default=200)
+    parser.add_argument("--max-false-clear-rate", type=float, default=0.001,
+                        help="refuse to save a prescreen that clears more flagged rows than this")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--evaluate-only", action="store_true",
+                        help="evaluate the prescreen already saved for the version")
+    parser.add_argument("--output", help="write the evaluation as JSON to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        model_version = resolve_version(args.model_dir, args.model_version, args.model_type)
+        model_path = os.path.join(args.model_dir, model_version)
+        if args.evaluate_only:
+            if not prescreen_exists(model_path):
+                raise ValueError(f"{model_path} has no prescreen")
+            prescreen, arrays, attrs = Prescreen.load(model_path), None, None
+        else:
+            prescreen, arrays, attrs = distill_prescreen(
+                args.model_type, args.model_dir, model_version, n_samples=args.n_samples,
+                clear_below=args.clear_below, max_depth=args.max_depth,
+                min_samples_leaf=args.min_samples_leaf, seed=args.seed)
+        report = evaluate_prescreen(prescreen, args.model_type, args.model_dir, model_version,
+                                    n_samples=args.holdout_samples)
+    except Exception as e:
+        logger.error(f"Error distilling prescreen: {str(e)}")
+        sys.exit(1)
+
+    accepted = report["false_clear_rate"] <= args.max_false_clear_rate
+    if arrays is not None and accepted:
+        save_prescreen(arrays, dict(attrs, evaluation=report), model_path)
+        logger.info(f"Saved prescreen to {model_path}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"clear rate {report['clear_rate']:.1%}, false clears {report['false_clears']} "
+          f"({report['false_clear_rate']:.3%} of cleared, {report['missed_flag_rate']:.3%} of flags), "
+          f"cleared frauds {report['cleared_frauds']}")
+    print(f"recall full {report['full_model_fraud_recall']:.3f}, cascade {report['cascade_fraud_recall']:.3f}")
+    print(f"rows/s prescreen {report['prescreen_rows_per_second']:.0f}, "
+          f"full {report['full_rows_per_second']:.0f}, cascade {report['cascade_rows_per_second']:.0f}")
+    if not accepted:
+        print(f"false-clear rate above {args.max_false_clear_rate:.3%}; prescreen not saved")
+    sys.exit(0 if accepted else 1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,151 @@
+# ml_model/compiled_autoencoder.py
+"""Pickle-free export and NumPy inference for a trained autoencoder.
+
+The dense layers' kernels and biases, their activations, the scaler
+constants and the anomaly threshold are stored as a memory-mapped artifact
+(see ``model_artifacts``) in ``model/<version>/autoencoder``.
+``CompiledAutoencoder`` runs the forward pass with plain float32 matrix
+products into preallocated per-thread buffers, so scoring needs neither
+TensorFlow nor Keras' per-call ``predict`` overhead.
+"""
+import os
+import threading
+
+import numpy as np
+
+from model_artifacts import artifact_exists, arrays_nbytes, load_artifact, load_scaler, save_artifact, scaler_arrays
+
+# Artifact directory inside model/<version>/
+COMPILED_AUTOENCODER_DIR = "autoencoder"
+
+
+def export_autoencoder(model, scaler, threshold):
+    """Extract dense weights, activations, scaler and threshold from a Keras model.
+
+    Returns ``(arrays, attrs)`` ready for ``save_artifact``.
+    """
+    arrays, attrs = scaler_arrays(scaler)
+    activations = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if len(weights) != 2:  # the Input layer has no weights
+            continue
+        kernel, bias = weights
+        i = len(activations)
+        arrays[f"dense_{i}_kernel"] = kernel
+        arrays[f"dense_{i}_bias"] = bias
+        activations.append(layer.get_config().get("activation", "linear"))
+
+    attrs.update({
+        "activations": activations,
+        "threshold": float(threshold),
+    })
+    return arrays, attrs
+
+
+def save_compiled_autoencoder(model, scaler, threshold, model_path):
+    """Export an autoencoder into ``model_path/autoencoder``."""
+    arrays, attrs = export_autoencoder(model, scaler, threshold)
+    return save_artifact(os.path.join(model_path, COMPILED_AUTOENCODER_DIR), "autoencoder", arrays, attrs)
+
+
+def compiled_autoencoder_exists(model_path):
+    """Return True if ``model_path`` has an exported autoencoder."""
+    return artifact_exists(os.path.join(model_path, COMPILED_AUTOENCODER_DIR))
+
+
+def load_autoencoder_artifact(model_path, mmap=True):
+    """Open an exported autoencoder; returns ``(attrs, arrays, scaler)``."""
+    attrs, arrays = load_artifact(os.path.join(model_path, COMPILED_AUTOENCODER_DIR),
+                                  kind="autoencoder", mmap=mmap)
+    return attrs, arrays, load_scaler(arrays, attrs)
+
+
+def _relu(x):
+    np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+ACTIVATIONS = {
+    "linear": None,
+    "relu": _relu,
+    "sigmoid": _sigmoid,
+    "tanh": lambda x: np.tanh(x, out=x),
+}
+
+
+class CompiledAutoencoder:
+    """Dense autoencoder forward pass in NumPy, API-compatible with ``model.predict``."""
+
+    def __init__(self, arrays, attrs, version="unknown", chunk_size=4096):
+        self.arrays = arrays
+        self.attrs = attrs
+        self.version = version
+        self.chunk_size = chunk_size
+        self.threshold = float(attrs["threshold"])
+        self.scaler = load_scaler(arrays, attrs)
+
+        self.layers = []
+        for i, activation in enumerate(attrs["activations"]):
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation in exported autoencoder: {activation}")
+            # Keras computes in float32; matching it keeps results equivalent
+            kernel = np.asarray(arrays[f"dense_{i}_kernel"], dtype=np.float32)
+            bias = np.asarray(arrays[f"dense_{i}_bias"], dtype=np.float32)
+            self.layers.append((kernel, bias, ACTIVATIONS[activation]))
+        self.n_features = self.layers[0][0].shape[0]
+
+        self._local = threading.local()
+
+    @classmethod
+    def load(cls, model_path, version="unknown", mmap=True):
+        """Open the exported autoencoder in a model version directory."""
+        attrs, arrays = load_artifact(os.path.join(model_path, COMPILED_AUTOENCODER_DIR),
+                                      kind="autoencoder", mmap=mmap)
+        return cls(arrays, attrs, version=version)
+
+    @property
+    def nbytes(self):
+        """Size of the model arrays (shared between processes when mapped)."""
+        return arrays_nbytes(self.arrays)
+
+    def _buffers(self, n_rows):
+        """Per-thread activation buffers with room for at least ``n_rows`` rows."""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or len(buffers[0]) < n_rows:
+            buffers = [np.empty((n_rows, kernel.shape[1]), dtype=np.float32)
+                       for kernel, _, _ in self.layers]
+            self._local.buffers = buffers
+        return buffers
+
+    def _forward_chunk(self, X32):
+        """Run one chunk through every layer; returns a view into the last buffer."""
+        n_rows = len(X32)
+        h = X32
+        for (kernel, bias, activation), buffer in zip(self.layers, self._buffers(n_rows)):
+            out = buffer[:n_rows]
+            np.matmul(h, kernel, out=out)
+            out += bias
+            if activation is not None:
+                activation(out)
+            h = out
+        return h
+
+    def predict(self, X_scaled, batch_size=None, verbose=0):
+        """Reconstruct ``X_scaled``; same contract as Keras ``model.predict``."""
+        X32 = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        reconstructed = np.empty((len(X32), self.layers[-1][0].shape[1]), dtype=np.float32)
+        for start in range(0, len(X32), self.chunk_size):
+            stop = min(len(X32), start + self.chunk_size)
+            reconstructed[start:stop] = self._forward_chunk(X32[start:stop])
+        return reconstructed
+
+    def reconstruction_error(self, X_scaled):
+        """Per-row mean squared reconstruction error."""
+        return np.mean(np.power(X_scaled - self.predict(X_scaled), 2), axis=1)
@@ -0,0 +1,182 @@
+# ml_model/compiled_forest.py
+"""Pure-NumPy inference for a trained IsolationForest and StandardScaler.
+
+``export_isolation_forest`` flattens every estimator of a fitted sklearn
+``IsolationForest`` into packed contiguous arrays (split feature, threshold,
+children, and the path length credited at each leaf) plus the scaler
+constants, stored as a memory-mapped artifact (see ``model_artifacts``).
+``CompiledIsolationForest`` scores batches from those arrays with
+vectorised traversal and never imports sklearn.
+
+Leaves point to themselves as both children, so traversal is a fixed
+``max_depth`` steps of gather-and-compare over an ``(n_rows, n_trees)``
+node matrix with no per-row branching. Children are interleaved as
+``[left, right]`` pairs so each step picks the next node with a single
+``take`` at ``2 * node + went_right``.
+"""
+import os
+
+import numpy as np
+
+from model_artifacts import artifact_exists, arrays_nbytes, load_artifact, load_scaler, save_artifact, scaler_arrays
+
+# Artifact directory inside model/<version>/
+COMPILED_FOREST_DIR = "isolation_forest"
+
+# sklearn.tree._tree.TREE_LEAF
+TREE_LEAF = -1
+
+
+def average_path_length(n_samples):
+    """Average path length of an unsuccessful BST search, as in sklearn's IsolationForest."""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    mask = n_samples > 2
+    n = n_samples[mask]
+    result[mask] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return result
+
+
+def export_isolation_forest(model, scaler):
+    """Flatten a fitted IsolationForest and StandardScaler.
+
+    Returns ``(arrays, attrs)``: the packed arrays and the scalar attributes
+    stored in the artifact header.
+    """
+    n_features = model.n_features_in_
+    # sklearn only re-indexes features when trees were grown on a subset
+    subsample_features = model._max_features != n_features
+
+    features, thresholds, children, leaf_values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator, estimator_features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        is_leaf = left == TREE_LEAF
+
+        depth = np.zeros(n_nodes, dtype=np.int64)
+        for node in range(n_nodes):  # children always follow their parent
+            if not is_leaf[node]:
+                depth[left[node]] = depth[node] + 1
+                depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+        feature = tree.feature.astype(np.int64)
+        if subsample_features:
+            feature = np.where(is_leaf, 0, np.asarray(estimator_features)[np.maximum(feature, 0)])
+        feature[is_leaf] = 0
+
+        node_ids = np.arange(n_nodes, dtype=np.int64)
+        features.append(feature)
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        children.append(np.stack([
+            np.where(is_leaf, node_ids, left),
+            np.where(is_leaf, node_ids, right)
+        ], axis=1) + offset)
+        leaf_values.append(np.where(
+            is_leaf,
+            depth + average_path_length(tree.n_node_samples),
+            0.0
+        ))
+        roots.append(offset)
+        offset += n_nodes
+
+    index_dtype = np.int32 if offset < 2 ** 31 else np.int64
+    arrays, attrs = scaler_arrays(scaler)
+    arrays.update({
+        # Stored pointer-sized so the mapped array is used without a copy
+        "feature": np.concatenate(features).astype(np.intp),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "children": np.concatenate(children).astype(index_dtype),
+        "leaf_value": np.concatenate(leaf_values).astype(np.float64),
+        "roots": np.asarray(roots, dtype=index_dtype),
+    })
+    attrs.update({
+        "n_estimators": len(roots),
+        "max_depth": max_depth,
+        "offset": float(model.offset_),
+        "average_path_length_max_samples": float(average_path_length([model._max_samples])[0]),
+    })
+    return arrays, attrs
+
+
+def save_compiled_forest(model, scaler, model_path):
+    """Export a fitted forest and scaler into ``model_path/isolation_forest``."""
+    arrays, attrs = export_isolation_forest(model, scaler)
+    return save_artifact(os.path.join(model_path, COMPILED_FOREST_DIR), "isolation_forest", arrays, attrs)
+
+
+def compiled_forest_exists(model_path):
+    """Return True if ``model_path`` has an exported forest."""
+    return artifact_exists(os.path.join(model_path, COMPILED_FOREST_DIR))
+
+
+class CompiledIsolationForest:
+    """Vectorised NumPy evaluation of an exported IsolationForest."""
+
+    def __init__(self, arrays, attrs, version="unknown"):
+        self.arrays = arrays
+        self.attrs = attrs
+        self.feature = np.asarray(arrays["feature"], dtype=np.intp)
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.leaf_value = arrays["leaf_value"]
+        self.roots = np.asarray(arrays["roots"])
+        self.max_depth = int(attrs["max_depth"])
+        self.offset_ = float(attrs["offset"])
+        self.n_estimators = len(self.roots)
+        self._denominator = self.n_estimators * float(attrs["average_path_length_max_samples"])
+        self.scaler = load_scaler(arrays, attrs)
+        self.version = version
+
+    @classmethod
+    def load(cls, model_path, version="unknown", mmap=True):
+        """Open the exported forest in a model version directory."""
+        attrs, arrays = load_artifact(os.path.join(model_path, COMPILED_FOREST_DIR),
+                                      kind="isolation_forest", mmap=mmap)
+        return cls(arrays, attrs, version=version)
+
+    @property
+    def nbytes(self):
+        """Size of the model arrays (shared between processes when mapped)."""
+        return arrays_nbytes(self.arrays)
+
+    def apply(self, X_scaled, chunk_size=512):
+        """Return the leaf index reached in every tree, shape ``(n_rows, n_trees)``."""
+        # sklearn evaluates trees on float32 input against float64 thresholds
+        X = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        children = self.children.ravel()
+        leaves = np.empty((n_rows, self.n_estimators), dtype=self.roots.dtype)
+
+        # Chunking keeps the node matrix and its temporaries cache-sized
+        for start in range(0, n_rows, chunk_size):
+            stop = min(n_rows, start + chunk_size)
+            row_offsets = (np.arange(start, stop, dtype=np.intp) * n_features)[:, None]
+            node = np.repeat(self.roots[None, :], stop - start, axis=0)
+            for _ in range(self.max_depth):
+                values = flat_X.take(row_offsets + self.feature.take(node))
+                went_right = values > self.threshold.take(node)
+                node = children.take(2 * node + went_right)
+            leaves[start:stop] = node
+        return leaves
+
+    def score_samples(self, X_scaled):
+        """Opposite of the anomaly score, matching ``IsolationForest.score_samples``."""
+        depths = self.leaf_value.take(self.apply(X_scaled)).sum(axis=1)
+        if self._denominator == 0:
+            return -np.ones(len(depths))
+        return -np.power(2.0, -depths / self._denominator)
+
+    def decision_function(self, X_scaled):
+        """Match ``IsolationForest.decision_function``: negative means outlier."""
+        return self.score_samples(X_scaled) - self.offset_
+
+    def predict(self, X_scaled):
+        """Return -1 for outliers and 1 for inliers."""
+        return np.where(self.decision_function(X_scaled) < 0, -1, 1)
@@ -0,0 +1,260 @@
+# ml_model/ensemble.py
+"""Ensemble and shadow scoring across several registered models.
+
+An ``Ensemble`` scores a transaction or batch against each of its members
+(``model_type`` + ``model_version``, e.g. the Isolation Forest and the
+autoencoder behind ``current``) concurrently, so the cost is close to the
+slowest member rather than the sum, and combines the member scores with
+one of the ``RULES``:
+
+* ``max``: the highest member score;
+* ``mean``: the weighted mean of the member scores;
+* ``any``: the highest member score, flagged when any member's score is
+  above that member's own threshold.
+
+Members run in threads, which only overlap where the models release the
+GIL (NumPy kernels, TensorFlow). By default every batch is split across
+them, including the single transactions the scoring server sends; a
+larger ``parallel_min_rows`` scores smaller batches one member after
+another, as does every batch on a single-core host.
+
+A member that fails is left out of the combined score and listed in
+``members_failed``, so a degraded ensemble can be told from a full one.
+
+Shadow models (e.g. a challenger version) are scored on a background
+thread after the response has been returned, for ensemble requests and,
+through ``shadow``, for requests scored by a single model. Each shadow
+result is compared with the primary one and logged (and appended to a
+JSON-lines file if configured). Shadow work is dropped, and counted, once
+``max_shadow_pending`` batches are waiting, so a slow challenger never
+holds back live traffic.
+
+Members and shadows are written ``model_type[@model_version][=weight[:threshold]]``,
+e.g. ``isolation_forest=0.7`` or ``isolation_forest@20240101_120000``.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fraud_detection import FRAUD_SCORE_THRESHOLD, score_transactions
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+RULES = ("max", "mean", "any")
+DEFAULT_MEMBERS = ("isolation_forest", "autoencoder")
+
+
+class EnsembleMember:
+    """One model in an ensemble, with its weight and flagging threshold."""
+
+    __slots__ = ("model_type", "model_version", "weight", "threshold")
+
+    def __init__(self, model_type, model_version="latest", weight=1.0, threshold=FRAUD_SCORE_THRESHOLD):
+        self.model_type = model_type
+        self.model_version = model_version
+        self.weight = weight
+        self.threshold = threshold
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse ``model_type[@model_version][=weight[:threshold]]``."""
+        spec, _, options = spec.partition("=")
+        model_type, _, model_version = spec.partition("@")
+        weight, _, threshold = options.partition(":")
+        return cls(model_type, model_version or "latest", float(weight or 1.0),
+                   float(threshold) if threshold else FRAUD_SCORE_THRESHOLD)
+
+    @property
+    def name(self):
+        return f"{self.model_type}@{self.model_version}"
+
+    def __repr__(self):
+        return f"EnsembleMember({self.name}, weight={self.weight}, threshold={self.threshold})"
+
+
+def combine(member_results, members, rule="max"):
+    """Combine one transaction's member results into an ensemble result.
+
+    Members that failed on the transaction are left out and listed in
+    ``members_failed``; if all failed the first error is returned.
+    """
+    scored = [(member, result) for member, result in zip(members, member_results) if "error" not in result]
+    if not scored:
+        return {"error": member_results[0]["error"]}
+    failed = [{"model_type": member.model_type, "model_version": member.model_version, "error": result["error"]}
+              for member, result in zip(members, member_results) if "error" in result]
+
+    if rule == "mean":
+        total_weight = sum(member.weight for member, _ in scored)
+        fraud_score = int(round(sum(member.weight * result["fraud_score"] for member, result in scored)
+                                / total_weight))
+        is_fraud = fraud_score > FRAUD_SCORE_THRESHOLD
+    elif rule == "any":
+        fraud_score = max(result["fraud_score"] for _, result in scored)
+        is_fraud = any(result["fraud_score"] > member.threshold for member, result in scored)
+    else:
+        fraud_score = max(result["fraud_score"] for _, result in scored)
+        is_fraud = fraud_score > FRAUD_SCORE_THRESHOLD
+
+    return {
+        "transaction": scored[0][1]["transaction"],
+        "fraud_score": fraud_score,
+        "is_fraud": is_fraud,
+        "model_type": "ensemble",
+        "model_version": "+".join(f"{result['model_type']}@{result['model_version']}" for _, result in scored),
+        "rule": rule,
+        "members": [
+            {"model_type": result["model_type"], "model_version": result["model_version"],
+             "fraud_score": result["fraud_score"], "is_fraud": result["fraud_score"] > member.threshold}
+            for member, result in scored
+        ],
+        "members_failed": failed,
+    }
+
+
+class Ensemble:
+    """Scores transactions against several models at once, with optional shadows."""
+
+    def __init__(self, members, rule="max", shadows=(), shadow_log=None, max_shadow_pending=64,
+                 parallel_min_rows=1, score_batch=score_transactions):
+        if rule not in RULES:
+            raise ValueError(f"Unknown ensemble rule: {rule} (expected one of {', '.join(RULES)})")
+        if not members:
+            raise ValueError("An ensemble needs at least one member")
+        self.members = [EnsembleMember.parse(m) if isinstance(m, str) else m for m in members]
+        self.shadows = [EnsembleMember.parse(m) if isinstance(m, str) else m for m in shadows]
+        self.rule = rule
+        self.shadow_log = shadow_log
+        self.max_shadow_pending = max_shadow_pending
+        self.parallel_min_rows = parallel_min_rows if (os.cpu_count() or 1) > 1 else float("inf")
+        self.score_batch = score_batch
+
+        # The first member runs on the calling thread, the rest in the pool
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.members) - 1),
+                                        thread_name_prefix="ensemble")
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._shadow_pending = 0
+        self._shadow_file = open(shadow_log, "a") if shadow_log else None
+
+        self.requests = 0
+        self.shadow_batches = 0
+        self.shadow_dropped = 0
+        self.shadow_disagreements = 0
+
+    def _score_member(self, member, transactions):
+        try:
+            return self.score_batch(transactions, member.model_type, member.model_version)
+        except Exception as e:
+            logger.error(f"Error scoring ensemble member {member.name}: {str(e)}")
+            return [{"error": str(e)} for _ in range(len(transactions))]
+
+    def score_many(self, transactions):
+        """Score a batch against every member concurrently; returns combined results."""
+        if len(transactions) < self.parallel_min_rows:
+            member_results = [self._score_member(member, transactions) for member in self.members]
+        else:
+            futures = [self._pool.submit(self._score_member, member, transactions)
+                       for member in self.members[1:]]
+            member_results = [self._score_member(self.members[0], transactions)]
+            member_results += [future.result() for future in futures]
+
+        results = [combine(row, self.members, self.rule) for row in zip(*member_results)]
+        with self._lock:
+            self.requests += len(transactions)
+        self.shadow(transactions, results)
+        return results
+
+    def score(self, transaction):
+        """Score one transaction; returns the combined result dict."""
+        return self.score_many([transaction])[0]
+
+    def shadow(self, transactions, results):
+        """Queue shadow scoring of ``transactions`` against the primary ``results``.
+
+        Also used for requests scored by a single model, outside the ensemble.
+        """
+        if not self.shadows:
+            return
+        with self._lock:
+            if self._shadow_pending >= self.max_shadow_pending:
+                self.shadow_dropped += 1
+                return
+            self._shadow_pending += 1
+        self._shadow_pool.submit(self._run_shadow, transactions, results)
+
+    def _run_shadow(self, transactions, primary_results):
+        try:
+            for shadow in self.shadows:
+                start = time.perf_counter()
+                shadow_results = self._score_member(shadow, transactions)
+                seconds = time.perf_counter() - start
+                self._compare(shadow, primary_results, shadow_results, seconds)
+        except Exception as e:
+            logger.error(f"Error in shadow scoring: {str(e)}")
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+                self.shadow_batches += 1
+
+    def _compare(self, shadow, primary_results, shadow_results, seconds):
+        records = []
+        disagreements = 0
+        for primary, result in zip(primary_results, shadow_results):
+            if "error" in primary or "error" in result:
+                continue
+            shadow_flag = result["fraud_score"] > shadow.threshold
+            agree = shadow_flag == primary["is_fraud"]
+            disagreements += not agree
+            records.append({
+                "shadow": shadow.name,
+                "shadow_version": result["model_version"],
+                "primary_version": primary["model_version"],
+                "primary_score": primary["fraud_score"],
+                "shadow_score": result["fraud_score"],
+                "primary_is_fraud": primary["is_fraud"],
+                "shadow_is_fraud": shadow_flag,
+                "agree": agree,
+            })
+
+        labels = (("shadow", shadow.name),)
+        METRICS.inc("fraud_shadow_transactions_total", labels, len(records))
+        METRICS.inc("fraud_shadow_disagreements_total", labels, disagreements)
+        METRICS.observe("fraud_shadow_batch_seconds", seconds, labels)
+        with self._lock:
+            self.shadow_disagreements += disagreements
+            if self._shadow_file is not None and records:
+                self._shadow_file.write("".join(json.dumps(record) + "\n" for record in records))
+                self._shadow_file.flush()
+        if disagreements:
+            logger.info(f"Shadow {shadow.name} disagreed on {disagreements}/{len(records)} transactions")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "members": [member.name for member in self.members],
+                "rule": self.rule,
+                "shadows": [shadow.name for shadow in self.shadows],
+                "requests": self.requests,
+                "shadow_pending": self._shadow_pending,
+                "shadow_batches": self.shadow_batches,
+                "shadow_dropped": self.shadow_dropped,
+                "shadow_disagreements": self.shadow_disagreements,
+            }
+
+    def close(self):
+        """Finish queued shadow work and release the thread pools."""
+        self._pool.shutdown(wait=True)
+        self._shadow_pool.shutdown(wait=True)
+        if self._shadow_file is not None:
+            self._shadow_file.close()
+            self._shadow_file = None
+
+
+METRICS.describe("fraud_shadow_transactions_total", "Transactions compared against a shadow model")
+METRICS.describe("fraud_shadow_disagreements_total", "Shadow model flag decisions that differ from the primary")
+METRICS.describe("fraud_shadow_batch_seconds", "Time spent scoring a batch with a shadow model")
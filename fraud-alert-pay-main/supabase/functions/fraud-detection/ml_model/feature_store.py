@@ -0,0 +1,290 @@
+# ml_model/feature_store.py
+"""In-memory real-time feature store for transaction enrichment.
+
+Keeps the rolling state the model's behavioural features are derived from,
+so they no longer have to be simulated by the callers:
+
+* per account: creation time, home location, time of the last outgoing
+  transaction and an exponentially decayed count of outgoing transactions;
+* per (sender, recipient) pair: a decayed count of payments.
+
+``recipient_frequency`` is the pair count divided by the sender's total,
+both decayed with the same half-life, so it is the recent share of the
+sender's payments that went to this recipient (0-1). Counts are decayed
+lazily on access, which keeps every update and lookup O(1).
+
+With a ``VelocityAggregator`` attached (``velocity``), lookups also
+return the sliding-window ``VELOCITY_FEATURES`` and recorded payments
+update them; likewise the ``GRAPH_FEATURES`` with a ``GraphIndex``
+(``graph``), which is told each account's age when it is first paid.
+
+State lives in ``__slots__`` objects in two dicts and is snapshotted to a
+single ``.npz`` of flat arrays (no pickle), written atomically. Account
+ids are kept as strings, so ``42`` and ``"42"`` are the same account
+before and after a restore. ``hour_of_day`` is filled in UTC.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from graph_index import GraphIndex
+from velocity import VelocityAggregator
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_HOUR = 3600.0
+SECONDS_PER_DAY = 86400.0
+EARTH_RADIUS_KM = 6371.0
+
+# Used when the store has no history for a feature
+DEFAULT_FEATURES = {
+    "time_since_last_tx": 24.0,
+    "recipient_frequency": 0.0,
+    "distance_to_recipient_km": 0.0,
+}
+
+
+class AccountState:
+    """Rolling state for one account."""
+
+    __slots__ = ("created_at", "lat", "lon", "last_tx_at", "tx_count", "count_at")
+
+    def __init__(self, created_at=math.nan, lat=math.nan, lon=math.nan):
+        self.created_at = created_at
+        self.lat = lat
+        self.lon = lon
+        self.last_tx_at = math.nan
+        self.tx_count = 0.0
+        self.count_at = 0.0  # time tx_count was last decayed to
+
+
+class PairState:
+    """Decayed payment count for one (sender, recipient) pair."""
+
+    __slots__ = ("count", "count_at")
+
+    def __init__(self):
+        self.count = 0.0
+        self.count_at = 0.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def optional_float(value):
+    """``float(value)``, or None for missing and unparsable values."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def transaction_time(transaction):
+    """Epoch seconds of a transaction from ``timestamp`` or ISO ``date`` (UTC unless it says), else now."""
+    timestamp = transaction.get("timestamp")
+    if timestamp is not None:
+        return float(timestamp)
+    date = transaction.get("date")
+    if date:
+        date = datetime.fromisoformat(str(date).replace("Z", "+00:00"))
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.timestamp()
+    return time.time()
+
+
+class FeatureStore:
+    """Per-account and per-pair rolling state with O(1) update and lookup."""
+
+    def __init__(self, half_life_days=30.0, velocity=None, graph=None):
+        self.half_life_days = half_life_days
+        self.velocity = velocity
+        self.graph = graph
+        self._decay_rate = math.log(2) / (half_life_days * SECONDS_PER_DAY)
+        self._accounts = {}
+        self._pairs = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def _decayed(self, count, count_at, now):
+        if count == 0.0 or now <= count_at:
+            return count
+        return count * math.exp(-self._decay_rate * (now - count_at))
+
+    def _account(self, account_id):
+        state = self._accounts.get(account_id)
+        if state is None:
+            state = self._accounts[account_id] = AccountState()
+        return state
+
+    def register_account(self, account_id, created_at, lat=None, lon=None):
+        """Record an account's creation time (epoch seconds) and optional location."""
+        account_id = str(account_id)
+        with self._lock:
+            state = self._account(account_id)
+            state.created_at = float(created_at)
+            if lat is not None and lon is not None:
+                state.lat = float(lat)
+                state.lon = float(lon)
+
+    def lookup(self, sender_id, recipient_id, now=None):
+        """Return the derived features for a payment at ``now`` without recording it.
+
+        Features the store has no data for are left out.
+        """
+        sender_id, recipient_id = str(sender_id), str(recipient_id)
+        now = time.time() if now is None else now
+        features = {}
+        with self._lock:
+            sender = self._accounts.get(sender_id)
+            recipient = self._accounts.get(recipient_id)
+            pair = self._pairs.get((sender_id, recipient_id))
+
+            if sender is not None:
+                if not math.isnan(sender.last_tx_at):
+                    features["time_since_last_tx"] = max(0.0, now - sender.last_tx_at) / SECONDS_PER_HOUR
+                total = self._decayed(sender.tx_count, sender.count_at, now)
+                if total > 0.0:
+                    pair_count = self._decayed(pair.count, pair.count_at, now) if pair is not None else 0.0
+                    features["recipient_frequency"] = min(1.0, pair_count / total)
+                if not math.isnan(sender.created_at):
+                    features["user_account_age_days"] = max(0.0, now - sender.created_at) / SECONDS_PER_DAY
+
+            if recipient is not None and not math.isnan(recipient.created_at):
+                features["recipient_account_age_days"] = max(0.0, now - recipient.created_at) / SECONDS_PER_DAY
+
+            if (sender is not None and recipient is not None
+                    and not math.isnan(sender.lat) and not math.isnan(recipient.lat)):
+                features["distance_to_recipient_km"] = haversine_km(
+                    sender.lat, sender.lon, recipient.lat, recipient.lon)
+        if self.velocity is not None:
+            features.update(self.velocity.lookup(sender_id, recipient_id, now))
+        if self.graph is not None:
+            features.update(self.graph.lookup(sender_id, recipient_id))
+        return features
+
+    def record(self, sender_id, recipient_id, now=None, amount=0.0,
+               sender_age_days=None, recipient_age_days=None):
+        """Update the rolling state with a completed payment.
+
+        The account ages (days) are only used by the graph index, and
+        default to what ``register_account`` recorded.
+        """
+        sender_id, recipient_id = str(sender_id), str(recipient_id)
+        now = time.time() if now is None else now
+        if self.velocity is not None:
+            self.velocity.record(sender_id, recipient_id, amount, now)
+        with self._lock:
+            sender = self._account(sender_id)
+            sender.tx_count = self._decayed(sender.tx_count, sender.count_at, now) + 1.0
+            sender.count_at = max(now, sender.count_at)
+            if math.isnan(sender.last_tx_at) or now > sender.last_tx_at:
+                sender.last_tx_at = now
+
+            self._account(recipient_id)
+            key = (sender_id, recipient_id)
+            pair = self._pairs.get(key)
+            if pair is None:
+                pair = self._pairs[key] = PairState()
+            pair.count = self._decayed(pair.count, pair.count_at, now) + 1.0
+            pair.count_at = max(now, pair.count_at)
+            if self.graph is not None:
+                if sender_age_days is None:
+                    sender_age_days = (now - sender.created_at) / SECONDS_PER_DAY
+                if recipient_age_days is None:
+                    recipient_age_days = (now - self._accounts[recipient_id].created_at) / SECONDS_PER_DAY
+        if self.graph is not None:
+            self.graph.record(sender_id, recipient_id, optional_float(sender_age_days),
+                              optional_float(recipient_age_days))
+
+    def enrich(self, transaction, record=True):
+        """Fill in missing model features from the store.
+
+        Values already present in ``transaction`` are kept. Needs
+        ``sender_id`` and ``recipient_id``; the payment is then recorded
+        (after the lookup, so it does not count towards its own features)
+        unless ``record`` is False. Returns a new dict.
+        """
+        sender_id = transaction.get("sender_id")
+        recipient_id = transaction.get("recipient_id")
+        if sender_id is None or recipient_id is None:
+            return transaction
+
+        now = transaction_time(transaction)
+        enriched = dict(DEFAULT_FEATURES)
+        # UTC, so the feature does not depend on the host's timezone
+        enriched["hour_of_day"] = datetime.fromtimestamp(now, timezone.utc).hour
+        enriched.update(self.lookup(sender_id, recipient_id, now))
+        enriched.update(transaction)
+        if record:
+            self.record(sender_id, recipient_id, now, float(transaction.get("amount") or 0.0),
+                        enriched.get("user_account_age_days"), enriched.get("recipient_account_age_days"))
+        return enriched
+
+    def stats(self):
+        """Return the number of tracked accounts and pairs."""
+        stats = {"accounts": len(self._accounts), "pairs": len(self._pairs),
+                 "half_life_days": self.half_life_days}
+        if self.velocity is not None:
+            stats["velocity"] = self.velocity.stats()
+        if self.graph is not None:
+            stats["graph"] = self.graph.stats()
+        return stats
+
+    def snapshot(self, path):
+        """Write the store to ``path`` (.npz) atomically."""
+        with self._lock:
+            account_ids = list(self._accounts)
+            index = {account_id: i for i, account_id in enumerate(account_ids)}
+            accounts = np.array([
+                (s.created_at, s.lat, s.lon, s.last_tx_at, s.tx_count, s.count_at)
+                for s in self._accounts.values()
+            ], dtype=np.float64).reshape(len(account_ids), 6)
+            pair_index = np.array([(index[sender], index[recipient]) for sender, recipient in self._pairs],
+                                  dtype=np.int64).reshape(len(self._pairs), 2)
+            pairs = np.array([(p.count, p.count_at) for p in self._pairs.values()],
+                             dtype=np.float64).reshape(len(self._pairs), 2)
+        velocity = self.velocity.state() if self.velocity is not None else {}
+        graph = self.graph.state() if self.graph is not None else {}
+
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, account_ids=np.array(account_ids, dtype=str), accounts=accounts,
+                     pair_index=pair_index, pairs=pairs,
+                     half_life_days=np.float64(self.half_life_days), **velocity, **graph)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved feature store snapshot with {len(account_ids)} accounts "
+                    f"and {len(pairs)} pairs to {path}")
+
+    @classmethod
+    def restore(cls, path):
+        """Load a store written by ``snapshot``."""
+        with np.load(path, allow_pickle=False) as data:
+            store = cls(half_life_days=float(data["half_life_days"]))
+            account_ids = data["account_ids"].tolist()
+            for account_id, row in zip(account_ids, data["accounts"].tolist()):
+                state = store._accounts[account_id] = AccountState(row[0], row[1], row[2])
+                state.last_tx_at, state.tx_count, state.count_at = row[3], row[4], row[5]
+            for (sender, recipient), (count, count_at) in zip(data["pair_index"].tolist(),
+                                                              data["pairs"].tolist()):
+                pair = store._pairs[(account_ids[sender], account_ids[recipient])] = PairState()
+                pair.count, pair.count_at = count, count_at
+            if "velocity_sender_keys" in data:
+                store.velocity = VelocityAggregator.from_state(data)
+            if "graph_keys" in data:
+                store.graph = GraphIndex.from_state(data)
+        logger.info(f"Restored feature store with {len(store._accounts)} accounts "
+                    f"and {len(store._pairs)} pairs from {path}")
+        return store
@@ -1,52 +1,78 @@
 # ml_model/fraud_detection.py
-import pandas as pd
+#
+# Only numpy is imported at module level. pandas, the sklearn training
+# utilities and TensorFlow are imported inside the functions that need
+# them, so the scoring path (predict.py, the scoring server) never pays for
+# TensorFlow unless an autoencoder is actually trained or scored.
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-import tensorflow as tf
 from datetime import datetime
 import pickle
 import os
 import json
 import logging
+import math
+import time
+from compiled_autoencoder import (CompiledAutoencoder, compiled_autoencoder_exists, load_autoencoder_artifact,
+                                  save_compiled_autoencoder)
+from compiled_forest import CompiledIsolationForest, compiled_forest_exists, save_compiled_forest
+from metrics import METRICS
+from model_registry import ModelRegistry, current_link
+from prescreen import get_prescreen
+from synthetic_data import sample_features, sample_graph_features, sample_velocity_features
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def generate_synthetic_data(n_samples=5000, fraud_ratio=0.05):
-    """Generate synthetic transaction data with normal and fraudulent patterns."""
+# Feature order used for training and scoring
+FEATURE_NAMES = [
+    'amount', 'hour_of_day', 'time_since_last_tx', 'recipient_frequency',
+    'distance_to_recipient_km', 'user_account_age_days',
+    'recipient_account_age_days', 'is_foreign_transaction'
+]
+
+# Fields every transaction must carry, whatever the model
+REQUIRED_FIELDS = [
+    'amount', 'hour_of_day', 'time_since_last_tx',
+    'recipient_frequency', 'distance_to_recipient_km'
+]
+
+FRAUD_SCORE_THRESHOLD = 80  # Configurable threshold
+
+# "compiled" scores with the NumPy engines (forest and autoencoder) when
+# exported arrays exist; "sklearn" always unpickles the sklearn estimator and
+# loads the Keras model
+SCORING_ENGINE = os.environ.get("FRAUD_SCORING_ENGINE", "compiled")
+
+# With FRAUD_CASCADE=1, versions that have a distilled prescreen (see
+# cascade.py) answer clearly safe rows from it and only run the full model
+# on the rest
+CASCADE_ENABLED = os.environ.get("FRAUD_CASCADE", "0") == "1"
+
+def generate_synthetic_data(n_samples=5000, fraud_ratio=0.05, velocity=False, graph=False):
+    """Generate synthetic transaction data with normal and fraudulent patterns.
+
+    With ``velocity`` the ``VELOCITY_FEATURES`` columns (see ``velocity.py``)
+    are added after the base features, which stay the same as without, and
+    with ``graph`` the ``GRAPH_FEATURES`` (see ``graph_index.py``) after those.
+    """
+    import pandas as pd
+
     np.random.seed(42)
     
     n_fraudulent = int(n_samples * fraud_ratio)
     n_normal = n_samples - n_fraudulent
     
-    # Create normal transaction features
-    normal_data = {
-        'amount': np.random.gamma(shape=2.0, scale=20, size=n_normal),
-        'hour_of_day': np.random.normal(12, 5, size=n_normal),
-        'time_since_last_tx': np.random.exponential(24, size=n_normal),
-        'recipient_frequency': np.random.exponential(0.1, size=n_normal),
-        'distance_to_recipient_km': np.random.exponential(10, size=n_normal),
-        'user_account_age_days': np.random.normal(500, 200, size=n_normal),
-        'recipient_account_age_days': np.random.normal(500, 200, size=n_normal),
-        'is_foreign_transaction': np.random.choice([0, 1], size=n_normal, p=[0.9, 0.1])
-    }
-    
-    # Create anomalous transaction features
-    fraud_data = {
-        'amount': np.random.gamma(shape=5.0, scale=80, size=n_fraudulent),
-        'hour_of_day': np.random.normal(2, 2, size=n_fraudulent),
-        'time_since_last_tx': np.random.exponential(1, size=n_fraudulent),
-        'recipient_frequency': np.random.exponential(0.01, size=n_fraudulent),
-        'distance_to_recipient_km': np.random.exponential(100, size=n_fraudulent),
-        'user_account_age_days': np.random.normal(50, 40, size=n_fraudulent),
-        'recipient_account_age_days': np.random.normal(20, 10, size=n_fraudulent),
-        'is_foreign_transaction': np.random.choice([0, 1], size=n_fraudulent, p=[0.5, 0.5])
-    }
+    # Create normal and anomalous transaction features
+    normal_data = sample_features(np.random, n_normal)
+    fraud_data = sample_features(np.random, n_fraudulent, fraud=True)
+    if velocity:
+        normal_data.update(sample_velocity_features(np.random, n_normal))
+        fraud_data.update(sample_velocity_features(np.random, n_fraudulent, fraud=True))
+    if graph:
+        normal_data.update(sample_graph_features(np.random, n_normal))
+        fraud_data.update(sample_graph_features(np.random, n_fraudulent, fraud=True))
     
     # Create labels (0 for normal, 1 for fraud)
     normal_labels = np.zeros(n_normal)
@@ -61,29 +87,81 @@ def generate_synthetic_data(n_samples=5000, fraud_ratio=0.05):
     
     return df, labels
 
-def train_isolation_forest(contamination=0.05, model_dir="model", model_version=None):
-    """Train an Isolation Forest model on transaction data."""
+def update_current_symlink(model_dir, model_version, model_type="isolation_forest"):
+    """Atomically repoint ``model_dir/current`` at ``model_version``.
+
+    The autoencoder has its own link, ``current_autoencoder``, so each model
+    type's ``"latest"`` is the version last trained for it. The new link is
+    created under a temporary name and renamed over the old one, so readers
+    always see either the previous or the new version.
+    """
+    current_symlink = os.path.join(model_dir, current_link(model_type))
+    tmp_symlink = f"{current_symlink}.tmp{os.getpid()}"
+    if os.path.lexists(tmp_symlink):
+        os.unlink(tmp_symlink)
+    os.symlink(model_version, tmp_symlink)
+    os.replace(tmp_symlink, current_symlink)
+
+def training_split(contamination=0.05, data=None, velocity=False, graph=False):
+    """Return ``(X_train, X_test, y_train, y_test)`` with DataFrame features.
+
+    ``data`` is an optional pre-split ``(X_train, X_test, y_train, y_test,
+    feature_names)`` tuple of arrays, as shared by the training
+    orchestrator; otherwise synthetic data is generated and split here,
+    with the velocity and graph features if ``velocity``/``graph`` are set.
+    """
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    if data is None:
+        df, true_labels = generate_synthetic_data(n_samples=5000, fraud_ratio=contamination, velocity=velocity,
+                                                  graph=graph)
+        return train_test_split(
+            df, true_labels, test_size=0.3, random_state=42, stratify=true_labels
+        )
+
+    X_train, X_test, y_train, y_test, feature_names = data
+    # Named columns keep feature_names_in_ on the scaler, which scoring relies on
+    return (pd.DataFrame(X_train, columns=feature_names), pd.DataFrame(X_test, columns=feature_names),
+            y_train, y_test)
+
+def train_isolation_forest(contamination=0.05, model_dir="model", model_version=None,
+                           n_estimators=100, n_jobs=None, data=None, set_current=True,
+                           scaler=None, extra_metadata=None, velocity=False, graph=False):
+    """Train an Isolation Forest model on transaction data.
+
+    With ``set_current=False`` the model is only written to its version
+    directory; ``current`` and the root compatibility copies are left alone.
+    A pre-fitted ``scaler`` (e.g. from a streaming pass) is used as is, and
+    ``extra_metadata`` is merged into ``metadata.json``. ``velocity`` and
+    ``graph`` add the velocity and graph features to generated training data.
+    """
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
+    from sklearn.metrics import classification_report
+    from sklearn.preprocessing import StandardScaler
+
     try:
         logger.info("Starting Isolation Forest model training")
         
         # Generate or load data
-        df, true_labels = generate_synthetic_data(n_samples=5000, fraud_ratio=contamination)
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            df, true_labels, test_size=0.3, random_state=42, stratify=true_labels
-        )
+        X_train, X_test, y_train, y_test = training_split(contamination, data, velocity, graph)
+        feature_names = list(X_train.columns)
         
         # Scale features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
+        if scaler is None:
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+        else:
+            X_train_scaled = scaler.transform(X_train)
         X_test_scaled = scaler.transform(X_test)
         
         # Train model with hyperparameters
         model = IsolationForest(
             contamination=contamination, 
-            n_estimators=100, 
+            n_estimators=n_estimators, 
             max_samples='auto',
+            n_jobs=n_jobs,
             random_state=42
         )
         model.fit(X_train_scaled)
@@ -112,38 +190,41 @@ def train_isolation_forest(contamination=0.05, model_dir="model", model_version=
         with open(os.path.join(model_path, "scaler.pkl"), "wb") as f:
             pickle.dump(scaler, f)
         
+        # Export packed tree arrays (pickle-free, mmap-able) for the NumPy engine
+        save_compiled_forest(model, scaler, model_path)
+        
         # Save feature names for later validation
         with open(os.path.join(model_path, "feature_names.json"), "w") as f:
-            json.dump({"features": list(df.columns)}, f)
+            json.dump({"features": feature_names}, f)
         
         # Save metadata
         metadata = {
             "model_type": "IsolationForest",
             "training_date": datetime.now().isoformat(),
             "contamination": contamination,
-            "n_samples": len(df),
-            "features": list(df.columns),
+            "n_estimators": n_estimators,
+            "n_samples": len(X_train) + len(X_test),
+            "features": feature_names,
             "performance": report,
             "version": model_version
         }
+        metadata.update(extra_metadata or {})
         
         with open(os.path.join(model_path, "metadata.json"), "w") as f:
             json.dump(metadata, f, indent=2)
         
-        # Create symlink to latest model
-        current_symlink = os.path.join(model_dir, "current")
-        if os.path.exists(current_symlink) and os.path.islink(current_symlink):
-            os.unlink(current_symlink)
-        os.symlink(model_version, current_symlink)
-        
         logger.info(f"Model and artifacts saved to {model_path}")
         
-        # Add backward compatibility by copying files to root model directory
-        with open(os.path.join(model_dir, "isolation_forest.pkl"), "wb") as f:
-            pickle.dump(model, f)
-        
-        with open(os.path.join(model_dir, "scaler.pkl"), "wb") as f:
-            pickle.dump(scaler, f)
+        if set_current:
+            # Point the current symlink at the new model
+            update_current_symlink(model_dir, model_version)
+            
+            # Add backward compatibility by copying files to root model directory
+            with open(os.path.join(model_dir, "isolation_forest.pkl"), "wb") as f:
+                pickle.dump(model, f)
+            
+            with open(os.path.join(model_dir, "scaler.pkl"), "wb") as f:
+                pickle.dump(scaler, f)
         
         # Test the model on sample transactions
         normal_tx = {
@@ -151,7 +232,10 @@ def train_isolation_forest(contamination=0.05, model_dir="model", model_version=
             'hour_of_day': 14.0,
             'time_since_last_tx': 28.0,
             'recipient_frequency': 0.2,
-            'distance_to_recipient_km': 5.0
+            'distance_to_recipient_km': 5.0,
+            'user_account_age_days': 400.0,
+            'recipient_account_age_days': 350.0,
+            'is_foreign_transaction': 0
         }
         
         anomalous_tx = {
@@ -159,12 +243,15 @@ def train_isolation_forest(contamination=0.05, model_dir="model", model_version=
             'hour_of_day': 2.0,
             'time_since_last_tx': 0.5,
             'recipient_frequency': 0.01,
-            'distance_to_recipient_km': 150.0
+            'distance_to_recipient_km': 150.0,
+            'user_account_age_days': 30.0,
+            'recipient_account_age_days': 10.0,
+            'is_foreign_transaction': 1
         }
         
-        # Scale and predict
-        normal_df = pd.DataFrame([normal_tx])
-        anomalous_df = pd.DataFrame([anomalous_tx])
+        # Scale and predict; features the samples lack (velocity, graph) are zero
+        normal_df = pd.DataFrame([normal_tx]).reindex(columns=feature_names, fill_value=0.0)
+        anomalous_df = pd.DataFrame([anomalous_tx]).reindex(columns=feature_names, fill_value=0.0)
         
         normal_scaled = scaler.transform(normal_df)
         anomalous_scaled = scaler.transform(anomalous_df)
@@ -185,17 +272,23 @@ def train_isolation_forest(contamination=0.05, model_dir="model", model_version=
         logger.error(f"Error training model: {str(e)}")
         raise
 
-def build_autoencoder(input_dim):
-    """Build an autoencoder model for anomaly detection."""
+def build_autoencoder(input_dim, encoder_widths=(32, 16, 8)):
+    """Build an autoencoder model for anomaly detection.
+
+    The decoder mirrors ``encoder_widths`` back up to ``input_dim``.
+    """
+    import tensorflow as tf
+
     # Define the encoder
     input_layer = tf.keras.layers.Input(shape=(input_dim,))
-    encoder = tf.keras.layers.Dense(32, activation="relu")(input_layer)
-    encoder = tf.keras.layers.Dense(16, activation="relu")(encoder)
-    encoder = tf.keras.layers.Dense(8, activation="relu")(encoder)
+    encoder = input_layer
+    for width in encoder_widths:
+        encoder = tf.keras.layers.Dense(width, activation="relu")(encoder)
     
     # Define the decoder
-    decoder = tf.keras.layers.Dense(16, activation="relu")(encoder)
-    decoder = tf.keras.layers.Dense(32, activation="relu")(decoder)
+    decoder = encoder
+    for width in reversed(encoder_widths[:-1]):
+        decoder = tf.keras.layers.Dense(width, activation="relu")(decoder)
     decoder = tf.keras.layers.Dense(input_dim, activation="linear")(decoder)
     
     # Define the model
@@ -204,34 +297,55 @@ def build_autoencoder(input_dim):
     
     return autoencoder
 
-def train_autoencoder(contamination=0.05, model_dir="model", model_version=None):
-    """Train an Autoencoder model for anomaly detection."""
+def train_autoencoder(contamination=0.05, model_dir="model", model_version=None,
+                      encoder_widths=(32, 16, 8), epochs=50, data=None, set_current=True,
+                      scaler=None, train_batches=None, steps_per_epoch=None, extra_metadata=None,
+                      velocity=False, graph=False):
+    """Train an Autoencoder model for anomaly detection.
+
+    With ``set_current=False`` the root compatibility copies are not written.
+    ``train_batches`` is an optional endless generator of scaled ``(x, x)``
+    mini-batches to fit on instead of the in-memory training split, which
+    is then only used for validation and the threshold; it requires a
+    pre-fitted ``scaler`` and ``steps_per_epoch``.
+    """
+    from sklearn.metrics import classification_report
+    from sklearn.preprocessing import StandardScaler
+
     try:
         logger.info("Starting Autoencoder model training")
         
         # Generate or load data
-        df, true_labels = generate_synthetic_data(n_samples=5000, fraud_ratio=contamination)
-        
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            df, true_labels, test_size=0.3, random_state=42, stratify=true_labels
-        )
+        X_train, X_test, y_train, y_test = training_split(contamination, data, velocity, graph)
+        feature_names = list(X_train.columns)
         
         # Scale features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
+        if scaler is None:
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+        else:
+            X_train_scaled = scaler.transform(X_train)
         X_test_scaled = scaler.transform(X_test)
         
         # Build and train autoencoder
-        autoencoder = build_autoencoder(X_train_scaled.shape[1])
-        autoencoder.fit(
-            X_train_scaled, 
-            X_train_scaled,
-            epochs=50,
-            batch_size=32,
-            validation_data=(X_test_scaled, X_test_scaled),
-            verbose=0
-        )
+        autoencoder = build_autoencoder(X_train_scaled.shape[1], tuple(encoder_widths))
+        if train_batches is not None:
+            autoencoder.fit(
+                train_batches,
+                steps_per_epoch=steps_per_epoch,
+                epochs=epochs,
+                validation_data=(X_test_scaled, X_test_scaled),
+                verbose=0
+            )
+        else:
+            autoencoder.fit(
+                X_train_scaled, 
+                X_train_scaled,
+                epochs=epochs,
+                batch_size=32,
+                validation_data=(X_test_scaled, X_test_scaled),
+                verbose=0
+            )
         
         # Calculate reconstruction error
         reconstructed = autoencoder.predict(X_test_scaled)
@@ -269,28 +383,36 @@ def train_autoencoder(contamination=0.05, model_dir="model", model_version=None)
         with open(os.path.join(model_path, "threshold.json"), "w") as f:
             json.dump({"threshold": float(threshold)}, f)
         
+        # Export weights, scaler and threshold in the pickle-free mmap format
+        save_compiled_autoencoder(autoencoder, scaler, threshold, model_path)
+        
         # Save metadata
         metadata = {
             "model_type": "Autoencoder",
             "training_date": datetime.now().isoformat(),
             "threshold": float(threshold),
-            "n_samples": len(df),
-            "features": list(df.columns),
+            "encoder_widths": list(encoder_widths),
+            "n_samples": len(X_train) + len(X_test),
+            "features": feature_names,
             "performance": report,
             "version": model_version
         }
+        metadata.update(extra_metadata or {})
         
         with open(os.path.join(model_path, "metadata.json"), "w") as f:
             json.dump(metadata, f, indent=2)
         
         logger.info(f"Autoencoder model and artifacts saved to {model_path}")
         
-        # Add backward compatibility by copying files to root model directory
-        with open(os.path.join(model_dir, "autoencoder.pkl"), "wb") as f:
-            pickle.dump(autoencoder, f)
-        
-        with open(os.path.join(model_dir, "scaler_autoencoder.pkl"), "wb") as f:
-            pickle.dump(scaler, f)
+        if set_current:
+            update_current_symlink(model_dir, model_version, "autoencoder")
+            
+            # Add backward compatibility by copying files to root model directory
+            with open(os.path.join(model_dir, "autoencoder.pkl"), "wb") as f:
+                pickle.dump(autoencoder, f)
+            
+            with open(os.path.join(model_dir, "scaler_autoencoder.pkl"), "wb") as f:
+                pickle.dump(scaler, f)
         
         return autoencoder, scaler, threshold, model_path
         
@@ -299,11 +421,22 @@ def train_autoencoder(contamination=0.05, model_dir="model", model_version=None)
         raise
 
 def load_model(model_type="isolation_forest", model_version="latest", model_dir="model"):
-    """Load a trained model and scaler."""
+    """Load a trained model and scaler (timed and counted in ``METRICS``)."""
+    start = time.perf_counter()
+    try:
+        models = _load_model(model_type, model_version, model_dir)
+    except Exception:
+        METRICS.inc("fraud_model_loads_total", (("model_type", model_type), ("result", "error")))
+        raise
+    METRICS.observe("fraud_model_load_seconds", time.perf_counter() - start, (("model_type", model_type),))
+    METRICS.inc("fraud_model_loads_total", (("model_type", model_type), ("result", "ok")))
+    return models
+
+def _load_model(model_type="isolation_forest", model_version="latest", model_dir="model"):
     try:
         if model_version == "latest":
-            # Try to use the current symlink
-            current_symlink = os.path.join(model_dir, "current")
+            # Try to use the current symlink of this model type
+            current_symlink = os.path.join(model_dir, current_link(model_type))
             if os.path.exists(current_symlink) and os.path.islink(current_symlink):
                 model_version = os.readlink(current_symlink)
             else:
@@ -316,14 +449,25 @@ def load_model(model_type="isolation_forest", model_version="latest", model_dir=
             model_path = model_dir
         
         if model_type == "autoencoder":
+            # The NumPy forward pass needs only the exported arrays, not TensorFlow
+            if SCORING_ENGINE == "compiled" and compiled_autoencoder_exists(model_path):
+                model = CompiledAutoencoder.load(model_path, version=model_version or "unknown")
+                return model, model.scaler, model.threshold
+            
             # First try to load TF model
             try:
+                import tensorflow as tf
                 model = tf.keras.models.load_model(os.path.join(model_path, "autoencoder_tf"))
             except:
                 # Fall back to pickle
                 with open(os.path.join(model_path, "autoencoder.pkl"), "rb") as f:
                     model = pickle.load(f)
             
+            # Scaler and threshold come from the exported artifact when present
+            if compiled_autoencoder_exists(model_path):
+                attrs, _, scaler = load_autoencoder_artifact(model_path)
+                return model, scaler, attrs["threshold"]
+            
             with open(os.path.join(model_path, "scaler_autoencoder.pkl"), "rb") as f:
                 scaler = pickle.load(f)
             
@@ -336,19 +480,25 @@ def load_model(model_type="isolation_forest", model_version="latest", model_dir=
             
             return model, scaler, threshold
         else:
+            try:
+                with open(os.path.join(model_path, "metadata.json"), "r") as f:
+                    version = json.load(f).get("version", "unknown")
+            except:
+                version = "unknown"
+            
+            # Prefer the mapped arrays: no unpickling and no sklearn import
+            if SCORING_ENGINE == "compiled" and compiled_forest_exists(model_path):
+                model = CompiledIsolationForest.load(model_path, version=version)
+                return model, model.scaler, model.version
+            
             with open(os.path.join(model_path, "isolation_forest.pkl"), "rb") as f:
                 model = pickle.load(f)
             
             with open(os.path.join(model_path, "scaler.pkl"), "rb") as f:
                 scaler = pickle.load(f)
             
-            try:
-                with open(os.path.join(model_path, "metadata.json"), "r") as f:
-                    metadata = json.load(f)
-                    # Attach version to model for reference
-                    model.version = metadata.get("version", "unknown")
-            except:
-                model.version = "unknown"
+            # Attach version to model for reference
+            model.version = version
             
             return model, scaler, model.version
         
@@ -376,69 +526,284 @@ def load_model(model_type="isolation_forest", model_version="latest", model_dir=
         else:
             raise
 
-def score_transaction(transaction, model_type="isolation_forest", model_version="latest"):
-    """Score a transaction for fraud probability."""
+_registry = None
+
+def get_registry(model_dir="model", **options):
+    """Return the process-wide model registry, creating it on first use.
+
+    ``options`` are passed to ``ModelRegistry`` and only take effect on the
+    call that creates it.
+    """
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(load_model, model_dir=model_dir, **options)
+    return _registry
+
+def _registry_samples():
+    """Model cache counters for the metrics endpoint."""
+    if _registry is None:
+        return []
+    stats = _registry.stats()
+    return [
+        ("fraud_model_cache_hits_total", "counter", (), stats["hits"]),
+        ("fraud_model_cache_misses_total", "counter", (), stats["misses"]),
+        ("fraud_model_cache_evictions_total", "counter", (), stats["evictions"]),
+        ("fraud_model_reloads_total", "counter", (), stats["reloads"]),
+        ("fraud_model_cache_entries", "gauge", (), stats["entries"]),
+        ("fraud_model_cache_bytes", "gauge", (), stats["bytes"]),
+    ]
+
+METRICS.add_collector(_registry_samples)
+
+def parse_request(input_json):
+    """Split a scoring request into (transaction, model_type, model_version).
+
+    Supports both the bare transaction payload and the newer
+    ``{"transaction": ..., "model_type": ..., "model_version": ...}`` shape.
+    """
+    if isinstance(input_json, dict) and "transaction" in input_json:
+        transaction = input_json["transaction"]
+        model_type = input_json.get("model_type", "isolation_forest")
+        model_version = input_json.get("model_version", "latest")
+    else:
+        transaction = input_json
+        model_type = "isolation_forest"
+        model_version = "latest"
+    return transaction, model_type, model_version
+
+def score_transaction(transaction, model_type="isolation_forest", model_version="latest", models=None):
+    """Score a transaction for fraud probability.
+
+    Models come from the process-wide registry, so artifacts are only read
+    from disk the first time a version is used. ``models`` may instead be a
+    tuple previously returned by ``load_model``.
+    """
+    return score_transactions([transaction], model_type, model_version, models=models)[0]
+
+def model_feature_names(scaler):
+    """Return the feature order a fitted scaler (and its model) expects."""
+    names = getattr(scaler, "feature_names_in_", None)
+    if names is not None:
+        return [str(name) for name in names]
+    return FEATURE_NAMES[:scaler.n_features_in_]
+
+def prepare_features(transactions, feature_names):
+    """Validate transactions and pack them into a 2-D float array.
+
+    ``transactions`` is a list of dicts or a 2-D array whose columns are
+    already in ``feature_names`` order. Returns ``(X, valid, errors)`` where
+    ``X`` holds only the valid rows, ``valid`` is their position in the input
+    and ``errors`` maps the position of every rejected row to its message.
+    """
+    if isinstance(transactions, np.ndarray):
+        X = np.asarray(transactions, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(feature_names):
+            raise ValueError(f"Expected a 2-D array with {len(feature_names)} feature columns")
+        return X, np.arange(len(X)), {}
+
+    rows = []
+    valid = []
+    errors = {}
+    for i, transaction in enumerate(transactions):
+        try:
+            if not isinstance(transaction, dict):
+                raise ValueError("Transaction must be a JSON object")
+            for field in REQUIRED_FIELDS:
+                if field not in transaction:
+                    raise ValueError(f"Missing required field: {field}")
+            row = []
+            for field in feature_names:
+                if field not in transaction:
+                    raise ValueError(f"Missing required field: {field}")
+                value = float(transaction[field])
+                if not math.isfinite(value):
+                    raise ValueError(f"Non-finite value for field: {field}")
+                row.append(value)
+        except (TypeError, ValueError) as e:
+            errors[i] = str(e)
+            continue
+        rows.append(row)
+        valid.append(i)
+
+    X = np.array(rows, dtype=np.float64).reshape(len(rows), len(feature_names))
+    return X, np.array(valid, dtype=np.intp), errors
+
+def scale_features(scaler, X):
+    """Apply a fitted StandardScaler to an already ordered feature array."""
+    # Same arithmetic as StandardScaler.transform, minus its DataFrame and
+    # feature-name validation overhead
+    if getattr(scaler, "mean_", None) is not None and getattr(scaler, "with_mean", True):
+        X = X - scaler.mean_
+    if getattr(scaler, "scale_", None) is not None and getattr(scaler, "with_std", True):
+        X = X / scaler.scale_
+    return X
+
+def isolation_forest_fraud_scores(model, X_scaled):
+    """Convert Isolation Forest decision scores into 0-100 fraud scores."""
+    # decision_function: lower is more anomalous
+    scores = model.decision_function(X_scaled)
+    return np.clip((1 - (scores + 0.5)) * 100, 0, 100).astype(int)
+
+def autoencoder_fraud_scores(model, X_scaled):
+    """Convert autoencoder reconstruction error into 0-100 fraud scores."""
+    reconstructed = model.predict(X_scaled, batch_size=min(len(X_scaled), 8192), verbose=0)
+    mse = np.mean(np.power(X_scaled - reconstructed, 2), axis=1)
+    return np.clip(mse * 100, 0, 100).astype(int)
+
+def served_model_type(model_type):
+    """Return the model type that serves requests for ``model_type``."""
+    # Every non-autoencoder type (e.g. the Go service's "xgboost") is scored with the forest
+    return "autoencoder" if model_type == "autoencoder" else "isolation_forest"
+
+def get_models(model_type="isolation_forest", model_version="latest"):
+    """Return the registry's ``load_model`` tuple for a model type."""
+    return get_registry().get(served_model_type(model_type), model_version)
+
+def prescreen_for(model_type, model_version):
+    """Return the cascade prescreen of a served model version, if it has one."""
+    model_type = served_model_type(model_type)
+    registry = get_registry()
+    if model_version == "latest":
+        model_version = registry.current_version(model_type)
+    if not model_version or model_version == "unknown":
+        return None
+    return get_prescreen(os.path.join(registry.model_dir, model_version), model_type)
+
+def score_feature_array(X, model_type="isolation_forest", model_version="latest", models=None,
+                        timings=None, cascade=None):
+    """Score a 2-D array already in model feature order.
+
+    Returns ``(fraud_scores, model_version)``; the forest reports the version
+    recorded in its metadata. Stage timings are recorded in ``METRICS``, or
+    appended to ``timings`` for the caller to record with its own.
+    ``cascade`` overrides ``CASCADE_ENABLED`` for this call. Raises
+    ``ValueError`` for rows with NaN or infinite values, as sklearn does,
+    whichever engine serves the model.
+    """
+    model_type = served_model_type(model_type)
+    model, scaler, extra = models or get_models(model_type, model_version)
+    if model_type != "autoencoder":
+        model_version = extra
+
+    if not len(X):
+        return np.empty(0, dtype=int), model_version
+    # The NumPy engines would score these silently
+    invalid = ~np.isfinite(X).all(axis=1)
+    if invalid.any():
+        raise ValueError(f"Input contains NaN or infinity in {int(invalid.sum())} of {len(X)} rows")
+
+    start = time.perf_counter()
+    stage_timings = []
+    if cascade is None:
+        cascade = CASCADE_ENABLED
+    prescreen = prescreen_for(model_type, model_version) if cascade else None
+    if prescreen is not None:
+        cleared, fraud_scores = prescreen.screen(X)
+        escalated = np.flatnonzero(~cleared)
+        X = X[escalated]
+        screened = time.perf_counter()
+        stage_timings.append(("prescreen", screened - start))
+        METRICS.inc("fraud_cascade_rows_total", (("tier", "prescreen"), ("model_type", model_type)),
+                    len(cleared) - len(escalated))
+        METRICS.inc("fraud_cascade_rows_total", (("tier", "full"), ("model_type", model_type)), len(escalated))
+        start = screened
+        if not len(X):
+            if timings is None:
+                METRICS.record_stages(model_type, model_version, stage_timings, len(cleared))
+            else:
+                timings.extend(stage_timings)
+            return fraud_scores, model_version
+
+    X_scaled = scale_features(scaler, X)
+    scaled = time.perf_counter()
+    if model_type == "autoencoder":
+        full_scores = autoencoder_fraud_scores(model, X_scaled)
+    else:
+        full_scores = isolation_forest_fraud_scores(model, X_scaled)
+    if prescreen is not None:
+        fraud_scores[escalated] = full_scores
+    else:
+        fraud_scores = full_scores
+    if METRICS.enabled:
+        stage_timings += [("scale", scaled - start), ("predict", time.perf_counter() - scaled)]
+        if timings is None:
+            METRICS.record_stages(model_type, model_version, stage_timings, len(fraud_scores))
+        else:
+            timings.extend(stage_timings)
+    return fraud_scores, model_version
+
+def score_transactions(transactions, model_type="isolation_forest", model_version="latest", models=None):
+    """Score a batch of transactions in one vectorised pass.
+
+    ``transactions`` is a list of transaction dicts or a 2-D array of
+    features in model order. Returns one result per row, shaped like
+    ``score_transaction``'s; invalid rows get ``{"error": ...}`` without
+    affecting the rest of the batch.
+    """
+    n_rows = len(transactions)
+    # Metrics are labelled with the model type that actually scores the rows
+    served_type = served_model_type(model_type)
+    stage = "model_lookup"
+    start = time.perf_counter()
     try:
-        # Handle missing fields by using defaults
-        required_fields = [
-            'amount', 'hour_of_day', 'time_since_last_tx', 
-            'recipient_frequency', 'distance_to_recipient_km'
-        ]
-        
-        # Check if we have the minimum required fields
-        for field in required_fields:
-            if field not in transaction:
-                raise ValueError(f"Missing required field: {field}")
-        
-        # Load the appropriate model
-        if model_type == "autoencoder":
-            model, scaler, threshold = load_model(model_type, model_version)
-            
-            # Convert transaction to DataFrame
-            tx_df = pd.DataFrame([transaction])
-            
-            # Scale features
-            tx_scaled = scaler.transform(tx_df)
-            
-            # Get reconstruction
-            reconstructed = model.predict(tx_scaled)
-            
-            # Calculate reconstruction error (anomaly score)
-            mse = np.mean(np.power(tx_scaled - reconstructed, 2), axis=1)[0]
-            
-            # Convert to 0-100 score
-            fraud_score = int(np.clip(mse * 100, 0, 100))
-            
-            is_fraud = fraud_score > 80  # Configurable threshold
-            
-        else:  # isolation_forest
-            model, scaler, model_version = load_model("isolation_forest", model_version)
-            
-            # Convert transaction to DataFrame
-            tx_df = pd.DataFrame([transaction])
-            
-            # Scale features
-            tx_scaled = scaler.transform(tx_df)
-            
-            # Get anomaly score (-1 for anomaly, 1 for normal)
-            score = model.decision_function(tx_scaled)[0]
-            
-            # Convert to 0-100 score
-            fraud_score = int(max(0, min(100, (1 - (score + 0.5)) * 100)))
-            
-            is_fraud = fraud_score > 80  # Configurable threshold
-        
-        return {
+        models = models or get_models(model_type, model_version)
+        looked_up = time.perf_counter()
+        stage = "prepare_features"
+        feature_names = model_feature_names(models[1])
+        X, valid, errors = prepare_features(transactions, feature_names)
+        prepared = time.perf_counter()
+        stage = "model"
+        timings = [("model_lookup", looked_up - start), ("prepare_features", prepared - looked_up)]
+        fraud_scores, model_version = score_feature_array(X, model_type, model_version, models=models,
+                                                          timings=timings)
+
+    except Exception as e:
+        logger.error(f"Error scoring transactions: {str(e)}")
+        METRICS.inc("fraud_scoring_errors_total", (("stage", stage), ("model_type", served_type)), n_rows)
+        return [{"error": str(e)} for _ in range(n_rows)]
+
+    if METRICS.enabled:
+        timings.append(("total", time.perf_counter() - start))
+        METRICS.record_stages(served_type, model_version, timings, len(valid))
+        if errors:
+            METRICS.inc("fraud_scoring_errors_total", (("stage", "validation"), ("model_type", served_type)),
+                        len(errors))
+
+    results = [None] * n_rows
+    for i, message in errors.items():
+        logger.error(f"Error scoring transaction: {message}")
+        results[i] = {"error": message}
+
+    # Array input has no dicts to echo back, so rebuild them from the features
+    rows = X.tolist() if isinstance(transactions, np.ndarray) else None
+    for i, fraud_score in zip(valid.tolist(), fraud_scores.tolist()):
+        transaction = dict(zip(feature_names, rows[i])) if rows is not None else transactions[i]
+        results[i] = {
             "transaction": transaction,
             "fraud_score": fraud_score,
-            "is_fraud": is_fraud,
+            "is_fraud": fraud_score > FRAUD_SCORE_THRESHOLD,
             "model_type": model_type,
             "model_version": model_version
         }
-        
-    except Exception as e:
-        logger.error(f"Error scoring transaction: {str(e)}")
-        return {"error": str(e)}
+    return results
+
+def score_requests(requests):
+    """Score a list of decoded requests (any shape ``parse_request`` accepts).
+
+    Requests are grouped by model so each group is scored in one batch;
+    results come back in input order.
+    """
+    results = [None] * len(requests)
+    groups = {}
+    for i, input_json in enumerate(requests):
+        transaction, model_type, model_version = parse_request(input_json)
+        groups.setdefault((model_type, model_version), []).append((i, transaction))
+
+    for (model_type, model_version), items in groups.items():
+        group_results = score_transactions([tx for _, tx in items], model_type, model_version)
+        for (i, _), result in zip(items, group_results):
+            results[i] = result
+    return results
 
 def train_models():
     """Train both Isolation Forest and Autoencoder models."""
@@ -461,19 +826,40 @@ if __name__ == "__main__":
     # Check for command line arguments
     if len(sys.argv) > 1 and sys.argv[1] == "train":
         train_models()
+    elif len(sys.argv) > 1 and sys.argv[1] == "train-parallel":
+        # Concurrent training of models and hyperparameter candidates
+        from training_orchestrator import main as train_parallel_main
+        train_parallel_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "train-stream":
+        # Out-of-core training from shards or history files on disk
+        from streaming_training import main as train_stream_main
+        train_stream_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "refresh":
+        # Incremental scaler update and replacement of the oldest trees
+        from online_refresh import main as refresh_main
+        refresh_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "generate-data":
+        # Chunked synthetic datasets beyond what fits in memory
+        from synthetic_data import main as generate_data_main
+        generate_data_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "distill-prescreen":
+        # First cascade tier: distil, evaluate and save the prescreen tree
+        from cascade import main as distill_prescreen_main
+        distill_prescreen_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "score-file":
+        # Bulk re-scoring of historical files; see bulk_scoring.py for options
+        from bulk_scoring import main as score_file_main
+        score_file_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "load-test":
+        # Open-loop traffic replay against a scoring target; see load_test.py
+        from load_test import main as load_test_main
+        load_test_main(sys.argv[2:])
     else:
         # Read transaction from stdin and score it
         try:
             input_json = json.loads(sys.stdin.read())
             # Support old as well as new payload shapes
-            if isinstance(input_json, dict) and "transaction" in input_json:
-                transaction = input_json["transaction"]
-                model_type = input_json.get("model_type", "isolation_forest")
-                model_version = input_json.get("model_version", "latest")
-            else:
-                transaction = input_json
-                model_type = "isolation_forest"
-                model_version = "latest"
+            transaction, model_type, model_version = parse_request(input_json)
                 
             result = score_transaction(transaction, model_type, model_version)
             print(json.dumps(result))
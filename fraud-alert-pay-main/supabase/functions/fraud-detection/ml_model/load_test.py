@@ -0,0 +1,469 @@
+# ml_model/load_test.py
+"""Open-loop load tests of the scoring path.
+
+Replays requests against one target at a scheduled rate and reports
+throughput, latency percentiles, error rate and memory over time, to find
+where a scorer saturates before production does.
+
+Requests are the lines of a recorded NDJSON file (any shape
+``parse_request`` accepts), or synthetic transactions from
+``generate_synthetic_data``, shuffled. They are reused in order when the
+run needs more than there are. ``--model-type``/``--model-version``
+override what each request asks for, to compare models on the same
+traffic.
+
+Targets:
+
+* ``inprocess``: ``score_transaction`` in this process, against
+  ``--model-dir``;
+* ``predict``: one ``predict.py`` process per request, fed on stdin from
+  the current directory, as the Go service runs it;
+* ``http://HOST:PORT``: ``POST /score`` on ``scoring_server.py``;
+* ``unix://PATH`` and ``tcp://HOST:PORT``: line-delimited JSON, as served
+  by ``scoring_server.py --unix`` and ``async_scoring.py``.
+
+With ``--protocol binary`` the server targets send one-row frames (see
+``wire_protocol.py``) of the ``FEATURE_NAMES`` columns instead of JSON.
+
+The load is open-loop: request *i* is sent at its scheduled time whether
+or not earlier ones have been answered, by up to ``--concurrency`` client
+threads, and its latency is measured from that scheduled time. A scorer
+that falls behind therefore shows up as growing latency, not as a
+politely lower send rate. ``--rate`` alone is a constant rate; with
+``--ramp-to`` the rate grows (or shrinks) linearly over ``--duration``.
+The harness is itself Python: the dispatch lag it reports says how far
+behind schedule it fell, which caps what it can prove about a fast
+target.
+
+Memory is the summed RSS of ``--pid`` processes (the server and its
+workers), or of this process when none are given, sampled every
+``--interval`` seconds. A result counts as an error when the call raised
+or the response carries ``"error"``; async fallbacks are counted
+separately. ``--slo-p99-ms`` and ``--slo-error-rate`` make the run exit
+non-zero when exceeded, to catch capacity regressions.
+
+    python fraud_detection.py load-test --target http://127.0.0.1:8500 --rate 200 --ramp-to 2000 --duration 60
+    python fraud_detection.py load-test --target inprocess --replay recorded.ndjson --rate 500 --output run.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from fraud_detection import FEATURE_NAMES, generate_synthetic_data, get_registry, parse_request, score_transaction
+from wire_protocol import (FLAG_FRAUD, FLAG_INVALID, FRAME_CONTENT_TYPE, RESPONSE_MAGIC, decode_response,
+                           encode_request, read_frame)
+from worker_pool import process_memory
+
+logger = logging.getLogger(__name__)
+
+PREDICT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "predict.py")
+
+QUANTILES = (("p50", 50), ("p95", 95), ("p99", 99), ("p99.9", 99.9))
+
+MB = 1024 * 1024
+
+
+def load_requests(path=None, n_requests=10000, model_type=None, model_version=None, velocity=False,
+                  graph=False, seed=42):
+    """Return the requests to replay: the lines of an NDJSON file, else synthetic ones."""
+    if path:
+        with open(path, "r") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        if not requests:
+            raise ValueError(f"{path} holds no requests")
+    else:
+        df, _ = generate_synthetic_data(n_samples=n_requests, velocity=velocity, graph=graph)
+        df = df.sample(frac=1.0, random_state=seed)
+        requests = [{"transaction": transaction} for transaction in df.to_dict(orient="records")]
+
+    if model_type or model_version:
+        overridden = []
+        for request in requests:
+            transaction, request_type, request_version = parse_request(request)
+            overridden.append({"transaction": transaction, "model_type": model_type or request_type,
+                               "model_version": model_version or request_version})
+        requests = overridden
+    return requests
+
+
+def schedule(rate, duration, ramp_to=None):
+    """Return send times in seconds: a constant ``rate``, or a linear ramp to ``ramp_to``."""
+    if ramp_to is None or ramp_to == rate:
+        return np.arange(int(rate * duration)) / rate
+    slope = (ramp_to - rate) / duration
+    sent = np.arange(int((rate + ramp_to) / 2 * duration))
+    # Invert the number sent by time t, rate * t + slope * t**2 / 2
+    return (np.sqrt(rate ** 2 + 2 * slope * sent) - rate) / slope
+
+
+def frame_for(request):
+    """Encode a request as a one-row float64 frame of the ``FEATURE_NAMES`` columns."""
+    transaction, model_type, model_version = parse_request(request)
+    row = [[float(transaction[name]) for name in FEATURE_NAMES]]
+    return encode_request(np.array(row), model_type, model_version, dtype=np.float64)
+
+
+def frame_result(frame):
+    """Turn a one-row response frame into a result dict like the JSON one."""
+    try:
+        fraud_scores, flags, model_version = decode_response(frame)
+    except ValueError as e:
+        return {"error": str(e)}
+    if flags[0] & FLAG_INVALID:
+        return {"error": "Transaction has a non-finite feature"}
+    return {"fraud_score": int(fraud_scores[0]), "is_fraud": bool(flags[0] & FLAG_FRAUD),
+            "model_version": model_version}
+
+
+class InProcessTarget:
+    """``score_transaction`` in this process, models from the process-wide registry."""
+
+    def __init__(self, model_dir="model"):
+        get_registry(model_dir)
+
+    def call(self, request):
+        transaction, model_type, model_version = parse_request(request)
+        return score_transaction(transaction, model_type, model_version)
+
+
+class PredictTarget:
+    """One ``predict.py`` run per request."""
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+
+    def call(self, request):
+        proc = subprocess.run([sys.executable, PREDICT_SCRIPT], input=json.dumps(request).encode("utf-8"),
+                              capture_output=True, timeout=self.timeout)
+        return json.loads(proc.stdout)
+
+
+class SocketTarget:
+    """Line-delimited JSON, or binary frames, over one connection per client thread."""
+
+    def __init__(self, family, address, binary=False, timeout=10.0):
+        self.family = family
+        self.address = address
+        self.binary = binary
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _stream(self):
+        stream = getattr(self.local, "stream", None)
+        if stream is None:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            stream = self.local.stream = sock.makefile("rwb")
+            sock.close()
+        return stream
+
+    def call(self, request):
+        payload = frame_for(request) if self.binary else json.dumps(request).encode("utf-8") + b"\n"
+        stream = self._stream()
+        try:
+            stream.write(payload)
+            stream.flush()
+            response = read_frame(stream, RESPONSE_MAGIC) if self.binary else stream.readline()
+            if not response:
+                raise ConnectionError("Scoring server closed the connection")
+        except Exception:
+            # Reconnect on the next request rather than reuse a stream left mid-response
+            self.local.stream = None
+            stream.close()
+            raise
+        return frame_result(response) if self.binary else json.loads(response)
+
+
+class HTTPTarget:
+    """``POST /score`` over one keep-alive connection per client thread."""
+
+    def __init__(self, address, binary=False, timeout=10.0):
+        self.address = address
+        self.binary = binary
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def call(self, request):
+        if self.binary:
+            body, content_type = frame_for(request), FRAME_CONTENT_TYPE
+        else:
+            body, content_type = json.dumps(request).encode("utf-8"), "application/json"
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.address, timeout=self.timeout)
+        try:
+            connection.request("POST", "/score", body, {"Content-Type": content_type})
+            payload = connection.getresponse().read()
+        except Exception:
+            self.local.connection = None
+            connection.close()
+            raise
+        return frame_result(payload) if self.binary else json.loads(payload)
+
+
+def make_target(target, model_dir="model", protocol="json", timeout=10.0):
+    """Build the client for ``inprocess``, ``predict`` or a ``http/unix/tcp://`` address."""
+    binary = protocol == "binary"
+    scheme, _, address = target.partition("://")
+    if binary and scheme not in ("http", "unix", "tcp"):
+        raise ValueError("Binary frames need an http://, unix:// or tcp:// target")
+    if target == "inprocess":
+        return InProcessTarget(model_dir)
+    if target == "predict":
+        return PredictTarget(timeout)
+    if scheme == "http":
+        return HTTPTarget(address.rstrip("/"), binary, timeout)
+    if scheme == "unix":
+        return SocketTarget(socket.AF_UNIX, address, binary, timeout)
+    if scheme == "tcp":
+        host, _, port = address.rpartition(":")
+        return SocketTarget(socket.AF_INET, (host or "127.0.0.1", int(port)), binary, timeout)
+    raise ValueError(f"Unknown target: {target}")
+
+
+def rss_bytes(pids=()):
+    """Summed RSS of ``pids`` (this process when empty); processes that are gone count as 0."""
+    total = 0
+    for pid in pids or (os.getpid(),):
+        memory = process_memory(pid)
+        if memory is not None:
+            total += memory["rss"]
+    return total
+
+
+def latency_summary(seconds):
+    """Percentiles, mean and max of latencies in seconds, reported in milliseconds."""
+    if not len(seconds):
+        return {name: None for name in [name for name, _ in QUANTILES] + ["mean", "max"]}
+    summary = {name: float(np.percentile(seconds, q)) * 1e3 for name, q in QUANTILES}
+    summary["mean"] = float(seconds.mean()) * 1e3
+    summary["max"] = float(seconds.max()) * 1e3
+    return summary
+
+
+class LoadTest:
+    """One open-loop run of a request schedule against a target."""
+
+    def __init__(self, target, requests, send_times, concurrency=64, interval=1.0, pids=()):
+        self.target = target
+        self.requests = requests
+        self.send_times = np.asarray(send_times, dtype=np.float64)
+        self.concurrency = concurrency
+        self.interval = interval
+        self.pids = tuple(pids)
+
+        n = len(self.send_times)
+        self.latency = np.full(n, np.nan)
+        self.finished = np.full(n, np.nan)
+        self.failed = np.zeros(n, dtype=bool)
+        self.fallback = np.zeros(n, dtype=bool)
+        self.dispatch_lag = np.zeros(n)
+        self.memory = []
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._start = None
+
+    def warm_up(self, n_requests):
+        """Send requests one at a time, unrecorded, so model loading stays out of the results."""
+        for i in range(n_requests):
+            try:
+                self.target.call(self.requests[i % len(self.requests)])
+            except Exception as e:
+                logger.error(f"Error during warm-up: {str(e)}")
+
+    def run(self):
+        """Send every scheduled request and wait for the last answer; returns ``summary()``."""
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample_memory, args=(stop,), daemon=True)
+        self._start = time.perf_counter()
+        sampler.start()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for i, send_time in enumerate(self.send_times.tolist()):
+                scheduled = self._start + send_time
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.dispatch_lag[i] = max(0.0, time.perf_counter() - scheduled)
+                pool.submit(self._send, i, scheduled)
+        self.elapsed = time.perf_counter() - self._start
+        stop.set()
+        sampler.join()
+        return self.summary()
+
+    def _send(self, i, scheduled):
+        try:
+            result = self.target.call(self.requests[i % len(self.requests)])
+            error = result.get("error") if isinstance(result, dict) else "Response is not a JSON object"
+            self.fallback[i] = bool(result.get("fallback")) if isinstance(result, dict) else False
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        done = time.perf_counter()
+        self.latency[i] = done - scheduled
+        self.finished[i] = done - self._start
+        if error is not None:
+            self.failed[i] = True
+            with self._lock:
+                self.errors[str(error)[:200]] += 1
+
+    def _sample_memory(self, stop):
+        while True:
+            self.memory.append((time.perf_counter() - self._start, rss_bytes(self.pids)))
+            if stop.wait(self.interval):
+                return
+
+    def timeline(self):
+        """Per-interval offered and completed rates, latency, errors and RSS."""
+        rows = []
+        memory = np.array(self.memory) if self.memory else np.zeros((0, 2))
+        for start in np.arange(0.0, self.elapsed, self.interval):
+            end = start + self.interval
+            done = (self.finished >= start) & (self.finished < end)
+            answered = done & ~self.failed
+            rss = memory[(memory[:, 0] >= start) & (memory[:, 0] < end), 1]
+            latency = latency_summary(self.latency[answered])
+            rows.append({
+                "start": float(start),
+                "offered_per_second": int(((self.send_times >= start) & (self.send_times < end)).sum()) / self.interval,
+                "completed_per_second": int(done.sum()) / self.interval,
+                "p50_ms": latency["p50"],
+                "p99_ms": latency["p99"],
+                "errors": int((done & self.failed).sum()),
+                "rss_mb": float(rss.max()) / MB if len(rss) else None,
+            })
+        return rows
+
+    def summary(self):
+        n = len(self.send_times)
+        completed = ~np.isnan(self.finished)
+        answered = completed & ~self.failed
+        rss = [sample for _, sample in self.memory]
+        return {
+            "requests": n,
+            "completed": int(completed.sum()),
+            "elapsed_seconds": self.elapsed,
+            "offered_per_second": n / self.send_times[-1] if n > 1 and self.send_times[-1] > 0 else float(n),
+            "throughput_per_second": int(completed.sum()) / self.elapsed if self.elapsed else 0.0,
+            "error_rate": float(self.failed.sum()) / n if n else 0.0,
+            "fallback_rate": float(self.fallback.sum()) / n if n else 0.0,
+            "latency_ms": latency_summary(self.latency[answered]),
+            "max_dispatch_lag_ms": float(self.dispatch_lag.max()) * 1e3 if n else 0.0,
+            "peak_rss_mb": max(rss) / MB if rss else None,
+            "errors": dict(self.errors.most_common(10)),
+            "timeline": self.timeline(),
+        }
+
+
+def format_ms(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def print_report(report):
+    print(f"{'t(s)':>6} {'offered/s':>10} {'done/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'RSS MB':>8}")
+    for row in report["timeline"]:
+        rss = f"{row['rss_mb']:.0f}" if row["rss_mb"] is not None else "-"
+        print(f"{row['start']:>6.0f} {row['offered_per_second']:>10.0f} {row['completed_per_second']:>8.0f} "
+              f"{format_ms(row['p50_ms']):>8} {format_ms(row['p99_ms']):>8} {row['errors']:>7} {rss:>8}")
+
+    latency = report["latency_ms"]
+    print()
+    print(f"target {report['target']} ({report['protocol']}), {report['profile']}, "
+          f"{report['requests']} requests from {report['source']}")
+    print(f"throughput {report['throughput_per_second']:.1f}/s (offered {report['offered_per_second']:.1f}/s), "
+          f"errors {report['error_rate']:.2%}, fallbacks {report['fallback_rate']:.2%}")
+    print("latency ms  " + "  ".join(f"{name} {format_ms(latency[name])}"
+                                     for name in [name for name, _ in QUANTILES] + ["max"]))
+    peak = f"{report['peak_rss_mb']:.0f} MB" if report["peak_rss_mb"] is not None else "-"
+    print(f"peak RSS {peak}, max dispatch lag {report['max_dispatch_lag_ms']:.1f} ms")
+    if report.get("child_peak_rss_mb"):
+        print(f"peak predict.py RSS {report['child_peak_rss_mb']:.0f} MB")
+    for message, count in report["errors"].items():
+        print(f"  {count} x {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fraud_detection.py load-test",
+                                     description="Open-loop load test of a scoring target")
+    parser.add_argument("--target", default="inprocess",
+                        help="inprocess, predict, http://HOST:PORT, unix://PATH or tcp://HOST:PORT")
+    parser.add_argument("--protocol", choices=["json", "binary"], default="json",
+                        help="request framing for server targets")
+    parser.add_argument("--replay", metavar="PATH", help="NDJSON file of recorded requests (default: synthetic)")
+    parser.add_argument("--requests", type=int, default=10000, help="synthetic requests to generate")
+    parser.add_argument("--velocity-features", action="store_true",
+                        help="add velocity features to synthetic transactions")
+    parser.add_argument("--graph-features", action="store_true",
+                        help="add graph features to synthetic transactions")
+    parser.add_argument("--model-type", help="override the model type of every request")
+    parser.add_argument("--model-version", help="override the model version of every request")
+    parser.add_argument("--model-dir", default="model", help="models for the inprocess target")
+    parser.add_argument("--rate", type=float, default=100.0, help="requests per second (at the start of a ramp)")
+    parser.add_argument("--ramp-to", type=float, help="rate reached at the end of the run")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of scheduled load")
+    parser.add_argument("--concurrency", type=int, default=64, help="client threads, the most requests in flight")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a request counts as failed")
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests sent first")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds per timeline row and RSS sample")
+    parser.add_argument("--pid", type=int, nargs="*", default=[],
+                        help="processes whose RSS to sample (default: this one)")
+    parser.add_argument("--slo-p99-ms", type=float, help="fail the run when p99 latency exceeds this")
+    parser.add_argument("--slo-error-rate", type=float, help="fail the run when the error rate exceeds this")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.rate <= 0 and not args.ramp_to:
+        parser.error("--rate (or --ramp-to) must be positive")
+
+    try:
+        requests = load_requests(args.replay, args.requests, args.model_type, args.model_version,
+                                 velocity=args.velocity_features, graph=args.graph_features, seed=args.seed)
+        target = make_target(args.target, args.model_dir, args.protocol, args.timeout)
+        load_test = LoadTest(target, requests, schedule(args.rate, args.duration, args.ramp_to),
+                             concurrency=args.concurrency, interval=args.interval, pids=args.pid)
+        load_test.warm_up(args.warmup)
+        report = load_test.run()
+    except Exception as e:
+        logger.error(f"Error running load test against {args.target}: {str(e)}")
+        sys.exit(1)
+
+    profile = (f"ramp {args.rate:g}/s to {args.ramp_to:g}/s" if args.ramp_to is not None
+               else f"constant {args.rate:g}/s") + f" for {args.duration:g}s"
+    report = dict({"target": args.target, "protocol": args.protocol, "profile": profile,
+                   "source": args.replay or "synthetic", "model_type": args.model_type,
+                   "model_version": args.model_version, "concurrency": args.concurrency}, **report)
+    if args.target == "predict":
+        # ru_maxrss is in kB on Linux
+        report["child_peak_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024 / MB
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print_report(report)
+
+    violations = []
+    p99 = report["latency_ms"]["p99"]
+    if args.slo_p99_ms is not None and (p99 is None or p99 > args.slo_p99_ms):
+        violations.append(f"p99 {format_ms(p99)} ms > {args.slo_p99_ms:g} ms")
+    if args.slo_error_rate is not None and report["error_rate"] > args.slo_error_rate:
+        violations.append(f"error rate {report['error_rate']:.2%} > {args.slo_error_rate:.2%}")
+    if violations:
+        print("SLO violated: " + "; ".join(violations))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,228 @@
+# ml_model/metrics.py
+"""Low-overhead counters and latency histograms for the scoring path.
+
+Instruments are created on first use and cached by ``(name, labels)``, so
+recording is one dict lookup, a ``bisect`` over fixed bucket bounds and a
+few integer updates under a per-instrument lock. The scoring path records
+all of a request's stage timings with one ``record_stages`` call, which
+takes a single lock for the whole set. Everything is exported in the
+Prometheus text format by ``render`` (served on ``/metrics`` by the
+scoring server) or written to a file by ``dump``.
+
+Set ``FRAUD_METRICS=0`` to turn recording into a no-op, and
+``FRAUD_METRICS_FILE`` to have one-shot processes such as ``predict.py``
+dump their metrics on exit.
+"""
+import atexit
+import os
+import threading
+from bisect import bisect_left
+
+# Seconds; log-spaced from 1 us to 10 s
+LATENCY_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock=None):
+        self.value = 0
+        self._lock = lock or threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds=LATENCY_BUCKETS, lock=None):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.sum = 0.0
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class StageSet:
+    """Stage latency histograms and a transaction counter for one model version.
+
+    All instruments share one lock so a request's timings are recorded in
+    one critical section.
+    """
+
+    __slots__ = ("metrics", "labels", "histograms", "transactions", "_lock")
+
+    def __init__(self, metrics, model_type, model_version):
+        self.metrics = metrics
+        self.labels = (("model_type", model_type), ("model_version", model_version))
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self.transactions = metrics.counter("fraud_scoring_transactions_total", self.labels, lock=self._lock)
+
+    def _histogram(self, stage):
+        labels = (("stage", stage),) + self.labels
+        histogram = self.metrics.histogram("fraud_scoring_stage_seconds", labels, lock=self._lock)
+        self.histograms[stage] = histogram
+        return histogram
+
+    def record(self, timings, transactions=0):
+        histograms = self.histograms
+        bounds = LATENCY_BUCKETS
+        with self._lock:
+            for stage, seconds in timings:
+                histogram = histograms.get(stage)
+                if histogram is None:
+                    histogram = self._histogram(stage)
+                histogram.counts[bisect_left(bounds, seconds)] += 1
+                histogram.sum += seconds
+            self.transactions.value += transactions
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Registry of counters and histograms keyed by name and label values."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._stages = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        """Set the ``# HELP`` text for a metric family."""
+        self._help[name] = help_text
+
+    def counter(self, name, labels=(), lock=None):
+        """Return the counter for ``name`` and a tuple of ``(label, value)`` pairs."""
+        key = (name, labels)
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter(lock))
+        return counter
+
+    def histogram(self, name, labels=(), bounds=LATENCY_BUCKETS, lock=None):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(bounds, lock))
+        return histogram
+
+    def inc(self, name, labels=(), amount=1):
+        if self.enabled:
+            self.counter(name, labels).inc(amount)
+
+    def observe(self, name, value, labels=()):
+        if self.enabled:
+            self.histogram(name, labels).observe(value)
+
+    def record_stages(self, model_type, model_version, timings, transactions=0):
+        """Record ``(stage, seconds)`` timings and a transaction count for one request or batch."""
+        if not self.enabled:
+            return
+        key = (model_type, model_version)
+        stages = self._stages.get(key)
+        if stages is None:
+            with self._lock:
+                stages = self._stages.get(key)
+            if stages is None:
+                stages = StageSet(self, model_type, model_version)
+                with self._lock:
+                    stages = self._stages.setdefault(key, stages)
+        stages.record(timings, transactions)
+
+    def add_collector(self, collector):
+        """Register ``collector()`` returning ``(name, type, labels, value)`` samples at render time."""
+        self._collectors.append(collector)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._stages.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        families = {}
+        for (name, labels), counter in list(self._counters.items()):
+            families.setdefault((name, "counter"), []).append((labels, counter.value))
+        for collector in self._collectors:
+            for name, metric_type, labels, value in collector():
+                families.setdefault((name, metric_type), []).append((tuple(labels), value))
+
+        for (name, metric_type), samples in sorted(families.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        histograms = {}
+        for (name, labels), histogram in list(self._histograms.items()):
+            histograms.setdefault(name, []).append((labels, histogram))
+        for name, entries in sorted(histograms.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in entries:
+                with histogram._lock:
+                    counts = list(histogram.counts)
+                    total = histogram.sum
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write ``render()`` output to ``path`` atomically."""
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics(enabled=os.environ.get("FRAUD_METRICS", "1") != "0")
+
+METRICS.describe("fraud_scoring_stage_seconds",
+                 "Time spent per scoring stage and batch, by model type and version")
+METRICS.describe("fraud_scoring_transactions_total", "Transactions scored, by model type and version")
+METRICS.describe("fraud_scoring_errors_total", "Scoring failures, by stage and model type")
+METRICS.describe("fraud_request_parse_seconds", "Time spent decoding request JSON in the scoring server")
+METRICS.describe("fraud_model_load_seconds", "Time spent in load_model, by model type")
+METRICS.describe("fraud_model_loads_total", "load_model calls, by model type and result")
+METRICS.describe("fraud_cascade_rows_total", "Rows answered by each cascade tier, by model type")
+
+if os.environ.get("FRAUD_METRICS_FILE"):
+    atexit.register(METRICS.dump, os.environ["FRAUD_METRICS_FILE"])
@@ -0,0 +1,157 @@
+# ml_model/micro_batcher.py
+"""Micro-batching scheduler in front of the vectorised scorer.
+
+Callers submit one transaction at a time; a single flush thread collects
+them and hands them to ``score_transactions`` as a batch once either
+``max_batch_size`` requests are waiting or the oldest one has waited
+``max_wait_ms``. Results are fanned back out through futures.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from fraud_detection import score_transactions
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds for the batch size histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class MicroBatcher:
+    """Coalesces single-transaction requests into vectorised batches."""
+
+    def __init__(self, max_batch_size=64, max_wait_ms=2.0, score_batch=score_transactions):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.score_batch = score_batch
+
+        self._pending = deque()  # (enqueued_at, transaction, model_type, model_version, future)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._requests = 0
+        self._batches = 0
+        self._flush_full = 0
+        self._flush_timeout = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._queue_wait_seconds = 0.0
+        self._max_queue_wait_seconds = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, transaction, model_type="isolation_forest", model_version="latest"):
+        """Queue a transaction and return a future for its scoring result."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.append((time.perf_counter(), transaction, model_type, model_version, future))
+            self._requests += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._cond.notify()
+        return future
+
+    def score(self, transaction, model_type="isolation_forest", model_version="latest", timeout=None):
+        """Score one transaction through the batcher and wait for the result."""
+        return self.submit(transaction, model_type, model_version).result(timeout)
+
+    def close(self):
+        """Flush what is queued and stop the flush thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def metrics(self):
+        """Return the batcher's configuration and counters."""
+        with self._cond:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queue_depth": len(self._pending),
+                "requests_total": self._requests,
+                "batches_total": self._batches,
+                "flush_full_total": self._flush_full,
+                "flush_timeout_total": self._flush_timeout,
+                "batch_size_buckets": dict(zip([str(b) for b in BATCH_SIZE_BUCKETS] + ["+Inf"],
+                                               self._batch_size_counts)),
+                "queue_wait_seconds_sum": self._queue_wait_seconds,
+                "queue_wait_seconds_max": self._max_queue_wait_seconds,
+            }
+
+    def metric_samples(self):
+        """Batcher counters as ``(name, type, labels, value)`` samples for ``METRICS``."""
+        m = self.metrics()
+        return [
+            ("fraud_batcher_max_batch_size", "gauge", (), m["max_batch_size"]),
+            ("fraud_batcher_max_wait_seconds", "gauge", (), m["max_wait_ms"] / 1000.0),
+            ("fraud_batcher_queue_depth", "gauge", (), m["queue_depth"]),
+            ("fraud_batcher_requests_total", "counter", (), m["requests_total"]),
+            ("fraud_batcher_batches_total", "counter", (), m["batches_total"]),
+            ("fraud_batcher_flushes_total", "counter", (("reason", "full"),), m["flush_full_total"]),
+            ("fraud_batcher_flushes_total", "counter", (("reason", "timeout"),), m["flush_timeout_total"]),
+            ("fraud_batcher_queue_wait_seconds_total", "counter", (), m["queue_wait_seconds_sum"]),
+        ]
+
+    def _next_batch(self):
+        """Block until a batch is due and pop it; returns None once closed and drained."""
+        max_wait = self.max_wait_ms / 1000.0
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            deadline = self._pending[0][0] + max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            full = len(self._pending) >= self.max_batch_size
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch_size))]
+
+            now = time.perf_counter()
+            self._batches += 1
+            if full:
+                self._flush_full += 1
+            else:
+                self._flush_timeout += 1
+            for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+                if len(batch) <= bound:
+                    break
+            else:
+                i = len(BATCH_SIZE_BUCKETS)
+            self._batch_size_counts[i] += 1
+            for enqueued_at, *_ in batch:
+                waited = now - enqueued_at
+                self._queue_wait_seconds += waited
+                self._max_queue_wait_seconds = max(self._max_queue_wait_seconds, waited)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            # A batch may mix models; score each group in its own pass
+            groups = {}
+            for _, transaction, model_type, model_version, future in batch:
+                groups.setdefault((model_type, model_version), []).append((transaction, future))
+
+            for (model_type, model_version), items in groups.items():
+                try:
+                    results = self.score_batch([tx for tx, _ in items], model_type, model_version)
+                except Exception as e:
+                    logger.error(f"Error scoring micro-batch: {str(e)}")
+                    results = [{"error": str(e)} for _ in items]
+                for (_, future), result in zip(items, results):
+                    future.set_result(result)
@@ -0,0 +1,119 @@
+# ml_model/model_artifacts.py
+"""Versioned, memory-mappable, pickle-free model artifact format.
+
+An artifact is a directory inside ``model/<version>/``::
+
+    model/<version>/isolation_forest/
+        header.json          format version, kind, scalar attributes, array index
+        feature.npy          one raw .npy file per array
+        threshold.npy
+        ...
+
+Arrays are opened with ``np.load(mmap_mode="r", allow_pickle=False)``, so
+loading touches no model data up front, every process that maps the same
+version shares its pages through the OS page cache, and nothing is ever
+unpickled. ``header.json`` is written last (via rename), so a directory
+without it is an incomplete export and is ignored.
+"""
+import json
+import os
+
+import numpy as np
+
+ARTIFACT_FORMAT = "fraud-model-artifact"
+ARTIFACT_FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+
+
+class CompiledScaler:
+    """StandardScaler constants with the attributes the scoring path reads."""
+
+    with_mean = True
+    with_std = True
+
+    def __init__(self, mean, scale, feature_names):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.feature_names_in_ = np.asarray(feature_names)
+        self.n_features_in_ = len(mean)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+def scaler_arrays(scaler):
+    """Return the arrays and attributes needed to rebuild a fitted StandardScaler."""
+    n_features = scaler.n_features_in_
+    feature_names = getattr(scaler, "feature_names_in_", None)
+    if feature_names is None:
+        feature_names = [f"x{i}" for i in range(n_features)]
+    arrays = {
+        "scaler_mean": np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(n_features), dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_ if scaler.with_std else np.ones(n_features), dtype=np.float64),
+    }
+    return arrays, {"feature_names": [str(name) for name in feature_names]}
+
+
+def load_scaler(arrays, attrs):
+    """Rebuild a ``CompiledScaler`` from ``scaler_arrays`` output."""
+    return CompiledScaler(arrays["scaler_mean"], arrays["scaler_scale"], attrs["feature_names"])
+
+
+def artifact_exists(path):
+    """Return True if ``path`` holds a complete artifact."""
+    return os.path.isfile(os.path.join(path, HEADER_FILE))
+
+
+def save_artifact(path, kind, arrays, attrs=None):
+    """Write ``arrays`` as raw .npy files plus a JSON header into ``path``."""
+    os.makedirs(path, exist_ok=True)
+    index = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        file_name = f"{name}.npy"
+        np.save(os.path.join(path, file_name), array, allow_pickle=False)
+        index[name] = {"file": file_name, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    header = {
+        "format": ARTIFACT_FORMAT,
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "kind": kind,
+        "attrs": attrs or {},
+        "arrays": index,
+    }
+    # The header marks the export as complete, so it goes in last
+    tmp_header = os.path.join(path, f"{HEADER_FILE}.tmp{os.getpid()}")
+    with open(tmp_header, "w") as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp_header, os.path.join(path, HEADER_FILE))
+    return path
+
+
+def load_artifact(path, kind=None, mmap=True):
+    """Open an artifact; returns ``(attrs, arrays)`` with arrays memory-mapped read-only."""
+    with open(os.path.join(path, HEADER_FILE), "r") as f:
+        header = json.load(f)
+
+    if header.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a model artifact")
+    if header.get("format_version", 0) > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version {header['format_version']} in {path}")
+    if kind is not None and header.get("kind") != kind:
+        raise ValueError(f"Expected a {kind} artifact in {path}, found {header.get('kind')}")
+
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        array = np.load(os.path.join(path, entry["file"]), mmap_mode="r" if mmap else None,
+                        allow_pickle=False)
+        if array.dtype.str != entry["dtype"] or list(array.shape) != entry["shape"]:
+            raise ValueError(f"Array {name} in {path} does not match its header")
+        # A plain ndarray view of the mapping: every slice or take of an
+        # np.memmap runs its Python-level __array_finalize__, which costs more
+        # than scoring a single row
+        arrays[name] = array.view(np.ndarray)
+    return header["attrs"], arrays
+
+
+def arrays_nbytes(arrays):
+    """Total size of a dict of arrays, mapped or not."""
+    return sum(array.nbytes for array in arrays.values())
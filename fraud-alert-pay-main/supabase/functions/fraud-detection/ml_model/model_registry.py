@@ -0,0 +1,223 @@
+# ml_model/model_registry.py
+"""In-process cache of loaded models with hot reload of ``model/current``.
+
+Loaded ``(model, scaler, threshold/version)`` tuples are kept in memory keyed
+by ``(model_type, model_version)`` and evicted least-recently-used once
+either the entry count or the estimated memory cap is exceeded.
+
+Requests for ``"latest"`` follow the ``current`` symlink that
+``train_isolation_forest`` rewrites, or for the autoencoder the
+``current_autoencoder`` one that ``train_autoencoder`` rewrites. The links
+are re-read at most once per ``poll_interval``; when one moves, the new version is loaded while the
+previous one keeps serving, and the swap is a single reference assignment,
+so in-flight requests finish on whichever tuple they already hold.
+Listeners are told whenever any of the links moves.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Symlink "latest" follows, per model type; every other type follows "current"
+CURRENT_LINKS = {"autoencoder": "current_autoencoder"}
+LINKS = ("current",) + tuple(CURRENT_LINKS.values())
+
+
+def current_link(model_type="isolation_forest"):
+    """Return the name of the symlink ``"latest"`` resolves through for a model type."""
+    return CURRENT_LINKS.get(model_type, "current")
+
+
+class ModelRegistry:
+    """LRU cache of loaded models keyed by ``(model_type, model_version)``."""
+
+    def __init__(self, loader, model_dir="model", max_entries=8,
+                 max_bytes=1024 * 1024 * 1024, poll_interval=1.0):
+        self.loader = loader
+        self.model_dir = model_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.poll_interval = poll_interval
+
+        self._entries = OrderedDict()  # key -> (models, size_bytes)
+        self._total_bytes = 0
+        self._latest = {}  # model_type -> (current target, models)
+        self._failed = {}  # key -> monotonic time of the last failed load
+        self._listeners = []
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._link_targets = {link: self._read_current(link) for link in LINKS}
+        self._next_poll = time.monotonic() + poll_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def get(self, model_type="isolation_forest", model_version="latest"):
+        """Return the ``load_model`` tuple for a model, loading it if needed."""
+        if model_version != "latest":
+            return self._get_entry(model_type, model_version)
+
+        target = self._poll_current(model_type)
+        served = self._latest.get(model_type)
+        if served is not None and served[0] == target:
+            self.hits += 1
+            return served[1]
+
+        if served is not None:
+            # A new version was published. Keep serving the old one while a
+            # single thread loads the replacement.
+            if not self._load_lock.acquire(blocking=False):
+                self.hits += 1
+                return served[1]
+            self._load_lock.release()
+            failed_at = self._failed.get((model_type, target))
+            if failed_at is not None and time.monotonic() - failed_at < self.poll_interval:
+                self.hits += 1
+                return served[1]
+
+        try:
+            models = self._get_entry(model_type, target or "latest")
+        except Exception:
+            if served is None:
+                raise
+            self._failed[(model_type, target)] = time.monotonic()
+            logger.error(f"Failed to load {model_type} version {target}, "
+                         f"still serving {served[0]}")
+            return served[1]
+
+        self._latest[model_type] = (target, models)
+        if served is not None:
+            self.reloads += 1
+            logger.info(f"Swapped {model_type} model from version {served[0]} to {target}")
+        return models
+
+    def add_listener(self, callback):
+        """Call ``callback(old_target, new_target)`` when any current link moves."""
+        self._listeners.append(callback)
+
+    def pin_current(self):
+        """Stop following ``current``; ``"latest"`` keeps the version it resolves to now.
+
+        Pre-fork workers share the models their parent loaded, so the
+        parent rolls them onto a new version instead of each loading it.
+        """
+        self._next_poll = float("inf")
+
+    def current_version(self, model_type="isolation_forest"):
+        """Return the version ``"latest"`` resolves to for a model type, if any."""
+        return self._poll_current(model_type)
+
+    def clear(self):
+        """Drop all cached models."""
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """Return cache counters and occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "current_version": self._link_targets.get("current"),
+            }
+
+    def _get_entry(self, model_type, model_version):
+        key = (model_type, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        with self._load_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+            self.misses += 1
+            logger.info(f"Loading {model_type} model (version: {model_version})")
+            models = self.loader(model_type, model_version, model_dir=self.model_dir)
+            size = _estimate_size(models)
+
+            with self._lock:
+                self._entries[key] = (models, size)
+                self._total_bytes += size
+                self._failed.pop(key, None)
+                self._evict()
+            return models
+
+    def _evict(self):
+        """Evict least-recently-used entries until within limits."""
+        served = {(model_type, target or "latest")
+                  for model_type, (target, _) in self._latest.items()}
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            if key in served:
+                continue
+            _, size = self._entries.pop(key)
+            self._total_bytes -= size
+            self.evictions += 1
+            logger.info(f"Evicted {key[0]} model version {key[1]} from registry")
+
+    def _read_current(self, link="current"):
+        current_symlink = os.path.join(self.model_dir, link)
+        try:
+            return os.readlink(current_symlink)
+        except OSError:
+            return None
+
+    def _poll_current(self, model_type="isolation_forest"):
+        now = time.monotonic()
+        if now >= self._next_poll:
+            self._next_poll = now + self.poll_interval
+            for link in LINKS:
+                target = self._read_current(link)
+                previous = self._link_targets.get(link)
+                if target == previous:
+                    continue
+                self._link_targets[link] = target
+                logger.info(f"Model symlink {link} moved from {previous} to {target}")
+                for callback in self._listeners:
+                    try:
+                        callback(previous, target)
+                    except Exception as e:
+                        logger.error(f"Error in registry listener: {str(e)}")
+        return self._link_targets.get(current_link(model_type))
+
+
+def _estimate_size(models):
+    """Approximate the in-memory footprint of a loaded model tuple."""
+    size = 0
+    for obj in models:
+        # Array-backed models report their own size; pickling a mapped
+        # artifact would read every page just to measure it
+        nbytes = getattr(obj, "nbytes", None)
+        if isinstance(nbytes, int):
+            size += nbytes
+            continue
+        try:
+            size += len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            logger.debug(f"Could not estimate size of {type(obj).__name__}")
+    return size
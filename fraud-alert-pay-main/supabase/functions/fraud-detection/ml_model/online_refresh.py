@@ -0,0 +1,271 @@
+# ml_model/online_refresh.py
+"""Online refresh of the Isolation Forest from recent transactions.
+
+A full ``train_isolation_forest`` run regenerates the data, refits the
+scaler and grows every tree. ``OnlineRefresher`` follows drift for a
+fraction of that:
+
+* ``update`` consumes chunks of recent transactions. They update the
+  ``StandardScaler`` through ``partial_fit``, with the rows seen so far
+  capped at ``scaler_memory`` before each chunk, so the statistics keep
+  following the traffic instead of freezing. The newest ``window_size``
+  rows are kept in a ring buffer.
+* ``refresh`` drops the oldest ``trees_per_refresh`` trees and grows as
+  many new ones on the scaled window. The kept trees were split in the
+  old scaled space, so their thresholds are remapped to the new scaler
+  (``x > t`` under the old scaling is exactly ``x > t'`` under the new
+  one), and the decision offset is re-estimated at the model's
+  contamination on up to ``offset_rows`` rows of the window.
+* the result is published as a new version: pickles, exported forest and
+  metadata are written to a temporary directory that is renamed into
+  place, and only then is ``current`` repointed.
+
+A refresh therefore grows K trees instead of all of them. Scoring the
+offset sample and re-exporting the forest still scale with its size, but
+both are far cheaper than growing it. That makes hourly refreshes
+affordable. Trees are
+kept oldest first and ``metadata.json`` records the refresh generation
+of each one. A refreshed version has no cascade prescreen until one is
+distilled for it.
+
+    python fraud_detection.py refresh recent/*.parquet --trees 10 --window 50000
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from compiled_forest import TREE_LEAF, save_compiled_forest
+from fraud_detection import model_feature_names, update_current_symlink
+
+logger = logging.getLogger(__name__)
+
+# Window rows scored to re-estimate the decision offset
+OFFSET_ROWS = 10000
+
+
+def resolve_version(model_dir, model_version="latest"):
+    """Return the version ``current`` points at for ``"latest"``, else ``model_version``."""
+    if model_version != "latest":
+        return model_version
+    current_symlink = os.path.join(model_dir, "current")
+    if not os.path.islink(current_symlink):
+        raise ValueError(f"{model_dir} has no current model to refresh")
+    return os.readlink(current_symlink)
+
+
+def remap_thresholds(model, old_mean, old_scale, new_mean, new_scale):
+    """Move every tree's split thresholds from the old scaling to the new one, in place."""
+    for estimator, estimator_features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        internal = tree.children_left != TREE_LEAF
+        feature = np.asarray(estimator_features)[tree.feature[internal]]
+        tree.threshold[internal] = ((tree.threshold[internal] * old_scale[feature] + old_mean[feature]
+                                     - new_mean[feature]) / new_scale[feature])
+
+
+def replace_oldest_trees(model, new_model, n_trees):
+    """Swap the first ``n_trees`` estimators of ``model`` for those of ``new_model``."""
+    model.estimators_ = list(model.estimators_[n_trees:]) + list(new_model.estimators_)
+    model.estimators_features_ = list(model.estimators_features_[n_trees:]) + list(new_model.estimators_features_)
+    # Per-tree caches sklearn scores from
+    for name in ("_average_path_length_per_tree", "_decision_path_lengths"):
+        if hasattr(model, name):
+            setattr(model, name, tuple(getattr(model, name)[n_trees:]) + tuple(getattr(new_model, name)))
+    if hasattr(model, "_seeds"):
+        model._seeds = np.concatenate([model._seeds[n_trees:], new_model._seeds])
+
+
+class OnlineRefresher:
+    """Incremental scaler plus rolling replacement of the oldest trees."""
+
+    def __init__(self, model_dir="model", base_version="latest", trees_per_refresh=10,
+                 window_size=50000, scaler_memory=1000000, offset_rows=OFFSET_ROWS, seed=42):
+        self.model_dir = model_dir
+        self.trees_per_refresh = trees_per_refresh
+        self.scaler_memory = scaler_memory
+        self.offset_rows = offset_rows
+        self.rng = np.random.default_rng(seed)
+        self.version = resolve_version(model_dir, base_version)
+
+        model_path = os.path.join(model_dir, self.version)
+        with open(os.path.join(model_path, "isolation_forest.pkl"), "rb") as f:
+            self.model = pickle.load(f)
+        with open(os.path.join(model_path, "scaler.pkl"), "rb") as f:
+            self.scaler = pickle.load(f)
+        with open(os.path.join(model_path, "metadata.json"), "r") as f:
+            self.metadata = json.load(f)
+        self.feature_names = list(model_feature_names(self.scaler))
+        self.generations = self.metadata.get("tree_generations", [0] * len(self.model.estimators_))
+        self.generation = self.metadata.get("refresh", {}).get("generation", 0)
+
+        # The scaling the trees were split in
+        self._mean = np.array(self.scaler.mean_, dtype=np.float64)
+        self._scale = np.array(self.scaler.scale_, dtype=np.float64)
+
+        self.window_X = np.empty((window_size, len(self.feature_names)), dtype=np.float64)
+        self.window_y = np.zeros(window_size, dtype=np.float64)
+        self._filled = 0
+        self._position = 0
+        self.rows_seen = 0
+
+    def update(self, X, y=None):
+        """Feed a chunk of complete feature rows (and optional fraud labels)."""
+        import pandas as pd
+
+        X = np.asarray(X, dtype=np.float64)
+        if not len(X):
+            return
+        y = np.zeros(len(X)) if y is None else np.asarray(y, dtype=np.float64)
+        self.scaler.n_samples_seen_ = np.minimum(self.scaler.n_samples_seen_, self.scaler_memory)
+        self.scaler.partial_fit(pd.DataFrame(X, columns=self.feature_names))
+
+        size = len(self.window_X)
+        X, y = X[-size:], y[-size:]
+        slots = (self._position + np.arange(len(X))) % size
+        self.window_X[slots] = X
+        self.window_y[slots] = y
+        self._position = int(slots[-1] + 1) % size
+        self._filled = min(size, self._filled + len(X))
+        self.rows_seen += len(X)
+
+    def window(self):
+        return self.window_X[:self._filled], self.window_y[:self._filled]
+
+    def refresh(self, model_version=None, set_current=True):
+        """Replace the oldest trees, publish the result and return its version."""
+        from sklearn.ensemble import IsolationForest
+        from sklearn.metrics import classification_report
+
+        start = time.perf_counter()
+        model = self.model
+        max_samples = model._max_samples
+        if self._filled < max_samples:
+            raise ValueError(f"Window holds {self._filled} rows; at least {max_samples} are needed")
+        n_trees = min(self.trees_per_refresh, len(model.estimators_))
+
+        mean = np.array(self.scaler.mean_, dtype=np.float64)
+        scale = np.array(self.scaler.scale_, dtype=np.float64)
+        remap_thresholds(model, self._mean, self._scale, mean, scale)
+        self._mean, self._scale = mean, scale
+
+        X, y = self.window()
+        X_scaled = (X - mean) / scale
+        if n_trees:
+            new_model = IsolationForest(n_estimators=n_trees, max_samples=max_samples,
+                                        max_features=model.max_features,
+                                        random_state=int(self.rng.integers(2 ** 31)))
+            new_model.fit(X_scaled)
+            replace_oldest_trees(model, new_model, n_trees)
+        sample = self.rng.choice(len(X), min(len(X), self.offset_rows), replace=False)
+        scores = model.score_samples(X_scaled[sample])
+        if model.contamination == "auto":
+            model.offset_ = -0.5
+        else:
+            model.offset_ = float(np.percentile(scores, 100.0 * model.contamination))
+
+        self.generation += 1
+        self.generations = self.generations[n_trees:] + [self.generation] * n_trees
+        y_pred = (scores < model.offset_).astype(int)
+        report = classification_report(y[sample], y_pred, output_dict=True, zero_division=0)
+
+        if model_version is None:
+            model_version = datetime.now().strftime(f"%Y%m%d_%H%M%S_refresh{self.generation}")
+        metadata = dict(self.metadata)
+        metadata.update({
+            "training_date": datetime.now().isoformat(),
+            "n_estimators": len(model.estimators_),
+            "performance": report,
+            "version": model_version,
+            "tree_generations": self.generations,
+            "refresh": {
+                "base_version": self.version,
+                "generation": self.generation,
+                "replaced_trees": n_trees,
+                "window_rows": len(X),
+                "rows_seen": self.rows_seen,
+                "scaler_memory": self.scaler_memory,
+            },
+        })
+        self._publish(model_version, metadata, set_current)
+
+        self.metadata = metadata
+        self.version = model_version
+        logger.info(f"Refreshed {n_trees} of {len(model.estimators_)} trees into {model_version} "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return model_version
+
+    def _publish(self, model_version, metadata, set_current):
+        model_path = os.path.join(self.model_dir, model_version)
+        if os.path.exists(model_path):
+            raise ValueError(f"Model version {model_version} already exists")
+        # Written aside and renamed, so the version directory appears complete
+        tmp_path = os.path.join(self.model_dir, f".{model_version}.tmp{os.getpid()}")
+        try:
+            os.makedirs(tmp_path)
+            with open(os.path.join(tmp_path, "isolation_forest.pkl"), "wb") as f:
+                pickle.dump(self.model, f)
+            with open(os.path.join(tmp_path, "scaler.pkl"), "wb") as f:
+                pickle.dump(self.scaler, f)
+            save_compiled_forest(self.model, self.scaler, tmp_path)
+            with open(os.path.join(tmp_path, "feature_names.json"), "w") as f:
+                json.dump({"features": self.feature_names}, f)
+            with open(os.path.join(tmp_path, "metadata.json"), "w") as f:
+                json.dump(metadata, f, indent=2)
+            os.rename(tmp_path, model_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        if set_current:
+            update_current_symlink(self.model_dir, model_version)
+            # Root compatibility copies, as train_isolation_forest writes them
+            with open(os.path.join(self.model_dir, "isolation_forest.pkl"), "wb") as f:
+                pickle.dump(self.model, f)
+            with open(os.path.join(self.model_dir, "scaler.pkl"), "wb") as f:
+                pickle.dump(self.scaler, f)
+
+
+def main(argv=None):
+    from streaming_training import iter_source
+
+    parser = argparse.ArgumentParser(prog="fraud_detection.py refresh",
+                                     description="Refresh the oldest trees of the current forest from recent transactions")
+    parser.add_argument("sources", nargs="+",
+                        help="recent transactions: shard directories or CSV/NDJSON/Parquet files, oldest first")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--base-version", default="latest", help="version to refresh (default: current)")
+    parser.add_argument("--model-version", help="version to publish (default: a timestamp)")
+    parser.add_argument("--trees", type=int, default=10, help="oldest trees to replace")
+    parser.add_argument("--window", type=int, default=50000, help="most recent rows the new trees train on")
+    parser.add_argument("--scaler-memory", type=int, default=1000000,
+                        help="rows of history the scaler statistics are weighted as")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows read per chunk from files")
+    parser.add_argument("--no-set-current", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    try:
+        refresher = OnlineRefresher(args.model_dir, args.base_version, trees_per_refresh=args.trees,
+                                    window_size=args.window, scaler_memory=args.scaler_memory, seed=args.seed)
+        for source in args.sources:
+            for X, y in iter_source(source, args.chunk_size, refresher.feature_names):
+                refresher.update(X, y)
+        version = refresher.refresh(args.model_version, set_current=not args.no_set_current)
+    except Exception as e:
+        logger.error(f"Error refreshing model from {', '.join(args.sources)}: {str(e)}")
+        sys.exit(1)
+    print(version)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
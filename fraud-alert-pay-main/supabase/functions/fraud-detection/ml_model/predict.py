@@ -1,52 +1,88 @@
 # ml_model/predict.py
-import pickle
-import pandas as pd
-import numpy as np
 import json
 import sys
-import os
 import logging
-from fraud_detection import score_transaction, load_model
+from fraud_detection import get_registry, score_transaction, score_requests, parse_request
+from score_cache import ScoreCache, cache_key
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def read_requests(raw):
+    """Decode stdin as one JSON request, a JSON array of requests, or NDJSON.
+
+    Returns ``(requests, mode)`` where mode is "single", "array" or "ndjson".
+    """
+    try:
+        input_json = json.loads(raw)
+    except json.JSONDecodeError:
+        lines = [line for line in raw.splitlines() if line.strip()]
+        if len(lines) < 2:
+            raise
+        return [json.loads(line) for line in lines], "ndjson"
+
+    if isinstance(input_json, list):
+        return input_json, "array"
+    return [input_json], "single"
+
+def format_response(result):
+    """Reduce a scoring result to the original predict.py response format."""
+    if "error" in result:
+        return result
+    return {
+        "transaction": result["transaction"],
+        "fraud_score": result["fraud_score"],
+        "is_fraud": result["is_fraud"]
+    }
+
 if __name__ == "__main__":
     # Read transaction + model_type from stdin
     try:
-        input_json = json.loads(sys.stdin.read())
+        requests, mode = read_requests(sys.stdin.read())
         # Support old as well as new payload shapes
-        if isinstance(input_json, dict) and "transaction" in input_json:
-            transaction = input_json["transaction"]
-            model_type = input_json.get("model_type", "isolation_forest")
-            model_version = input_json.get("model_version", "latest")
+        if mode == "single":
+            transaction, model_type, model_version = parse_request(requests[0])
         else:
-            transaction = input_json
-            model_type = "isolation_forest"
-            model_version = "latest"
+            transaction, model_type, model_version = None, None, None
     except Exception as e:
         print(json.dumps({"error": f"Failed to parse input: {str(e)}"}))
         sys.exit(1)
 
-    # Score the transaction using our enhanced module
-    result = score_transaction(transaction, model_type, model_version)
+    if mode != "single":
+        # Batch input: score everything in one pass, answer in the same framing
+        responses = [format_response(result) for result in score_requests(requests)]
+        if mode == "array":
+            print(json.dumps(responses))
+        else:
+            sys.stdout.write("".join(json.dumps(response) + "\n" for response in responses))
+        sys.exit(0)
+
+    # Retries of a request answered before (FRAUD_SCORE_CACHE) skip loading the model
+    score_cache = ScoreCache.from_env()
+    if score_cache:
+        key, resolved_version = cache_key(requests[0], get_registry().current_version)
+    else:
+        key, resolved_version = None, None
+    result = score_cache.get(key) if key is not None else None
+    if result is None:
+        if model_type == "ensemble":
+            # Both models in one process, scored concurrently
+            from ensemble import DEFAULT_MEMBERS, Ensemble
+            ensemble = Ensemble(DEFAULT_MEMBERS)
+            result = ensemble.score(transaction)
+            ensemble.close()
+        else:
+            # Score the transaction using our enhanced module
+            result = score_transaction(transaction, model_type, model_version)
+        if key is not None:
+            score_cache.put(key, result, resolved_version)
     
     # Ensure backward compatibility with original output format
     if "error" in result:
         print(json.dumps(result))
         sys.exit(1)
     
-    # Extract the fraud score and decision
-    fraud_score = result["fraud_score"]
-    is_fraud = result["is_fraud"]
-    
     # Format response to match original format
-    response = {
-        "transaction": transaction,
-        "fraud_score": fraud_score,
-        "is_fraud": is_fraud
-    }
-    
-    print(json.dumps(response))
+    print(json.dumps(format_response(result)))
@@ -0,0 +1,133 @@
+# ml_model/prescreen.py
+"""First tier of the scoring cascade: a shallow tree that clears safe traffic.
+
+A ``Prescreen`` is a small decision tree distilled from a full model (see
+``cascade.py``). It works on raw, unscaled features, and each of its
+leaves is either a *clear* leaf, whose transactions are answered with the
+leaf's score without running the full model, or an *escalate* leaf, whose
+transactions go on to the full forest or autoencoder. Clear leaves carry
+the highest full-model score seen in them during distillation, so a
+cleared transaction never gets a lower score than the full model gave
+anything in that leaf.
+
+The tree is stored as a pickle-free artifact in ``model/<version>/prescreen``
+(see ``model_artifacts``) and evaluated with the same fixed-depth,
+gather-and-compare traversal as ``CompiledIsolationForest``.
+"""
+import os
+import threading
+
+import numpy as np
+
+from model_artifacts import artifact_exists, arrays_nbytes, load_artifact, save_artifact
+
+# Artifact directory inside model/<version>/
+PRESCREEN_DIR = "prescreen"
+
+# sklearn.tree._tree.TREE_LEAF
+TREE_LEAF = -1
+
+
+def export_prescreen(tree, clear, leaf_score, attrs):
+    """Flatten a fitted sklearn decision tree into prescreen arrays.
+
+    ``clear`` and ``leaf_score`` are per-node arrays (only leaves are read).
+    Returns ``(arrays, attrs)``.
+    """
+    tree = tree.tree_
+    node_ids = np.arange(tree.node_count, dtype=np.int64)
+    is_leaf = tree.children_left == TREE_LEAF
+    depth = np.zeros(tree.node_count, dtype=np.int64)
+    for node in range(tree.node_count):  # children always follow their parent
+        if not is_leaf[node]:
+            depth[tree.children_left[node]] = depth[node] + 1
+            depth[tree.children_right[node]] = depth[node] + 1
+
+    arrays = {
+        "feature": np.where(is_leaf, 0, tree.feature).astype(np.intp),
+        "threshold": np.where(is_leaf, np.inf, tree.threshold).astype(np.float64),
+        # Leaves point to themselves, so traversal is always max_depth steps
+        "children": np.stack([np.where(is_leaf, node_ids, tree.children_left),
+                              np.where(is_leaf, node_ids, tree.children_right)], axis=1).astype(np.int32),
+        "clear": (np.asarray(clear) & is_leaf).astype(np.uint8),
+        "leaf_score": np.where(is_leaf, leaf_score, 0).astype(np.int64),
+    }
+    return arrays, dict(attrs, max_depth=int(depth.max()))
+
+
+def save_prescreen(arrays, attrs, model_path):
+    return save_artifact(os.path.join(model_path, PRESCREEN_DIR), "prescreen", arrays, attrs)
+
+
+def prescreen_exists(model_path):
+    return artifact_exists(os.path.join(model_path, PRESCREEN_DIR))
+
+
+class Prescreen:
+    """Vectorised evaluation of an exported prescreen tree."""
+
+    def __init__(self, arrays, attrs):
+        self.arrays = arrays
+        self.attrs = attrs
+        self.feature = np.asarray(arrays["feature"], dtype=np.intp)
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"].ravel()
+        self.clear = arrays["clear"].astype(bool)
+        self.leaf_score = arrays["leaf_score"]
+        self.max_depth = int(attrs["max_depth"])
+        self.model_type = attrs["model_type"]
+
+    @classmethod
+    def load(cls, model_path, mmap=True):
+        attrs, arrays = load_artifact(os.path.join(model_path, PRESCREEN_DIR), kind="prescreen", mmap=mmap)
+        return cls(arrays, attrs)
+
+    @property
+    def nbytes(self):
+        return arrays_nbytes(self.arrays)
+
+    def apply(self, X):
+        """Return the leaf each row of raw features ends in."""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = np.arange(len(X), dtype=np.intp) * X.shape[1]
+        flat_X = X.ravel()
+        node = np.zeros(len(X), dtype=np.intp)
+        for _ in range(self.max_depth):
+            went_right = flat_X.take(rows + self.feature.take(node)) > self.threshold.take(node)
+            node = self.children.take(2 * node + went_right)
+        return node
+
+    def screen(self, X):
+        """Return ``(cleared, scores)``; ``scores`` is only meaningful where ``cleared``."""
+        leaves = self.apply(X)
+        return self.clear.take(leaves), self.leaf_score.take(leaves)
+
+
+_prescreens = {}
+_prescreens_lock = threading.Lock()
+
+
+def get_prescreen(model_path, model_type):
+    """Return the prescreen for a model version directory, or None.
+
+    Loaded prescreens are cached per directory. A version without one costs
+    a ``stat`` per call, so a prescreen distilled for a version already
+    being served is picked up without a restart.
+    """
+    key = (model_path, model_type)
+    prescreen = _prescreens.get(key)
+    if prescreen is not None:
+        return prescreen
+    if not prescreen_exists(model_path):
+        return None
+    prescreen = Prescreen.load(model_path)
+    if prescreen.model_type != model_type:
+        return None
+    with _prescreens_lock:
+        return _prescreens.setdefault(key, prescreen)
+
+
+def clear_prescreen_cache():
+    with _prescreens_lock:
+        _prescreens.clear()
@@ -0,0 +1,260 @@
+# ml_model/score_cache.py
+"""Idempotent cache of scoring results for retried and duplicate requests.
+
+Clients retry on timeouts, and each retry would otherwise run the whole
+pipeline again (and, through ``predict.py``, start a new process). A
+``ScoreCache`` sits in front of scoring and returns the stored response
+for a request it has already answered.
+
+Keys combine the transaction id (``transaction_id`` on the request or
+``id``/``transaction_id`` on the transaction), a hash of the model
+feature values, the sender/recipient/timestamp fields the feature store
+reads, the model type and the *resolved* model version, so ``"latest"``
+never matches a result from a model that ``current`` (or, for the
+autoencoder, ``current_autoencoder``) has since moved away from. An
+ensemble result is keyed on the current version of every model type,
+joined with ``+``. Requests without an id are only cached when every feature is
+present, since missing features are filled in per sender at scoring time.
+With a feature store (``feature_store=True``) an id-less request that
+names a sender and recipient is never cached either: scoring it records
+the payment, so a repeat is a new payment rather than a retry.
+
+Entries live in an in-memory LRU bounded by ``max_entries`` and expire
+after ``ttl`` seconds. With ``path`` they are also written to a SQLite
+file, which survives restarts and is shared between ``predict.py``
+processes (``FRAUD_SCORE_CACHE=/path/to/cache.sqlite``). ``attach``
+subscribes to a ``ModelRegistry`` so entries for the previous version,
+ensemble entries included, are dropped as soon as any current link
+moves. Error responses are never
+cached.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from fraud_detection import FEATURE_NAMES, parse_request
+from graph_index import GRAPH_FEATURES
+from model_registry import CURRENT_LINKS
+from velocity import VELOCITY_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Model types whose current versions an ensemble result depends on
+ENSEMBLE_TYPES = ("isolation_forest",) + tuple(CURRENT_LINKS)
+
+# Non-feature fields that change what the feature store fills in
+IDENTITY_FIELDS = ("sender_id", "recipient_id", "timestamp", "date")
+
+# Expired rows are purged from the SQLite file once per this many writes
+PURGE_EVERY = 1000
+
+
+def request_transaction_id(input_json, transaction):
+    """Return the client-supplied transaction id of a request, if any."""
+    transaction_id = input_json.get("transaction_id") if isinstance(input_json, dict) else None
+    if transaction_id is None:
+        transaction_id = transaction.get("transaction_id", transaction.get("id"))
+    return transaction_id
+
+
+def cache_key(input_json, current_version=None, feature_store=False):
+    """Return ``(key, resolved_version)`` for a decoded request.
+
+    ``key`` is None when the request must not be cached. ``current_version``
+    is called to resolve ``"latest"``, e.g. ``ModelRegistry.current_version``.
+    ``feature_store`` says whether scoring enriches and records payments.
+    """
+    transaction, model_type, model_version = parse_request(input_json)
+    if not isinstance(transaction, dict):
+        return None, None
+    if current_version is not None:
+        if model_type == "ensemble":
+            model_version = "+".join(current_version(t) or "root" for t in ENSEMBLE_TYPES)
+        elif model_version == "latest":
+            model_version = current_version(model_type) or "root"
+
+    values = []
+    complete = True
+    for name in FEATURE_NAMES:
+        try:
+            values.append(float(transaction[name]))
+        except (KeyError, TypeError, ValueError):
+            values.append(math.nan)
+            complete = False
+    # Optional: models trained without them never read these
+    for name in VELOCITY_FEATURES + GRAPH_FEATURES:
+        try:
+            values.append(float(transaction[name]))
+        except (KeyError, TypeError, ValueError):
+            values.append(math.nan)
+    transaction_id = request_transaction_id(input_json, transaction)
+    if transaction_id is None and not complete:
+        return None, None
+    if (transaction_id is None and feature_store
+            and transaction.get("sender_id") is not None and transaction.get("recipient_id") is not None):
+        return None, None
+
+    digest = hashlib.blake2b(struct.pack(f"{len(values)}d", *values), digest_size=16)
+    identity = [transaction_id, model_type, model_version] + [transaction.get(f) for f in IDENTITY_FIELDS]
+    digest.update(json.dumps(identity, default=str).encode("utf-8"))
+    return digest.hexdigest(), model_version
+
+
+class ScoreCache:
+    """TTL + LRU cache of scoring responses, optionally backed by SQLite."""
+
+    def __init__(self, max_entries=10000, ttl=300.0, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()  # key -> (expires_at, model_version, result)
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        if path:
+            self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS scores ("
+                             "key TEXT PRIMARY KEY, model_version TEXT, expires_at REAL, result TEXT)")
+
+    @classmethod
+    def from_env(cls):
+        """Return a SQLite-backed cache if ``FRAUD_SCORE_CACHE`` is set, else None."""
+        path = os.environ.get("FRAUD_SCORE_CACHE")
+        if not path:
+            return None
+        return cls(max_entries=1, ttl=float(os.environ.get("FRAUD_SCORE_CACHE_TTL", 300.0)), path=path)
+
+    def get(self, key):
+        """Return the cached response for ``key``, or None."""
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                del self._entries[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT model_version, expires_at, result FROM scores WHERE key = ?",
+                                           (key,)).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"Error reading score cache: {str(e)}")
+                    row = None
+                if row is not None and row[1] > now:
+                    result = json.loads(row[2])
+                    self._store(key, row[1], row[0], result)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, key, result, model_version=None):
+        """Cache a successful response under ``key``."""
+        if key is None or "error" in result:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, expires_at, model_version, result)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+                                     (key, model_version, expires_at, json.dumps(result)))
+                    self._writes += 1
+                    if self._writes % PURGE_EVERY == 0:
+                        self._db.execute("DELETE FROM scores WHERE expires_at <= ?", (time.time(),))
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing score cache: {str(e)}")
+
+    def invalidate(self, model_version=None):
+        """Drop entries for ``model_version`` (alone or in an ensemble), or everything when None."""
+        with self._lock:
+            if model_version is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key, entry in self._entries.items()
+                         if entry[1] is not None and model_version in entry[1].split("+")]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+            self.invalidations += dropped
+
+            if self._db is not None:
+                try:
+                    if model_version is None:
+                        self._db.execute("DELETE FROM scores")
+                    else:
+                        self._db.execute("DELETE FROM scores WHERE instr('+' || model_version || '+', ?) > 0",
+                                         (f"+{model_version}+",))
+                except sqlite3.Error as e:
+                    logger.error(f"Error invalidating score cache: {str(e)}")
+
+    def attach(self, registry):
+        """Invalidate the previous version's entries whenever a current link moves."""
+        registry.add_listener(self._on_model_change)
+
+    def _on_model_change(self, previous, target):
+        logger.info(f"Invalidating cached scores for model version {previous}")
+        self.invalidate(previous or "root")
+
+    def _store(self, key, expires_at, model_version, result):
+        self._entries[key] = (expires_at, model_version, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss counters and occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "path": self.path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def metric_samples(self):
+        """Cache counters as ``(name, type, labels, value)`` samples for ``METRICS``."""
+        s = self.stats()
+        return [
+            ("fraud_score_cache_hits_total", "counter", (), s["hits"]),
+            ("fraud_score_cache_misses_total", "counter", (), s["misses"]),
+            ("fraud_score_cache_expirations_total", "counter", (), s["expirations"]),
+            ("fraud_score_cache_evictions_total", "counter", (), s["evictions"]),
+            ("fraud_score_cache_invalidations_total", "counter", (), s["invalidations"]),
+            ("fraud_score_cache_entries", "gauge", (), s["entries"]),
+        ]
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,555 @@
+# ml_model/scoring_server.py
+"""Resident fraud scoring server.
+
+Keeps the interpreter, libraries and model artifacts loaded so that each
+transaction only pays for the model evaluation itself, instead of the
+process startup that ``predict.py`` incurs on every call.
+
+Two local endpoints are available and can run side by side:
+
+* HTTP: ``POST /score`` with a JSON request (same shapes ``predict.py``
+  accepts) or an NDJSON body with one request per line, which is scored
+  as a single batch; ``GET /health``; ``GET /stats`` for registry and
+  micro-batcher metrics; ``GET /metrics`` for per-stage latency
+  histograms and counters in the Prometheus text format.
+* Unix socket: a line-delimited JSON stream, one request per line and one
+  response per line, in order.
+
+Both endpoints also take binary frames of fixed-layout float32/float64
+feature rows (see ``wire_protocol.py``) and answer with packed scores and
+flags: over HTTP as a ``POST /score`` body with the
+``application/x-fraud-frame`` content type, over the Unix socket in
+place of any JSON line, recognised by the frame's magic. JSON remains the
+default.
+
+Concurrent single requests are coalesced by a ``MicroBatcher`` (64 rows or
+2 ms by default) before reaching the model.
+
+With ``--feature-store PATH`` transactions carrying ``sender_id`` and
+``recipient_id`` have their missing behavioural features filled in from a
+``FeatureStore`` before scoring; ``POST /accounts`` registers account
+creation times and locations. The store is restored from ``PATH`` at start
+and snapshotted back periodically and on shutdown. ``--velocity`` adds the
+sliding-window ``VELOCITY_FEATURES`` (see ``velocity.py``) to the store,
+for models trained with them, and ``--graph`` the fan-in/fan-out and
+connected-component ``GRAPH_FEATURES`` (see ``graph_index.py``).
+
+Responses are kept in a ``ScoreCache`` (``--score-cache-entries``,
+``--score-cache-ttl``, optionally ``--score-cache-db``), so a retried or
+duplicate request is answered without rescoring, and without recording
+the payment in the feature store a second time.
+
+Requests with ``"model_type": "ensemble"`` are scored by every
+``--ensemble`` member concurrently and combined with ``--ensemble-rule``;
+``--shadow`` models score all traffic in the background and log how
+often they disagree with what was returned.
+
+With ``--cascade``, versions that have a distilled prescreen (see
+``cascade.py``) answer clearly safe transactions from it and only run the
+full model on the rest.
+
+With ``--workers N`` the endpoints are served by N pre-forked processes
+sharing the models loaded before the fork (see ``worker_pool.py``).
+
+``predict.py`` keeps its stdin/stdout contract and remains the fallback
+when the server is not running.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fraud_detection
+from ensemble import DEFAULT_MEMBERS, RULES, Ensemble
+from fraud_detection import get_models, get_registry, parse_request, score_requests, score_transaction
+from feature_store import FeatureStore
+from graph_index import GraphIndex
+from velocity import VelocityAggregator
+from metrics import METRICS
+from micro_batcher import MicroBatcher
+from score_cache import ScoreCache, cache_key
+from wire_protocol import FRAME_CONTENT_TYPE, REQUEST_MAGIC, read_frame, score_frame
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+class ScoringService:
+    """Scores requests against models that are loaded once and kept resident."""
+
+    def __init__(self, model_dir="model", batcher=None, feature_store=None, score_cache=None,
+                 ensemble=None):
+        self.model_dir = model_dir
+        self.registry = get_registry(model_dir)
+        self.batcher = batcher
+        self.feature_store = feature_store
+        self.score_cache = score_cache
+        self.ensemble = ensemble
+        if score_cache is not None:
+            score_cache.attach(self.registry)
+
+    def cache_key(self, input_json):
+        """Return ``(key, model_version)`` for the score cache; key is None when uncached."""
+        if self.score_cache is None:
+            return None, None
+        try:
+            return cache_key(input_json, self.registry.current_version, self.feature_store is not None)
+        except Exception:
+            return None, None
+
+    def enrich(self, input_json):
+        """Fill missing features from the feature store; returns the request to score."""
+        if self.feature_store is None:
+            return input_json
+        transaction, model_type, model_version = parse_request(input_json)
+        if not isinstance(transaction, dict):
+            return input_json
+        return {
+            "transaction": self.feature_store.enrich(transaction),
+            "model_type": model_type,
+            "model_version": model_version,
+        }
+
+    def score(self, input_json):
+        """Score one decoded request and return the response dict."""
+        key, model_version = self.cache_key(input_json)
+        result = self.score_cache.get(key) if key is not None else None
+        if result is None:
+            result = self._score(input_json)
+            if key is not None:
+                self.score_cache.put(key, result, model_version)
+        return result
+
+    def _score(self, input_json):
+        try:
+            transaction, model_type, model_version = parse_request(self.enrich(input_json))
+            if model_type == "ensemble" and self.ensemble is not None:
+                return self.ensemble.score(transaction)
+            if self.batcher is not None:
+                result = self.batcher.score(transaction, model_type, model_version)
+            else:
+                models = get_models(model_type, model_version)
+                result = score_transaction(transaction, model_type, model_version, models=models)
+        except Exception as e:
+            logger.error(f"Error preparing request: {str(e)}")
+            return {"error": str(e)}
+        if self.ensemble is not None:
+            self.ensemble.shadow([transaction], [result])
+        return result
+
+    def score_batch(self, requests):
+        """Score decoded requests in one pass per model; ensemble requests go to the ensemble."""
+        results = [None] * len(requests)
+        if self.ensemble is not None:
+            parsed = [parse_request(request) for request in requests]
+            positions = [i for i, (_, model_type, _) in enumerate(parsed) if model_type == "ensemble"]
+            if positions:
+                transactions = [parsed[i][0] for i in positions]
+                for i, result in zip(positions, self.ensemble.score_many(transactions)):
+                    results[i] = result
+
+        positions = [i for i, result in enumerate(results) if result is None]
+        scored = score_requests([requests[i] for i in positions])
+        for i, result in zip(positions, scored):
+            results[i] = result
+        if self.ensemble is not None:
+            self.ensemble.shadow([parsed[i][0] for i in positions], scored)
+        return results
+
+    def stats(self):
+        """Return registry and micro-batcher metrics."""
+        stats = {"registry": self.registry.stats()}
+        if self.batcher is not None:
+            stats["batcher"] = self.batcher.metrics()
+        if self.feature_store is not None:
+            stats["feature_store"] = self.feature_store.stats()
+        if self.score_cache is not None:
+            stats["score_cache"] = self.score_cache.stats()
+        if self.ensemble is not None:
+            stats["ensemble"] = self.ensemble.stats()
+        return stats
+
+    def register_account(self, input_json):
+        """Record an account's creation time and location in the feature store."""
+        if self.feature_store is None:
+            return {"error": "Feature store is not enabled"}
+        try:
+            self.feature_store.register_account(input_json["account_id"], input_json["created_at"],
+                                                input_json.get("lat"), input_json.get("lon"))
+        except Exception as e:
+            logger.error(f"Error registering account: {str(e)}")
+            return {"error": str(e)}
+        return {"status": "ok"}
+
+    def decode(self, raw):
+        """``json.loads`` a request body or line, timed as the parse stage."""
+        start = time.perf_counter()
+        try:
+            return json.loads(raw)
+        finally:
+            METRICS.observe("fraud_request_parse_seconds", time.perf_counter() - start)
+
+    def score_line(self, line):
+        """Score one NDJSON line and return the encoded response line."""
+        try:
+            input_json = self.decode(line)
+        except Exception as e:
+            result = {"error": f"Failed to parse input: {str(e)}"}
+        else:
+            result = self.score(input_json)
+        return (json.dumps(result) + "\n").encode("utf-8")
+
+    def score_lines(self, lines):
+        """Score a block of NDJSON lines in one batch; returns encoded NDJSON."""
+        results = [None] * len(lines)
+        requests = []
+        positions = []
+        keys = []
+        for i, line in enumerate(lines):
+            try:
+                input_json = self.decode(line)
+                key = self.cache_key(input_json)
+                cached = self.score_cache.get(key[0]) if key[0] is not None else None
+                if cached is not None:
+                    results[i] = cached
+                    continue
+                requests.append(self.enrich(input_json))
+                positions.append(i)
+                keys.append(key)
+            except Exception as e:
+                results[i] = {"error": f"Failed to parse input: {str(e)}"}
+
+        for i, (key, model_version), result in zip(positions, keys, self.score_batch(requests)):
+            results[i] = result
+            if key is not None:
+                self.score_cache.put(key, result, model_version)
+        return "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+
+    def score_frame(self, frame):
+        """Score a binary request frame and return the response frame."""
+        return score_frame(frame)
+
+
+class ScoringHTTPRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end for a ``ScoringService``."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle the body waits
+    # for the client's delayed ACK of the headers on every keep-alive request
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "healthy"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.service.stats())
+        elif self.path == "/metrics":
+            self._send(200, METRICS.render().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path not in ("/score", "/accounts"):
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if self.path == "/accounts":
+            try:
+                input_json = json.loads(body)
+            except Exception as e:
+                self._send_json(400, {"error": f"Failed to parse input: {str(e)}"})
+                return
+            result = self.server.service.register_account(input_json)
+            self._send_json(422 if "error" in result else 200, result)
+            return
+
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith(FRAME_CONTENT_TYPE):
+            self._send(200, self.server.service.score_frame(body), FRAME_CONTENT_TYPE)
+            return
+
+        lines = [line for line in body.splitlines() if line.strip()]
+
+        if content_type.startswith(NDJSON_CONTENT_TYPE) or len(lines) > 1:
+            payload = self.server.service.score_lines(lines)
+            self._send(200, payload, NDJSON_CONTENT_TYPE)
+            return
+
+        try:
+            input_json = self.server.service.decode(body)
+        except Exception as e:
+            self._send_json(400, {"error": f"Failed to parse input: {str(e)}"})
+            return
+
+        result = self.server.service.score(input_json)
+        self._send_json(422 if "error" in result else 200, result)
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json")
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ScoringUnixRequestHandler(socketserver.StreamRequestHandler):
+    """Line-delimited JSON (or binary frames) over a Unix stream socket, one response per request."""
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            # No JSON text starts with "F", so one byte tells a frame from a line
+            if self.rfile.peek(1)[:1] == REQUEST_MAGIC[:1]:
+                try:
+                    frame = read_frame(self.rfile)
+                except ValueError as e:
+                    # The stream cannot be resynchronised after a bad frame
+                    logger.error(f"Error reading frame: {str(e)}")
+                    return
+                self.wfile.write(service.score_frame(frame))
+            else:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                if not line.strip():
+                    continue
+                self.wfile.write(service.score_line(line))
+            self.wfile.flush()
+
+
+def adopt_socket(server, sock):
+    """Serve on an already listening socket, e.g. one inherited from a pre-fork parent."""
+    server.socket.close()
+    server.socket = sock
+    server.server_address = sock.getsockname()
+
+
+class ScoringHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service, sock=None):
+        super().__init__(address, ScoringHTTPRequestHandler, bind_and_activate=sock is None)
+        if sock is not None:
+            adopt_socket(self, sock)
+        self.service = service
+
+
+class ScoringUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, path, service, sock=None):
+        # Remove a stale socket left behind by a previous run
+        self.owns_path = sock is None
+        if self.owns_path and os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, ScoringUnixRequestHandler, bind_and_activate=self.owns_path)
+        if sock is not None:
+            adopt_socket(self, sock)
+        self.service = service
+
+    def server_close(self):
+        super().server_close()
+        if self.owns_path and os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def parse_address(address):
+    """Parse ``host:port`` (or just ``port``) into a socket address tuple."""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def load_feature_store(path, velocity=False, graph=False):
+    """Restore the feature store snapshot at ``path``, or start an empty one.
+
+    With ``velocity`` (``graph``) the store keeps velocity aggregates (a
+    graph index), starting an empty one if the snapshot has none.
+    """
+    feature_store = None
+    if os.path.exists(path):
+        try:
+            feature_store = FeatureStore.restore(path)
+        except Exception as e:
+            logger.error(f"Error restoring feature store: {str(e)}")
+    if feature_store is None:
+        feature_store = FeatureStore()
+    if velocity and feature_store.velocity is None:
+        feature_store.velocity = VelocityAggregator()
+    if graph and feature_store.graph is None:
+        feature_store.graph = GraphIndex()
+    return feature_store
+
+
+def save_feature_store(feature_store, path):
+    """Snapshot the feature store, logging rather than raising on failure."""
+    try:
+        feature_store.snapshot(path)
+    except Exception as e:
+        logger.error(f"Error saving feature store snapshot: {str(e)}")
+
+
+def serve(http_address=None, unix_path=None, model_dir="model", preload=(),
+          cache_entries=8, cache_mb=1024, batch_size=64, batch_wait_ms=2.0,
+          feature_store_path=None, snapshot_interval=60.0, score_cache_entries=10000,
+          score_cache_ttl=300.0, score_cache_path=None, ensemble_members=DEFAULT_MEMBERS,
+          ensemble_rule="max", shadows=(), shadow_log=None, cascade=False, velocity=False,
+          graph=False):
+    """Run the configured endpoints until SIGINT/SIGTERM.
+
+    Single requests are coalesced by a ``MicroBatcher`` unless
+    ``batch_size`` is 0, and responses are cached unless
+    ``score_cache_entries`` is 0.
+    """
+    get_registry(model_dir, max_entries=cache_entries, max_bytes=cache_mb * 1024 * 1024)
+    if cascade:
+        fraud_detection.CASCADE_ENABLED = True
+    batcher = MicroBatcher(batch_size, batch_wait_ms) if batch_size > 0 else None
+    feature_store = load_feature_store(feature_store_path, velocity, graph) if feature_store_path else None
+    score_cache = (ScoreCache(score_cache_entries, score_cache_ttl, score_cache_path)
+                   if score_cache_entries > 0 else None)
+    ensemble = Ensemble(ensemble_members, ensemble_rule, shadows, shadow_log)
+    service = ScoringService(model_dir=model_dir, batcher=batcher, feature_store=feature_store,
+                             score_cache=score_cache, ensemble=ensemble)
+    if batcher is not None:
+        METRICS.add_collector(batcher.metric_samples)
+    if score_cache is not None:
+        METRICS.add_collector(score_cache.metric_samples)
+    for model_type in preload:
+        get_models(model_type)
+
+    servers = []
+    if http_address:
+        servers.append(ScoringHTTPServer(parse_address(http_address), service))
+        logger.info(f"Scoring server listening on http://{http_address}")
+    if unix_path:
+        servers.append(ScoringUnixServer(unix_path, service))
+        logger.info(f"Scoring server listening on unix://{unix_path}")
+    if not servers:
+        raise ValueError("At least one of http_address or unix_path is required")
+
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        # Without a feature store to snapshot this just waits for the signal
+        while not stop.wait(snapshot_interval if feature_store is not None else None):
+            save_feature_store(feature_store, feature_store_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Shutting down scoring server")
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        if batcher is not None:
+            batcher.close()
+        if feature_store is not None:
+            save_feature_store(feature_store, feature_store_path)
+        ensemble.close()
+        if score_cache is not None:
+            score_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident fraud scoring server")
+    parser.add_argument("--http", metavar="HOST:PORT",
+                        help="serve HTTP on this address (e.g. 127.0.0.1:8500)")
+    parser.add_argument("--unix", metavar="PATH",
+                        help="serve line-delimited JSON (or binary frames) on this Unix socket")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--preload", nargs="*", default=["isolation_forest"],
+                        help="model types to load before accepting requests")
+    parser.add_argument("--cache-entries", type=int, default=8,
+                        help="maximum number of model versions kept loaded")
+    parser.add_argument("--cache-mb", type=int, default=1024,
+                        help="approximate memory cap for loaded models")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="flush a micro-batch at this many requests (0 disables batching)")
+    parser.add_argument("--batch-wait-ms", type=float, default=2.0,
+                        help="flush a micro-batch once its oldest request waited this long")
+    parser.add_argument("--feature-store", metavar="PATH",
+                        help="enrich transactions from a feature store snapshotted to this .npz file")
+    parser.add_argument("--velocity", action="store_true",
+                        help="also keep sliding-window velocity features in the feature store")
+    parser.add_argument("--graph", action="store_true",
+                        help="also keep a transaction graph index in the feature store")
+    parser.add_argument("--snapshot-interval", type=float, default=60.0,
+                        help="seconds between feature store snapshots")
+    parser.add_argument("--score-cache-entries", type=int, default=10000,
+                        help="responses kept for retried requests (0 disables the cache)")
+    parser.add_argument("--score-cache-ttl", type=float, default=300.0,
+                        help="seconds a cached response stays valid")
+    parser.add_argument("--score-cache-db", metavar="PATH",
+                        help="also keep cached responses in this SQLite file")
+    parser.add_argument("--ensemble", nargs="*", default=list(DEFAULT_MEMBERS),
+                        metavar="TYPE[@VERSION][=WEIGHT[:THRESHOLD]]",
+                        help="models scored for model_type=ensemble requests")
+    parser.add_argument("--ensemble-rule", choices=RULES, default="max",
+                        help="how member scores are combined")
+    parser.add_argument("--shadow", nargs="*", default=[], metavar="TYPE[@VERSION][=WEIGHT[:THRESHOLD]]",
+                        help="challenger models scored in the background against every response")
+    parser.add_argument("--shadow-log", metavar="PATH", help="append shadow comparisons to this JSON-lines file")
+    parser.add_argument("--cascade", action="store_true",
+                        help="clear safe transactions with the version's prescreen before the full model "
+                             "(same as FRAUD_CASCADE=1)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="pre-forked worker processes sharing the preloaded models "
+                             "(0 serves from this process)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds a retiring worker gets to finish in-flight requests")
+    parser.add_argument("--memory-interval", type=float, default=60.0,
+                        help="seconds between per-worker memory reports")
+    parser.add_argument("--stats-file", metavar="PATH", help="write worker pool stats and memory as JSON here")
+    args = parser.parse_args()
+
+    if not args.http and not args.unix:
+        args.http = "127.0.0.1:8500"
+
+    if (args.velocity or args.graph) and not args.feature_store:
+        parser.error("--velocity and --graph need --feature-store")
+
+    if args.workers > 0:
+        if args.feature_store:
+            parser.error("--feature-store keeps per-process state and cannot be used with --workers")
+        from worker_pool import serve_prefork
+        serve_prefork(args.workers, args.http, args.unix, model_dir=args.model_dir, preload=args.preload,
+                      cache_entries=args.cache_entries, cache_mb=args.cache_mb,
+                      batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms,
+                      score_cache_entries=args.score_cache_entries, score_cache_ttl=args.score_cache_ttl,
+                      score_cache_path=args.score_cache_db, ensemble_members=args.ensemble,
+                      ensemble_rule=args.ensemble_rule, shadows=args.shadow, shadow_log=args.shadow_log,
+                      cascade=args.cascade, graceful_timeout=args.graceful_timeout,
+                      memory_interval=args.memory_interval, stats_file=args.stats_file)
+        raise SystemExit(0)
+
+    serve(args.http, args.unix, model_dir=args.model_dir, preload=args.preload,
+          cache_entries=args.cache_entries, cache_mb=args.cache_mb,
+          batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms,
+          feature_store_path=args.feature_store, snapshot_interval=args.snapshot_interval,
+          score_cache_entries=args.score_cache_entries, score_cache_ttl=args.score_cache_ttl,
+          score_cache_path=args.score_cache_db, ensemble_members=args.ensemble,
+          ensemble_rule=args.ensemble_rule, shadows=args.shadow, shadow_log=args.shadow_log,
+          cascade=args.cascade, velocity=args.velocity, graph=args.graph)
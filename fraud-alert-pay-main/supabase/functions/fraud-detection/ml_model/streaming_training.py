@@ -0,0 +1,264 @@
+# ml_model/streaming_training.py
+"""Out-of-core training from transaction history on disk.
+
+Sources are shard directories written by ``synthetic_data.write_shards``
+or CSV/NDJSON/Parquet history files (read in chunks by ``bulk_scoring``).
+Memory stays constant however much history there is:
+
+* one streaming pass fits the ``StandardScaler`` with ``partial_fit`` over
+  every row and keeps a uniform reservoir sample (vectorised Algorithm R)
+  of raw rows and labels;
+* the Isolation Forest trains on the reservoir; each tree still draws its
+  ``max_samples`` (256) subsample from it, so a reservoir a few hundred
+  times larger than that is a faithful stand-in for the full history;
+* the autoencoder is fed shuffled, scaled mini-batches from a generator
+  that re-streams the sources every epoch.
+
+The reservoir is split 70/30 for evaluation and the autoencoder
+threshold, and artifacts are written by ``train_isolation_forest`` /
+``train_autoencoder``, so ``model/<version>/`` keeps its usual layout.
+Rows with missing or non-numeric features are skipped. Without a label
+column (``is_fraud`` by default) every row counts as normal for the
+evaluation report. Shard directories carry their feature columns in
+their manifest, so shards written with ``--velocity-features`` or
+``--graph-features`` train a model on those features too; files are read
+for the base ``FEATURE_NAMES``.
+
+    python fraud_detection.py train-stream history/*.parquet --reservoir-size 200000
+"""
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from bulk_scoring import detect_format, read_chunks
+from fraud_detection import FEATURE_NAMES, train_autoencoder, train_isolation_forest
+from synthetic_data import LABEL_NAME, MANIFEST_FILE, iter_shards, read_manifest
+
+logger = logging.getLogger(__name__)
+
+
+def is_shard_dir(source):
+    return os.path.isdir(source) and os.path.exists(os.path.join(source, MANIFEST_FILE))
+
+
+def source_features(sources):
+    """Return the feature columns the sources share; raises ``ValueError`` if they differ."""
+    feature_names = None
+    for source in sources:
+        names = read_manifest(source)["features"] if is_shard_dir(source) else FEATURE_NAMES
+        if feature_names is not None and names != feature_names:
+            raise ValueError(f"{source} has different feature columns from the other sources "
+                             f"({len(names)} vs {len(feature_names)})")
+        feature_names = names
+    return list(feature_names)
+
+
+def iter_source(source, chunk_size=100000, feature_names=FEATURE_NAMES, label_name=LABEL_NAME):
+    """Yield ``(X, y)`` chunks of complete rows from a shard directory or file.
+
+    ``y`` is None when the source has no label column.
+    """
+    if is_shard_dir(source):
+        for X, y in iter_shards(source):
+            yield np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        return
+
+    import pandas as pd
+
+    for df in read_chunks(source, detect_format(source), chunk_size):
+        missing = [name for name in feature_names if name not in df.columns]
+        if missing:
+            raise ValueError(f"{source} is missing feature columns: {', '.join(missing)}")
+        X = df[feature_names].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        y = (pd.to_numeric(df[label_name], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+             if label_name in df.columns else None)
+        complete = ~np.isnan(X).any(axis=1)
+        if not complete.all():
+            X = X[complete]
+            y = y[complete] if y is not None else None
+        yield X, y
+
+
+def iter_sources(sources, chunk_size=100000, feature_names=FEATURE_NAMES):
+    for source in sources:
+        yield from iter_source(source, chunk_size, feature_names)
+
+
+class ReservoirSampler:
+    """Uniform fixed-size sample of a row stream (Algorithm R, one chunk at a time)."""
+
+    def __init__(self, size, n_features, seed=42):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.X = np.empty((size, n_features), dtype=np.float64)
+        self.y = np.zeros(size, dtype=np.float64)
+        self.seen = 0
+
+    def add(self, X, y=None):
+        n = len(X)
+        if y is None:
+            y = np.zeros(n)
+        # Fill the reservoir first
+        fill = min(n, max(0, self.size - self.seen))
+        if fill:
+            self.X[self.seen:self.seen + fill] = X[:fill]
+            self.y[self.seen:self.seen + fill] = y[:fill]
+
+        if fill < n:
+            # Row with global index i replaces slot randint(0, i + 1) when it lands in the reservoir
+            positions = np.arange(self.seen + fill, self.seen + n, dtype=np.int64)
+            slots = (self.rng.random(len(positions)) * (positions + 1)).astype(np.int64)
+            accepted = np.flatnonzero(slots < self.size) + fill
+            slots = slots[accepted - fill]
+            # When a slot is hit twice in one chunk the later row wins, as in the sequential loop
+            last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+            self.X[slots[last]] = X[accepted[last]]
+            self.y[slots[last]] = y[accepted[last]]
+        self.seen += n
+
+    def sample(self):
+        n = min(self.size, self.seen)
+        return self.X[:n], self.y[:n]
+
+
+def scan(sources, reservoir_size=100000, chunk_size=100000, seed=42, feature_names=FEATURE_NAMES):
+    """One pass over ``sources``: fit the scaler and draw the reservoir.
+
+    Returns ``(scaler, X_sample, y_sample, n_rows)``.
+    """
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    reservoir = ReservoirSampler(reservoir_size, len(feature_names), seed)
+    start = time.perf_counter()
+    for X, y in iter_sources(sources, chunk_size, feature_names):
+        if not len(X):
+            continue
+        # Named columns keep feature_names_in_ on the scaler, which scoring relies on
+        scaler.partial_fit(pd.DataFrame(X, columns=feature_names))
+        reservoir.add(X, y)
+    if reservoir.seen == 0:
+        raise ValueError("No complete rows found in the training sources")
+
+    X_sample, y_sample = reservoir.sample()
+    logger.info(f"Scanned {reservoir.seen} rows in {time.perf_counter() - start:.1f}s; "
+                f"reservoir holds {len(X_sample)} ({int(y_sample.sum())} labelled fraud)")
+    return scaler, X_sample, y_sample, reservoir.seen
+
+
+def split_sample(X, y, test_size=0.3, seed=42, feature_names=FEATURE_NAMES):
+    """Split the reservoir into the ``data`` tuple the trainers accept."""
+    from sklearn.model_selection import train_test_split
+
+    stratify = y if len(np.unique(y)) > 1 and y.sum() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=seed, stratify=stratify
+    )
+    return X_train, X_test, y_train, y_test, feature_names
+
+
+def scaled_batches(sources, scaler, batch_size=256, chunk_size=100000, seed=42, feature_names=FEATURE_NAMES):
+    """Endless generator of shuffled, scaled ``(x, x)`` mini-batches over ``sources``.
+
+    Rows left over at the end of a chunk are carried into the next one, so
+    an epoch over ``n_rows`` rows is exactly ``ceil(n_rows / batch_size)``
+    batches, only the last of which may be partial.
+    """
+    rng = np.random.default_rng(seed)
+    mean = np.asarray(scaler.mean_)
+    scale = np.asarray(scaler.scale_)
+    while True:
+        carry = None
+        for X, _ in iter_sources(sources, chunk_size, feature_names):
+            X_scaled = ((X - mean) / scale).astype(np.float32)
+            X_scaled = X_scaled[rng.permutation(len(X_scaled))]
+            if carry is not None:
+                X_scaled = np.concatenate([carry, X_scaled])
+            full = len(X_scaled) - len(X_scaled) % batch_size
+            for start in range(0, full, batch_size):
+                batch = X_scaled[start:start + batch_size]
+                yield batch, batch
+            carry = X_scaled[full:] if full < len(X_scaled) else None
+        if carry is not None:
+            yield carry, carry
+
+
+def train_streaming(sources, model_type="isolation_forest", model_dir="model", model_version=None,
+                    reservoir_size=100000, chunk_size=100000, contamination=0.05, n_estimators=100,
+                    n_jobs=None, encoder_widths=(32, 16, 8), epochs=5, batch_size=256,
+                    set_current=True, seed=42):
+    """Train one model out of core; returns what the underlying trainer returns."""
+    feature_names = source_features(sources)
+    scaler, X_sample, y_sample, n_rows = scan(sources, reservoir_size, chunk_size, seed, feature_names)
+    data = split_sample(X_sample, y_sample, seed=seed, feature_names=feature_names)
+    extra_metadata = {
+        "training_data": {
+            "sources": [os.path.abspath(source) for source in sources],
+            "rows_seen": n_rows,
+            "reservoir_size": len(X_sample),
+            "scaler": "partial_fit over all rows",
+        }
+    }
+
+    if model_type == "autoencoder":
+        extra_metadata["training_data"]["batch_size"] = batch_size
+        return train_autoencoder(
+            contamination=contamination, model_dir=model_dir, model_version=model_version,
+            encoder_widths=encoder_widths, epochs=epochs, data=data, set_current=set_current,
+            scaler=scaler, train_batches=scaled_batches(sources, scaler, batch_size, chunk_size, seed,
+                                                        feature_names),
+            steps_per_epoch=math.ceil(n_rows / batch_size), extra_metadata=extra_metadata
+        )
+    return train_isolation_forest(
+        contamination=contamination, model_dir=model_dir, model_version=model_version,
+        n_estimators=n_estimators, n_jobs=n_jobs, data=data, set_current=set_current,
+        scaler=scaler, extra_metadata=extra_metadata
+    )
+
+
+def main(argv=None):
+    from training_orchestrator import parse_widths
+
+    parser = argparse.ArgumentParser(prog="fraud_detection.py train-stream",
+                                     description="Train a model from history too large for memory")
+    parser.add_argument("sources", nargs="+",
+                        help="shard directories from generate-data, or CSV/NDJSON/Parquet files")
+    parser.add_argument("--model-type", default="isolation_forest",
+                        choices=["isolation_forest", "autoencoder"])
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--model-version", help="default: a timestamp")
+    parser.add_argument("--reservoir-size", type=int, default=100000,
+                        help="rows kept in memory for the forest and evaluation")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows read per chunk from files")
+    parser.add_argument("--contamination", type=float, default=0.05)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--n-jobs", type=int, help="Isolation Forest threads")
+    parser.add_argument("--autoencoder-widths", type=parse_widths, default=(32, 16, 8), metavar="W1,W2,...")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--no-set-current", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    try:
+        train_streaming(args.sources, model_type=args.model_type, model_dir=args.model_dir,
+                        model_version=args.model_version, reservoir_size=args.reservoir_size,
+                        chunk_size=args.chunk_size, contamination=args.contamination,
+                        n_estimators=args.n_estimators, n_jobs=args.n_jobs,
+                        encoder_widths=args.autoencoder_widths, epochs=args.epochs,
+                        batch_size=args.batch_size, set_current=not args.no_set_current, seed=args.seed)
+    except Exception as e:
+        logger.error(f"Error training from {', '.join(args.sources)}: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
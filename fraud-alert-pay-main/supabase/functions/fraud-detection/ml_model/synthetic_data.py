@@ -0,0 +1,313 @@
+# ml_model/synthetic_data.py
+"""Chunked, parallel synthetic transaction generator.
+
+``generate_synthetic_data`` builds one DataFrame from the global NumPy
+random state, which limits datasets to what fits in memory. This module
+produces the same feature distributions in fixed-size chunks instead:
+chunk ``i`` is drawn from its own ``np.random.Generator`` seeded with
+``SeedSequence(seed, spawn_key=(i,))`` (the i-th child ``spawn`` would
+return), so the output depends only on ``seed``, ``chunk_size`` and the
+row count, never on how many workers produced it.
+
+Fraud rows are spread evenly: the first ``k`` rows contain exactly
+``floor(k * fraud_ratio)`` frauds, and rows are shuffled within each chunk.
+
+Shards are written as ``part-NNNNN.X.npy``/``part-NNNNN.y.npy`` pairs or
+``part-NNNNN.parquet`` files (pyarrow, optional) plus a ``manifest.json``
+that is written last. ``iter_chunks`` streams chunks straight from the
+generator and ``iter_shards`` streams a written dataset back, so training
+and benchmarks never need the whole dataset in memory.
+
+    python fraud_detection.py generate-data data/100m --rows 100000000 --workers 8
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from graph_index import GRAPH_FEATURES
+from velocity import VELOCITY_FEATURES, WINDOWS
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+LABEL_NAME = "is_fraud"
+
+
+def sample_features(rng, n, fraud=False):
+    """Draw ``n`` normal or fraudulent transactions from ``rng``.
+
+    ``rng`` is an ``np.random.Generator`` or the legacy ``np.random``
+    module; both expose the same sampling methods. Returns a dict of
+    arrays in model feature order.
+    """
+    if fraud:
+        return {
+            'amount': rng.gamma(shape=5.0, scale=80, size=n),
+            'hour_of_day': rng.normal(2, 2, size=n),
+            'time_since_last_tx': rng.exponential(1, size=n),
+            'recipient_frequency': rng.exponential(0.01, size=n),
+            'distance_to_recipient_km': rng.exponential(100, size=n),
+            'user_account_age_days': rng.normal(50, 40, size=n),
+            'recipient_account_age_days': rng.normal(20, 10, size=n),
+            'is_foreign_transaction': rng.choice([0, 1], size=n, p=[0.5, 0.5])
+        }
+    return {
+        'amount': rng.gamma(shape=2.0, scale=20, size=n),
+        'hour_of_day': rng.normal(12, 5, size=n),
+        'time_since_last_tx': rng.exponential(24, size=n),
+        'recipient_frequency': rng.exponential(0.1, size=n),
+        'distance_to_recipient_km': rng.exponential(10, size=n),
+        'user_account_age_days': rng.normal(500, 200, size=n),
+        'recipient_account_age_days': rng.normal(500, 200, size=n),
+        'is_foreign_transaction': rng.choice([0, 1], size=n, p=[0.9, 0.1])
+    }
+
+
+FEATURE_NAMES = list(sample_features(np.random.default_rng(0), 0))
+
+# Poisson rates of earlier payments per window increment (the last minute,
+# the rest of the hour, the rest of the day), per-payment amount gamma
+# (shape, scale), and the chance a payment has a new counterparty
+VELOCITY_PROFILES = {
+    ("sender", False): ((0.02, 0.3, 2.5), (2.0, 20), 0.3),
+    ("sender", True): ((1.5, 4.0, 6.0), (5.0, 80), 0.8),
+    ("recipient", False): ((0.02, 0.5, 4.0), (2.0, 20), 0.5),
+    # Mule accounts collect from many senders in a short time
+    ("recipient", True): ((1.0, 5.0, 10.0), (5.0, 80), 0.9),
+}
+
+
+def sample_velocity_features(rng, n, fraud=False):
+    """Draw ``n`` rows of ``VELOCITY_FEATURES`` (see ``velocity.py``).
+
+    Counts grow with the window, as they do in a ``VelocityAggregator``;
+    fraud rows come in bursts from senders paying many new recipients and
+    into recipients collecting from many senders.
+    """
+    features = {}
+    for side in ("sender", "recipient"):
+        rates, (shape, scale), new_counterparty = VELOCITY_PROFILES[(side, fraud)]
+        count = np.zeros(n, dtype=np.int64)
+        for (window, _, _), rate in zip(WINDOWS, rates):
+            count = count + rng.poisson(rate, size=n)
+            distinct = np.where(count > 0, 1 + rng.binomial(np.maximum(count - 1, 0), new_counterparty), 0)
+            features[f"{side}_count_{window}"] = count.astype(np.float64)
+            features[f"{side}_amount_{window}"] = rng.gamma(shape * count, scale)
+            features[f"{side}_distinct_{window}"] = distinct.astype(np.float64)
+    return {name: features[name] for name in VELOCITY_FEATURES}
+
+
+def sample_graph_features(rng, n, fraud=False):
+    """Draw ``n`` rows of ``GRAPH_FEATURES`` (see ``graph_index.py``).
+
+    Normal accounts sit in the large, mostly established component of
+    everyday payments; fraud rows come from small rings of young accounts
+    paying into mules with many payers.
+    """
+    if fraud:
+        component_size = 2 + rng.poisson(10, size=n)
+        young_share = rng.beta(6, 3, size=n)
+        fans = (12, 1, 15, 3)
+    else:
+        component_size = 2 + np.round(rng.lognormal(9, 1.5, size=n))
+        young_share = rng.beta(1, 15, size=n)
+        fans = (6, 5, 6, 5)
+    features = {name: rng.poisson(rate, size=n).astype(np.float64) for name, rate in zip(GRAPH_FEATURES, fans)}
+    features["component_size"] = component_size.astype(np.float64)
+    features["component_young_share"] = young_share
+    return features
+
+
+def chunk_count(n_samples, chunk_size):
+    return (n_samples + chunk_size - 1) // chunk_size
+
+
+def generate_chunk(chunk_index, n_samples, chunk_size=1000000, fraud_ratio=0.05, seed=42, velocity=False,
+                   graph=False):
+    """Generate chunk ``chunk_index``; returns ``(X, y)`` as float64 arrays.
+
+    With ``velocity`` the ``VELOCITY_FEATURES`` columns follow ``FEATURE_NAMES``,
+    and with ``graph`` the ``GRAPH_FEATURES`` after those.
+    """
+    start = chunk_index * chunk_size
+    stop = min(n_samples, start + chunk_size)
+    if start >= stop:
+        raise IndexError(f"Chunk {chunk_index} is past the end of a {n_samples}-row dataset")
+
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+    n_fraudulent = int(np.floor(stop * fraud_ratio)) - int(np.floor(start * fraud_ratio))
+    n_normal = stop - start - n_fraudulent
+
+    normal = sample_features(rng, n_normal)
+    fraud = sample_features(rng, n_fraudulent, fraud=True)
+    names = FEATURE_NAMES
+    if velocity:
+        normal.update(sample_velocity_features(rng, n_normal))
+        fraud.update(sample_velocity_features(rng, n_fraudulent, fraud=True))
+        names = names + VELOCITY_FEATURES
+    if graph:
+        normal.update(sample_graph_features(rng, n_normal))
+        fraud.update(sample_graph_features(rng, n_fraudulent, fraud=True))
+        names = names + GRAPH_FEATURES
+    X = np.empty((stop - start, len(names)), dtype=np.float64)
+    for j, name in enumerate(names):
+        X[:n_normal, j] = normal[name]
+        X[n_normal:, j] = fraud[name]
+    y = np.zeros(len(X), dtype=np.float64)
+    y[n_normal:] = 1.0
+
+    order = rng.permutation(len(X))
+    return X[order], y[order]
+
+
+def iter_chunks(n_samples, chunk_size=1000000, fraud_ratio=0.05, seed=42, velocity=False, graph=False):
+    """Yield ``(X, y)`` chunks of a synthetic dataset without storing it."""
+    for chunk_index in range(chunk_count(n_samples, chunk_size)):
+        yield generate_chunk(chunk_index, n_samples, chunk_size, fraud_ratio, seed, velocity, graph)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet shards need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def shard_name(chunk_index):
+    return f"part-{chunk_index:05d}"
+
+
+def dataset_features(velocity=False, graph=False):
+    """Column order of ``generate_chunk`` output for the given feature sets."""
+    return FEATURE_NAMES + (VELOCITY_FEATURES if velocity else []) + (GRAPH_FEATURES if graph else [])
+
+
+def write_shard(out_dir, chunk_index, n_samples, chunk_size, fraud_ratio, seed, file_format,
+                velocity=False, graph=False):
+    """Generate one chunk and write it as a shard; returns the shard's row count."""
+    X, y = generate_chunk(chunk_index, n_samples, chunk_size, fraud_ratio, seed, velocity, graph)
+    name = shard_name(chunk_index)
+    if file_format == "parquet":
+        pyarrow = _import_pyarrow()
+        columns = {feature: X[:, j] for j, feature in enumerate(dataset_features(velocity, graph))}
+        columns[LABEL_NAME] = y
+        pyarrow.parquet.write_table(pyarrow.table(columns), os.path.join(out_dir, f"{name}.parquet"))
+    else:
+        np.save(os.path.join(out_dir, f"{name}.X.npy"), X, allow_pickle=False)
+        np.save(os.path.join(out_dir, f"{name}.y.npy"), y, allow_pickle=False)
+    return len(X)
+
+
+def write_shards(out_dir, n_samples, chunk_size=1000000, fraud_ratio=0.05, seed=42,
+                 file_format="npy", workers=1, velocity=False, graph=False):
+    """Write a synthetic dataset as shards in ``out_dir``, in parallel.
+
+    Each worker generates and writes its own chunks, so memory stays at
+    about one chunk per worker. ``velocity`` and ``graph`` add those
+    feature columns, as in ``generate_chunk``. Returns the manifest.
+    """
+    if file_format not in ("npy", "parquet"):
+        raise ValueError(f"Unsupported shard format: {file_format}")
+    if file_format == "parquet":
+        _import_pyarrow()
+    os.makedirs(out_dir, exist_ok=True)
+    n_chunks = chunk_count(n_samples, chunk_size)
+    args = (n_samples, chunk_size, fraud_ratio, seed, file_format, velocity, graph)
+
+    start = time.perf_counter()
+    rows = 0
+    if workers <= 1:
+        for chunk_index in range(n_chunks):
+            rows += write_shard(out_dir, chunk_index, *args)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write_shard, out_dir, chunk_index, *args) for chunk_index in range(n_chunks)]
+            for done, future in enumerate(futures, 1):
+                rows += future.result()
+                if done % max(1, n_chunks // 10) == 0:
+                    logger.info(f"Wrote {done}/{n_chunks} shards")
+    elapsed = time.perf_counter() - start
+
+    manifest = {
+        "features": dataset_features(velocity, graph),
+        "label": LABEL_NAME,
+        "n_samples": n_samples,
+        "chunk_size": chunk_size,
+        "fraud_ratio": fraud_ratio,
+        "seed": seed,
+        "format": file_format,
+        "velocity": velocity,
+        "graph": graph,
+        "shards": [shard_name(i) for i in range(n_chunks)],
+    }
+    # The manifest marks the dataset as complete, so it goes in last
+    tmp_manifest = os.path.join(out_dir, f"{MANIFEST_FILE}.tmp{os.getpid()}")
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, os.path.join(out_dir, MANIFEST_FILE))
+
+    logger.info(f"Wrote {rows} rows in {n_chunks} {file_format} shards to {out_dir} "
+                f"in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+    return manifest
+
+
+def read_manifest(out_dir):
+    with open(os.path.join(out_dir, MANIFEST_FILE), "r") as f:
+        return json.load(f)
+
+
+def iter_shards(out_dir, mmap=True):
+    """Yield ``(X, y)`` per shard of a dataset written by ``write_shards``.
+
+    NPY shards are memory-mapped by default, so only the pages a consumer
+    touches are read.
+    """
+    manifest = read_manifest(out_dir)
+    for name in manifest["shards"]:
+        if manifest["format"] == "parquet":
+            pyarrow = _import_pyarrow()
+            table = pyarrow.parquet.read_table(os.path.join(out_dir, f"{name}.parquet"))
+            X = np.column_stack([table.column(feature).to_numpy() for feature in manifest["features"]])
+            yield X, table.column(manifest["label"]).to_numpy()
+        else:
+            mmap_mode = "r" if mmap else None
+            yield (np.load(os.path.join(out_dir, f"{name}.X.npy"), mmap_mode=mmap_mode, allow_pickle=False),
+                   np.load(os.path.join(out_dir, f"{name}.y.npy"), mmap_mode=mmap_mode, allow_pickle=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fraud_detection.py generate-data",
+                                     description="Write a chunked synthetic transaction dataset")
+    parser.add_argument("out_dir")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=1000000)
+    parser.add_argument("--fraud-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--velocity-features", action="store_true",
+                        help="add sender/recipient velocity features")
+    parser.add_argument("--graph-features", action="store_true",
+                        help="add transaction graph (fan-in/out, component) features")
+    args = parser.parse_args(argv)
+
+    try:
+        write_shards(args.out_dir, args.rows, args.chunk_size, args.fraud_ratio, args.seed,
+                     args.format, args.workers, args.velocity_features, args.graph_features)
+    except Exception as e:
+        logger.error(f"Error generating data: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
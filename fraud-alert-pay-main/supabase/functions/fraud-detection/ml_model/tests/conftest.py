@@ -0,0 +1,9 @@
+# ml_model/tests/conftest.py
+"""Make the ml_model modules importable, as the benchmarks do.
+
+    python -m pytest ml_model/tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
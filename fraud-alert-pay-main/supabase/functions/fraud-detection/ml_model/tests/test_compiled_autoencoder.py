@@ -0,0 +1,91 @@
+# ml_model/tests/test_compiled_autoencoder.py
+"""Pin the NumPy autoencoder forward pass without TensorFlow.
+
+Fixed dense weights are exported through ``save_compiled_autoencoder`` from
+stand-in Keras layers, loaded back and compared with reconstruction errors
+computed independently in float64.
+"""
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from compiled_autoencoder import CompiledAutoencoder, save_compiled_autoencoder
+from fraud_detection import autoencoder_fraud_scores
+
+KERNEL_0 = np.array([
+    [0.06, -0.07, 0.32, 0.05],
+    [-0.27, 0.18, 0.65, 0.47],
+    [-0.35, -0.63, -0.31, 0.02],
+    [-1.16, -0.11, -0.62, -0.37],
+    [-0.27, -0.16, 0.21, 0.52],
+    [-0.06, 0.68, -0.33, 0.18],
+    [0.45, 0.05, -0.37, -0.46],
+    [-0.23, 0.11, -0.5, -0.1],
+])
+BIAS_0 = np.array([-0.02, 0.05, 0.02, 0.04])
+KERNEL_1 = np.array([
+    [-0.33, -0.06, 0.39, 0.75, -0.63, 0.76, 0.67, 0.39],
+    [0.13, -0.16, 0.73, 0.98, 0.9, 0.66, 0.18, -0.6],
+    [0.0, 0.33, -0.64, 0.2, 0.21, 0.35, -0.59, -0.33],
+    [-0.22, -0.58, 0.87, -0.25, 0.16, -0.13, 0.79, 0.66],
+])
+BIAS_1 = np.array([0.06, -0.22, 0.01, 0.07, 0.1, -0.06, 0.18, -0.13])
+
+X_SCALED = np.array([
+    [-0.66, 0.94, 0.05, 2.0, 0.19, -0.63, -0.38, -1.09],
+    [-1.28, 0.63, 0.58, 1.29, -0.75, 1.69, -0.29, 1.57],
+    [-0.43, -0.74, 0.25, 1.03, 0.16, -0.59, -1.34, -1.4],
+    [0.5, 0.99, -0.16, -1.07, 0.87, -1.28, -0.71, 0.62],
+])
+# mean((X - (relu(X @ K0 + b0) @ K1 + b1)) ** 2) per row, in float64
+EXPECTED_MSE = np.array([0.86669857, 1.77724791, 0.69649597, 1.34078466])
+
+
+class FakeLayer:
+    """The two methods ``export_autoencoder`` reads from a Keras layer."""
+
+    def __init__(self, weights, activation=None):
+        self.weights = weights
+        self.activation = activation
+
+    def get_weights(self):
+        return self.weights
+
+    def get_config(self):
+        return {"activation": self.activation} if self.activation else {}
+
+
+class FakeModel:
+    def __init__(self, layers):
+        self.layers = layers
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    model = FakeModel([
+        FakeLayer([]),  # Input
+        FakeLayer([KERNEL_0.astype(np.float32), BIAS_0.astype(np.float32)], "relu"),
+        FakeLayer([KERNEL_1.astype(np.float32), BIAS_1.astype(np.float32)], "linear"),
+    ])
+    scaler = StandardScaler().fit(np.arange(16, dtype=np.float64).reshape(2, 8))
+    save_compiled_autoencoder(model, scaler, 0.5, str(tmp_path))
+    return CompiledAutoencoder.load(str(tmp_path), version="test")
+
+
+def test_reconstruction_error_matches_expected(compiled):
+    np.testing.assert_allclose(compiled.reconstruction_error(X_SCALED), EXPECTED_MSE, rtol=1e-5)
+
+
+def test_chunked_forward_pass_matches_single_chunk(compiled):
+    compiled.chunk_size = 3
+    np.testing.assert_allclose(compiled.reconstruction_error(X_SCALED), EXPECTED_MSE, rtol=1e-5)
+
+
+def test_fraud_scores(compiled):
+    np.testing.assert_array_equal(autoencoder_fraud_scores(compiled, X_SCALED), [86, 100, 69, 100])
+
+
+def test_threshold_and_scaler_round_trip(compiled):
+    assert compiled.threshold == 0.5
+    assert compiled.n_features == 8
+    np.testing.assert_allclose(compiled.scaler.mean_, np.arange(4, 12, dtype=np.float64))
@@ -0,0 +1,47 @@
+# ml_model/tests/test_compiled_forest.py
+"""The NumPy forest engine against sklearn's IsolationForest."""
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from compiled_forest import CompiledIsolationForest, save_compiled_forest
+from fraud_detection import score_feature_array
+
+
+@pytest.fixture(scope="module")
+def engines(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 8)) * [100, 6, 20, 0.3, 50, 300, 300, 0.5] + [200, 12, 24, 0.5, 40, 500, 500, 0.2]
+    scaler = StandardScaler().fit(X)
+    model = IsolationForest(n_estimators=50, contamination=0.05, random_state=42).fit(scaler.transform(X))
+    model_path = str(tmp_path_factory.mktemp("model"))
+    save_compiled_forest(model, scaler, model_path)
+    compiled = CompiledIsolationForest.load(model_path, version="test")
+    return X, (model, scaler, "test"), (compiled, compiled.scaler, "test")
+
+
+def test_decision_function_matches_sklearn(engines):
+    X, (model, scaler, _), (compiled, _, _) = engines
+    X_scaled = scaler.transform(X)
+    np.testing.assert_allclose(compiled.decision_function(X_scaled), model.decision_function(X_scaled),
+                               rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(compiled.predict(X_scaled), model.predict(X_scaled))
+
+
+def test_fraud_scores_match_sklearn(engines):
+    X, sklearn_models, compiled_models = engines
+    expected, _ = score_feature_array(X, models=sklearn_models, cascade=False)
+    scores, version = score_feature_array(X, models=compiled_models, cascade=False)
+    np.testing.assert_array_equal(scores, expected)
+    assert version == "test"
+
+
+@pytest.mark.parametrize("bad", [np.nan, np.inf, -np.inf])
+def test_both_engines_reject_non_finite_rows(engines, bad):
+    X, sklearn_models, compiled_models = engines
+    X_bad = X[:10].copy()
+    X_bad[3, 2] = bad
+    for models in (sklearn_models, compiled_models):
+        with pytest.raises(ValueError):
+            score_feature_array(X_bad, models=models, cascade=False)
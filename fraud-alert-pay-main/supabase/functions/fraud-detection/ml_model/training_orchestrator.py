@@ -0,0 +1,267 @@
+# ml_model/training_orchestrator.py
+"""Parallel training of models and hyperparameter candidates.
+
+The dataset is generated (or an existing one reused) and split exactly
+once, then saved as raw ``.npy`` files that every worker opens with
+``mmap_mode="r"``, so all candidates train on the same rows without each
+process regenerating or copying them. Candidates (Isolation Forest
+``n_estimators`` x ``contamination``, autoencoder encoder widths) are
+trained concurrently in a process pool; the cores are split between the
+workers and each Isolation Forest uses its share through ``n_jobs``.
+
+Every candidate is written to its own ``model/<version>`` directory by the
+usual ``train_isolation_forest``/``train_autoencoder`` code with
+``set_current=False``. Afterwards the best candidate of each model type
+(fraud-class F1 on the held-out split) is published: the Isolation Forest
+through ``current`` and the autoencoder through ``current_autoencoder``,
+each with its root compatibility copies, so ``"latest"`` serves the
+winners of the run.
+
+``--compare-serial`` also runs the same candidates one after another on a
+single core, on the same prepared dataset, into a scratch directory and
+reports the wall-clock speedup. The dataset is prepared before either run
+is timed.
+
+    python fraud_detection.py train-parallel --workers 8 --n-estimators 100 200 400
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from fraud_detection import (generate_synthetic_data, train_autoencoder, train_isolation_forest,
+                             update_current_symlink)
+
+logger = logging.getLogger(__name__)
+
+DATASET_FILE = "dataset.json"
+DATASET_ARRAYS = ("X_train", "X_test", "y_train", "y_test")
+
+# Root compatibility copies written when a model type's winner is published
+PUBLISHED_FILES = {
+    "isolation_forest": ("isolation_forest.pkl", "scaler.pkl"),
+    "autoencoder": ("autoencoder.pkl", "scaler_autoencoder.pkl"),
+}
+
+
+def prepare_dataset(dataset_dir, n_samples=5000, fraud_ratio=0.05, test_size=0.3, random_state=42,
+                    velocity=False, graph=False):
+    """Generate and split the training data once into ``dataset_dir``.
+
+    An existing dataset in ``dataset_dir`` is reused as is. ``velocity``
+    and ``graph`` add the velocity and graph features (see ``velocity.py``
+    and ``graph_index.py``).
+    """
+    if os.path.exists(os.path.join(dataset_dir, DATASET_FILE)):
+        logger.info(f"Reusing dataset in {dataset_dir}")
+        return dataset_dir
+
+    from sklearn.model_selection import train_test_split
+
+    df, labels = generate_synthetic_data(n_samples=n_samples, fraud_ratio=fraud_ratio, velocity=velocity,
+                                         graph=graph)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df.to_numpy(dtype=np.float64), labels, test_size=test_size,
+        random_state=random_state, stratify=labels
+    )
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    for name, array in zip(DATASET_ARRAYS, (X_train, X_test, y_train, y_test)):
+        np.save(os.path.join(dataset_dir, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+    with open(os.path.join(dataset_dir, DATASET_FILE), "w") as f:
+        json.dump({"features": list(df.columns), "n_samples": n_samples,
+                   "fraud_ratio": fraud_ratio, "test_size": test_size, "velocity": velocity,
+                   "graph": graph}, f, indent=2)
+    logger.info(f"Saved {n_samples}-row dataset to {dataset_dir}")
+    return dataset_dir
+
+
+def load_dataset(dataset_dir):
+    """Map a prepared dataset; returns the ``data`` tuple the trainers accept."""
+    with open(os.path.join(dataset_dir, DATASET_FILE), "r") as f:
+        feature_names = json.load(f)["features"]
+    arrays = [np.load(os.path.join(dataset_dir, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+              for name in DATASET_ARRAYS]
+    return (*arrays, feature_names)
+
+
+def candidate_grid(n_estimators=(100,), contaminations=(0.05,), encoder_widths=()):
+    """Expand hyperparameter lists into candidate dicts."""
+    candidates = [{"model_type": "isolation_forest", "n_estimators": n, "contamination": c}
+                  for n in n_estimators for c in contaminations]
+    candidates += [{"model_type": "autoencoder", "encoder_widths": list(widths), "contamination": c}
+                   for widths in encoder_widths for c in contaminations]
+    return candidates
+
+
+def parse_widths(value):
+    """Parse ``32,16,8`` into a tuple of layer widths."""
+    return tuple(int(width) for width in value.split(","))
+
+
+def fraud_f1(model_path):
+    """Fraud-class F1 recorded in a trained model's metadata."""
+    with open(os.path.join(model_path, "metadata.json"), "r") as f:
+        report = json.load(f)["performance"]
+    return report.get("1.0", report.get("1", {})).get("f1-score", 0.0)
+
+
+def train_candidate(candidate, model_dir, model_version, dataset_dir=None, n_jobs=None):
+    """Train one candidate; returns a result dict (with ``error`` on failure).
+
+    Without ``dataset_dir`` the trainer generates its own data, as the
+    serial ``train_models`` path does.
+    """
+    start = time.perf_counter()
+    params = {k: v for k, v in candidate.items() if k != "model_type"}
+    data = load_dataset(dataset_dir) if dataset_dir else None
+    result = {"model_type": candidate["model_type"], "params": params, "model_version": model_version}
+    try:
+        if candidate["model_type"] == "autoencoder":
+            *_, model_path = train_autoencoder(model_dir=model_dir, model_version=model_version,
+                                               data=data, set_current=False, **params)
+        else:
+            *_, model_path = train_isolation_forest(model_dir=model_dir, model_version=model_version,
+                                                    n_jobs=n_jobs, data=data, set_current=False, **params)
+        result["f1"] = fraud_f1(model_path)
+    except Exception as e:
+        logger.error(f"Error training {candidate['model_type']} candidate {params}: {str(e)}")
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _init_worker():
+    logging.basicConfig(level=logging.WARNING)
+
+
+def train_parallel(candidates, model_dir="model", workers=None, dataset_dir=None,
+                   n_samples=5000, fraud_ratio=0.05, set_current=True, velocity=False,
+                   graph=False):
+    """Train ``candidates`` concurrently on one shared dataset.
+
+    Returns ``(results, wall_seconds)``; results are in candidate order.
+    """
+    workers = workers or min(len(candidates), os.cpu_count() or 1)
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(model_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    start = time.perf_counter()
+    scratch = None
+    if dataset_dir is None:
+        scratch = dataset_dir = tempfile.mkdtemp(prefix="dataset_", dir=model_dir)
+    try:
+        prepare_dataset(dataset_dir, n_samples=n_samples, fraud_ratio=fraud_ratio, velocity=velocity,
+                        graph=graph)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(train_candidate, candidate, model_dir,
+                                   f"{stamp}_{candidate['model_type']}_{i:02d}", dataset_dir, n_jobs)
+                       for i, candidate in enumerate(candidates)]
+            results = [future.result() for future in futures]
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    wall_seconds = time.perf_counter() - start
+
+    if set_current:
+        for model_type in PUBLISHED_FILES:
+            trained = [r for r in results if r["model_type"] == model_type and "error" not in r]
+            if trained:
+                best = max(trained, key=lambda r: r["f1"])
+                publish(model_dir, best["model_version"], model_type)
+                logger.info(f"Published {model_type} {best['model_version']} "
+                            f"({best['params']}, F1 {best['f1']:.3f})")
+    return results, wall_seconds
+
+
+def publish(model_dir, model_version, model_type="isolation_forest"):
+    """Point the model type's current link and root compatibility copies at a trained model."""
+    model_path = os.path.join(model_dir, model_version)
+    for file_name in PUBLISHED_FILES[model_type]:
+        shutil.copyfile(os.path.join(model_path, file_name), os.path.join(model_dir, file_name))
+    update_current_symlink(model_dir, model_version, model_type)
+
+
+def train_serial(candidates, dataset_dir):
+    """Train ``candidates`` one by one on a single core; returns wall seconds."""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="serial_models_") as model_dir:
+        for i, candidate in enumerate(candidates):
+            train_candidate(candidate, model_dir, f"serial_{i:02d}", dataset_dir, n_jobs=1)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fraud_detection.py train-parallel",
+                                     description="Train models and hyperparameter candidates in parallel")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--workers", type=int, help="training processes (default: one per candidate, up to the core count)")
+    parser.add_argument("--n-estimators", type=int, nargs="*", default=[100])
+    parser.add_argument("--contamination", type=float, nargs="*", default=[0.05])
+    parser.add_argument("--autoencoder-widths", type=parse_widths, nargs="*", default=[],
+                        metavar="W1,W2,...", help="encoder widths per autoencoder candidate, e.g. 32,16,8")
+    parser.add_argument("--n-samples", type=int, default=5000)
+    parser.add_argument("--fraud-ratio", type=float, default=0.05)
+    parser.add_argument("--velocity-features", action="store_true",
+                        help="add sender/recipient velocity features to the generated data")
+    parser.add_argument("--graph-features", action="store_true",
+                        help="add transaction graph (fan-in/out, component) features to the generated data")
+    parser.add_argument("--dataset", help="directory to keep (or reuse) the prepared dataset in")
+    parser.add_argument("--no-set-current", action="store_true",
+                        help="do not publish the best candidate of each model type")
+    parser.add_argument("--compare-serial", action="store_true",
+                        help="also time the serial train_models-style path")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    candidates = candidate_grid(args.n_estimators, args.contamination, args.autoencoder_widths)
+    dataset_dir = args.dataset
+    scratch = None
+    if args.compare_serial:
+        # Both runs train on the same rows, prepared outside either timing
+        if dataset_dir is None:
+            os.makedirs(args.model_dir, exist_ok=True)
+            scratch = dataset_dir = tempfile.mkdtemp(prefix="dataset_", dir=args.model_dir)
+        prepare_dataset(dataset_dir, n_samples=args.n_samples, fraud_ratio=args.fraud_ratio,
+                        velocity=args.velocity_features, graph=args.graph_features)
+    try:
+        results, wall_seconds = train_parallel(candidates, model_dir=args.model_dir, workers=args.workers,
+                                               dataset_dir=dataset_dir, n_samples=args.n_samples,
+                                               fraud_ratio=args.fraud_ratio,
+                                               set_current=not args.no_set_current,
+                                               velocity=args.velocity_features,
+                                               graph=args.graph_features)
+        report = {"candidates": results, "parallel_seconds": wall_seconds}
+        if args.compare_serial:
+            report["serial_seconds"] = train_serial(candidates, dataset_dir)
+            report["speedup"] = report["serial_seconds"] / wall_seconds
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for r in results:
+        outcome = f"F1 {r['f1']:.3f}" if "error" not in r else f"failed: {r['error']}"
+        print(f"{r['model_version']:<40} {json.dumps(r['params']):<50} {r['seconds']:>7.1f}s  {outcome}")
+    print(f"parallel wall time {wall_seconds:.1f}s")
+    if args.compare_serial:
+        print(f"serial wall time {report['serial_seconds']:.1f}s, speedup {report['speedup']:.2f}x")
+    sys.exit(1 if any("error" in r for r in results) else 0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,211 @@
+# ml_model/wire_protocol.py
+"""Binary framing for the scoring server.
+
+JSON stays the default; this is an opt-in alternative for clients that
+already hold feature rows in model order and want to skip building,
+encoding and parsing a JSON object per transaction.
+
+Every frame starts with a 4-byte magic and the little-endian ``uint32``
+length of the rest of the frame, so a frame is read with two exact reads
+and a JSON line never looks like one. All integers are little-endian.
+
+Request (magic ``FRQ1``)::
+
+    uint8   itemsize          4 (float32) or 8 (float64)
+    uint8   model_type length
+    uint8   model_version length
+    uint8   reserved
+    uint32  n_rows
+    uint16  n_features
+    uint16  reserved
+    bytes   model_type, model_version (UTF-8), zero-padded so the
+            records start at an 8-byte offset from the frame start
+    float   n_rows * n_features values, row-major, in model feature order
+
+``decode_request`` maps the records onto a NumPy array with
+``np.frombuffer`` instead of copying them.
+
+Response (magic ``FRS1``)::
+
+    uint8   status            0 ok, 1 error
+    uint8   reserved
+    uint16  text length
+    uint32  n_rows
+    bytes   text: the model version, or the error message
+    uint8   n_rows fraud scores (0-100)
+    uint8   n_rows flags: FLAG_FRAUD when the score is above
+            FRAUD_SCORE_THRESHOLD, FLAG_INVALID (score 0) for a row with a
+            non-finite value
+
+A frame is scored as one batch with ``score_feature_array``; it does not
+go through the score cache, feature store, micro-batcher or ensemble,
+which all work on transaction dicts.
+"""
+import logging
+import struct
+
+import numpy as np
+
+from fraud_detection import FRAUD_SCORE_THRESHOLD, get_models, model_feature_names, score_feature_array
+
+logger = logging.getLogger(__name__)
+
+FRAME_CONTENT_TYPE = "application/x-fraud-frame"
+
+REQUEST_MAGIC = b"FRQ1"
+RESPONSE_MAGIC = b"FRS1"
+
+# magic, length of the rest of the frame
+FRAME_PREFIX = struct.Struct("<4sI")
+# itemsize, model_type length, model_version length, n_rows, n_features
+REQUEST_HEADER = struct.Struct("<BBBxIH2x")
+# status, text length, n_rows
+RESPONSE_HEADER = struct.Struct("<BxHI")
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+FLAG_FRAUD = 1
+FLAG_INVALID = 2
+
+DTYPES = {4: np.dtype("<f4"), 8: np.dtype("<f8")}
+
+# Refuse frames larger than this rather than buffering them
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+
+def _padded(offset):
+    return (offset + 7) & ~7
+
+
+def encode_request(X, model_type="isolation_forest", model_version="latest", dtype=np.float32):
+    """Pack a 2-D feature array (model feature order) into a request frame."""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype.itemsize not in DTYPES or dtype.kind != "f":
+        raise ValueError(f"Unsupported record dtype: {dtype}")
+    X = np.ascontiguousarray(X, dtype=dtype)
+    if X.ndim != 2:
+        raise ValueError("Expected a 2-D feature array")
+    model_type = model_type.encode("utf-8")
+    model_version = model_version.encode("utf-8")
+    offset = FRAME_PREFIX.size + REQUEST_HEADER.size + len(model_type) + len(model_version)
+    records = _padded(offset)
+    length = records + X.nbytes - FRAME_PREFIX.size
+    return b"".join((
+        FRAME_PREFIX.pack(REQUEST_MAGIC, length),
+        REQUEST_HEADER.pack(dtype.itemsize, len(model_type), len(model_version), X.shape[0], X.shape[1]),
+        model_type, model_version, bytes(records - offset),
+        X.tobytes(),
+    ))
+
+
+def decode_request(frame):
+    """Return ``(X, model_type, model_version)`` for a request frame.
+
+    ``X`` is a view of ``frame``'s buffer, not a copy.
+    """
+    magic, length = FRAME_PREFIX.unpack_from(frame)
+    if magic != REQUEST_MAGIC:
+        raise ValueError(f"Not a request frame: {magic!r}")
+    if len(frame) != FRAME_PREFIX.size + length:
+        raise ValueError(f"Frame holds {len(frame)} bytes, its header says {FRAME_PREFIX.size + length}")
+    itemsize, type_length, version_length, n_rows, n_features = REQUEST_HEADER.unpack_from(
+        frame, FRAME_PREFIX.size)
+    if itemsize not in DTYPES:
+        raise ValueError(f"Unsupported record itemsize: {itemsize}")
+    offset = FRAME_PREFIX.size + REQUEST_HEADER.size
+    text = bytes(frame[offset:offset + type_length + version_length]).decode("utf-8")
+    model_type, model_version = text[:type_length], text[type_length:]
+    records = _padded(offset + type_length + version_length)
+    if len(frame) - records != n_rows * n_features * itemsize:
+        raise ValueError(f"Frame does not hold {n_rows} rows of {n_features} features")
+    X = np.frombuffer(frame, dtype=DTYPES[itemsize], count=n_rows * n_features, offset=records)
+    return X.reshape(n_rows, n_features), model_type, model_version
+
+
+def encode_response(fraud_scores, flags, model_version):
+    """Pack per-row scores and flags into a response frame."""
+    text = str(model_version).encode("utf-8")[:0xFFFF]
+    scores = np.asarray(fraud_scores, dtype=np.uint8)
+    flags = np.asarray(flags, dtype=np.uint8)
+    length = RESPONSE_HEADER.size + len(text) + 2 * len(scores)
+    return b"".join((
+        FRAME_PREFIX.pack(RESPONSE_MAGIC, length),
+        RESPONSE_HEADER.pack(STATUS_OK, len(text), len(scores)),
+        text, scores.tobytes(), flags.tobytes(),
+    ))
+
+
+def encode_error(message):
+    """Return an error response frame carrying ``message``."""
+    text = str(message).encode("utf-8")[:0xFFFF]
+    return b"".join((
+        FRAME_PREFIX.pack(RESPONSE_MAGIC, RESPONSE_HEADER.size + len(text)),
+        RESPONSE_HEADER.pack(STATUS_ERROR, len(text), 0),
+        text,
+    ))
+
+
+def decode_response(frame):
+    """Return ``(fraud_scores, flags, model_version)``; raises ``ValueError`` for an error frame."""
+    magic, length = FRAME_PREFIX.unpack_from(frame)
+    if magic != RESPONSE_MAGIC:
+        raise ValueError(f"Not a response frame: {magic!r}")
+    status, text_length, n_rows = RESPONSE_HEADER.unpack_from(frame, FRAME_PREFIX.size)
+    offset = FRAME_PREFIX.size + RESPONSE_HEADER.size
+    text = bytes(frame[offset:offset + text_length]).decode("utf-8")
+    if status != STATUS_OK:
+        raise ValueError(f"Scoring server error: {text}")
+    offset += text_length
+    scores = np.frombuffer(frame, dtype=np.uint8, count=n_rows, offset=offset)
+    flags = np.frombuffer(frame, dtype=np.uint8, count=n_rows, offset=offset + n_rows)
+    return scores, flags, text
+
+
+def read_frame(stream, magic=REQUEST_MAGIC):
+    """Read one whole frame from a binary stream; returns None at a clean EOF."""
+    prefix = stream.read(FRAME_PREFIX.size)
+    if not prefix:
+        return None
+    if len(prefix) < FRAME_PREFIX.size:
+        raise ValueError("Connection closed inside a frame header")
+    found, length = FRAME_PREFIX.unpack(prefix)
+    if found != magic:
+        raise ValueError(f"Expected a {magic!r} frame, got {found!r}")
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    # Read straight into the frame buffer the records will be viewed from
+    frame = bytearray(FRAME_PREFIX.size + length)
+    frame[:FRAME_PREFIX.size] = prefix
+    if stream.readinto(memoryview(frame)[FRAME_PREFIX.size:]) < length:
+        raise ValueError("Connection closed inside a frame")
+    return frame
+
+
+def score_frame(frame, cascade=None):
+    """Score a request frame and return the encoded response frame."""
+    try:
+        X, model_type, model_version = decode_request(frame)
+        if model_type == "ensemble":
+            raise ValueError("Ensemble requests must be sent as JSON")
+        models = get_models(model_type, model_version)
+        n_features = len(model_feature_names(models[1]))
+        if X.shape[1] != n_features:
+            raise ValueError(f"Frame rows have {X.shape[1]} features, the model expects {n_features}")
+        fraud_scores = np.zeros(len(X), dtype=np.uint8)
+        flags = np.zeros(len(X), dtype=np.uint8)
+        valid = np.isfinite(X).all(axis=1)
+        if valid.all():
+            scores, model_version = score_feature_array(X, model_type, model_version, models=models,
+                                                        cascade=cascade)
+            fraud_scores[:] = scores
+        else:
+            flags[~valid] = FLAG_INVALID
+            scores, model_version = score_feature_array(X[valid], model_type, model_version, models=models,
+                                                        cascade=cascade)
+            fraud_scores[valid] = scores
+        flags[fraud_scores > FRAUD_SCORE_THRESHOLD] |= FLAG_FRAUD
+    except Exception as e:
+        logger.error(f"Error scoring frame: {str(e)}")
+        return encode_error(e)
+    return encode_response(fraud_scores, flags, model_version)
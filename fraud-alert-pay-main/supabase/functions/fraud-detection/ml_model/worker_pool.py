@@ -0,0 +1,419 @@
+# ml_model/worker_pool.py
+"""Pre-fork worker pool for the scoring server.
+
+One scoring process is held to about one core by the GIL around the
+pandas/NumPy glue, so ``scoring_server.py --workers N`` runs N worker
+processes instead. The parent binds the listening sockets and loads the
+``--preload`` models through the registry, then freezes the garbage
+collector's view of them and forks. Workers inherit the loaded models
+copy-on-write, and model artifacts are memory-mapped (see
+``model_artifacts``), so the pages stay shared between all workers.
+Each worker only adds its own interpreter state, thread stacks and
+request buffers.
+
+Workers accept on the inherited sockets, so the kernel spreads
+connections across them. The parent supervises them:
+
+* a worker that exits unexpectedly is replaced (at most once per
+  ``restart_delay`` seconds per slot);
+* when ``model/current`` (or ``current_autoencoder``) moves, or on
+  SIGHUP, the parent loads the new version and rolls the workers one at
+  a time. A replacement is forked with the new models and must report
+  ready before the old worker is sent SIGTERM. The old worker stops
+  accepting and finishes its in-flight requests, and is killed after
+  ``graceful_timeout``. Workers
+  never follow ``current`` on their own (``ModelRegistry.pin_current``),
+  so a version is loaded once per host rather than once per worker.
+
+``process_memory`` reads ``/proc/<pid>/smaps_rollup``. Its USS (private
+pages) is what each extra worker costs, and its PSS splits shared pages
+evenly between the processes that map them. The parent logs both every
+``memory_interval`` seconds and writes them to ``stats_file``.
+``benchmarks/bench_worker_pool.py`` measures them with and without
+preloading.
+
+Feature store state lives in a single process, so ``--feature-store``
+is not available with ``--workers``. Score caches are per worker unless
+``--score-cache-db`` gives them a shared SQLite file.
+"""
+import gc
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# smaps_rollup fields summed into each figure, in kB
+MEMORY_FIELDS = {
+    "rss": ("Rss",),
+    "pss": ("Pss",),
+    "uss": ("Private_Clean", "Private_Dirty"),
+    "shared": ("Shared_Clean", "Shared_Dirty"),
+    "swap": ("Swap",),
+}
+
+
+def process_memory(pid):
+    """Return ``rss``/``pss``/``uss``/``shared``/``swap`` of a process in bytes, or None."""
+    totals = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    totals[name] = int(value.split()[0]) * 1024
+    except OSError:
+        return None
+    return {key: sum(totals.get(name, 0) for name in names) for key, names in MEMORY_FIELDS.items()}
+
+
+def listen_tcp(address, backlog=128):
+    """Bind and listen on ``(host, port)`` before forking."""
+    sock = socket.socket(socket.AF_INET6 if ":" in address[0] else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    return sock
+
+
+def listen_unix(path, backlog=128):
+    """Bind and listen on a Unix socket path before forking."""
+    # Remove a stale socket left behind by a previous run
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(backlog)
+    return sock
+
+
+def signal_ready(fd):
+    """Tell the parent a worker is accepting; it may have stopped listening."""
+    try:
+        os.write(fd, b"1")
+    except OSError:
+        pass
+
+
+class Worker:
+    """Bookkeeping for one forked worker process."""
+
+    __slots__ = ("slot", "pid", "generation", "started_at")
+
+    def __init__(self, slot, pid, generation):
+        self.slot = slot
+        self.pid = pid
+        self.generation = generation
+        self.started_at = time.time()
+
+
+class PreforkPool:
+    """Forks, supervises and rolls a fixed number of worker processes.
+
+    ``worker_main(ready)`` runs in each child. It should call ``ready()``
+    once it is accepting requests, and return after SIGTERM once its
+    in-flight work is done. ``load`` runs in the parent before every
+    generation is forked; it is where shared models are loaded.
+    """
+
+    def __init__(self, worker_main, workers, load=None, graceful_timeout=30.0, restart_delay=1.0,
+                 ready_timeout=60.0):
+        if workers < 1:
+            raise ValueError("A worker pool needs at least one worker")
+        self.worker_main = worker_main
+        self.workers = workers
+        self.load = load
+        self.graceful_timeout = graceful_timeout
+        self.restart_delay = restart_delay
+        self.ready_timeout = ready_timeout
+
+        self.generation = 0
+        self._slots = {}  # slot -> Worker
+        self._last_start = {}  # slot -> monotonic time of the last fork
+        self.restarts = 0
+        self.rollovers = 0
+
+    def _fork(self, slot):
+        """Fork a worker for ``slot``; returns ``(Worker, ready_fd)``."""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = 0
+            try:
+                # The parent decides when workers stop or roll
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                self.worker_main(lambda: signal_ready(write_fd))
+            except BaseException as e:
+                logger.error(f"Error in scoring worker {slot}: {str(e)}")
+                status = 1
+            finally:
+                logging.shutdown()
+                os._exit(status)
+
+        os.close(write_fd)
+        self._last_start[slot] = time.monotonic()
+        worker = Worker(slot, pid, self.generation)
+        self._slots[slot] = worker
+        return worker, read_fd
+
+    def _wait_ready(self, worker, ready_fd):
+        """Wait for a worker's ready byte; returns False if it died or timed out."""
+        try:
+            readable, _, _ = select.select([ready_fd], [], [], self.ready_timeout)
+            return bool(readable) and os.read(ready_fd, 1) == b"1"
+        finally:
+            os.close(ready_fd)
+
+    def _prepare(self):
+        """Load shared state in the parent and keep the collector off it in the children."""
+        # Let the previous generation's state be collected before loading
+        gc.unfreeze()
+        if self.load is not None:
+            self.load()
+        # Objects that survive to here are never collected in the workers, so
+        # the collector's bookkeeping writes don't copy their pages
+        gc.collect()
+        gc.freeze()
+
+    def start(self):
+        """Load, then fork every worker and wait for them to be ready."""
+        self._prepare()
+        started = [self._fork(slot) for slot in range(self.workers)]
+        for worker, ready_fd in started:
+            if not self._wait_ready(worker, ready_fd):
+                logger.error(f"Scoring worker {worker.slot} (pid {worker.pid}) did not become ready")
+        logger.info(f"Started {self.workers} scoring workers: {[w.pid for w, _ in started]}")
+
+    def reap(self):
+        """Replace workers that exited; returns how many were restarted."""
+        restarted = 0
+        for slot, worker in list(self._slots.items()):
+            try:
+                pid, status = os.waitpid(worker.pid, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = worker.pid, 0
+            if pid == 0:
+                continue
+            if time.monotonic() - self._last_start[slot] < self.restart_delay:
+                continue  # restarted too recently; try again on the next tick
+            logger.error(f"Scoring worker {slot} (pid {worker.pid}) exited with status "
+                         f"{os.waitstatus_to_exitcode(status)}; restarting")
+            _, ready_fd = self._fork(slot)
+            os.close(ready_fd)
+            self.restarts += 1
+            restarted += 1
+        return restarted
+
+    def _stop_worker(self, worker):
+        """SIGTERM a worker and wait for it to drain, killing it after ``graceful_timeout``."""
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(worker.pid, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid:
+                return
+            time.sleep(0.05)
+        logger.error(f"Scoring worker {worker.slot} (pid {worker.pid}) did not drain in "
+                     f"{self.graceful_timeout}s; killing it")
+        os.kill(worker.pid, signal.SIGKILL)
+        os.waitpid(worker.pid, 0)
+
+    def roll(self):
+        """Move every worker onto freshly loaded models, one slot at a time."""
+        self.generation += 1
+        self._prepare()
+        for slot in range(self.workers):
+            old = self._slots[slot]
+            worker, ready_fd = self._fork(slot)
+            if not self._wait_ready(worker, ready_fd):
+                # Keep the old worker serving; the new one is reaped as crashed
+                logger.error(f"Replacement for scoring worker {slot} did not become ready; "
+                             f"keeping pid {old.pid}")
+                self._stop_worker(worker)
+                self._slots[slot] = old
+                continue
+            self._stop_worker(old)
+        self.rollovers += 1
+        logger.info(f"Rolled scoring workers onto generation {self.generation}")
+
+    def stop(self):
+        """SIGTERM every worker and wait for them to drain."""
+        workers = list(self._slots.values())
+        for worker in workers:
+            try:
+                os.kill(worker.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in workers:
+            while True:
+                try:
+                    pid, _ = os.waitpid(worker.pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid:
+                    break
+                if time.monotonic() >= deadline:
+                    os.kill(worker.pid, signal.SIGKILL)
+                    os.waitpid(worker.pid, 0)
+                    break
+                time.sleep(0.05)
+        self._slots.clear()
+
+    def memory(self):
+        """Return ``process_memory`` for the parent and every worker."""
+        return {
+            "parent": process_memory(os.getpid()),
+            "workers": {worker.slot: process_memory(worker.pid) for worker in self._slots.values()},
+        }
+
+    def stats(self):
+        memory = self.memory()
+        workers = []
+        for worker in sorted(self._slots.values(), key=lambda worker: worker.slot):
+            workers.append({
+                "slot": worker.slot,
+                "pid": worker.pid,
+                "generation": worker.generation,
+                "started_at": worker.started_at,
+                "memory": memory["workers"].get(worker.slot),
+            })
+        measured = [w["memory"] for w in workers if w["memory"] is not None]
+        return {
+            "workers": workers,
+            "generation": self.generation,
+            "restarts": self.restarts,
+            "rollovers": self.rollovers,
+            "parent_memory": memory["parent"],
+            # What one more worker costs, and each worker's share of everything it maps
+            "mean_worker_uss": sum(m["uss"] for m in measured) / len(measured) if measured else None,
+            "mean_worker_pss": sum(m["pss"] for m in measured) / len(measured) if measured else None,
+        }
+
+
+def log_memory(stats, stats_file=None):
+    mb = 1024 * 1024
+    if stats["mean_worker_uss"] is not None:
+        logger.info(f"{len(stats['workers'])} scoring workers: {stats['mean_worker_uss'] / mb:.1f} MB "
+                    f"private, {stats['mean_worker_pss'] / mb:.1f} MB proportional per worker")
+    if stats_file:
+        try:
+            with open(stats_file + ".tmp", "w") as f:
+                json.dump(stats, f, indent=2)
+            os.replace(stats_file + ".tmp", stats_file)
+        except Exception as e:
+            logger.error(f"Error writing worker pool stats: {str(e)}")
+
+
+def serve_prefork(workers, http_address=None, unix_path=None, model_dir="model", preload=(),
+                  cache_entries=8, cache_mb=1024, batch_size=64, batch_wait_ms=2.0,
+                  score_cache_entries=10000, score_cache_ttl=300.0, score_cache_path=None,
+                  ensemble_members=(), ensemble_rule="max", shadows=(), shadow_log=None, cascade=False,
+                  graceful_timeout=30.0, memory_interval=60.0, stats_file=None, poll_interval=1.0):
+    """Run ``workers`` scoring server processes on shared sockets until SIGINT/SIGTERM."""
+    import fraud_detection
+    from ensemble import Ensemble
+    from fraud_detection import get_models, get_registry
+    from micro_batcher import MicroBatcher
+    from score_cache import ScoreCache
+    from scoring_server import ScoringHTTPServer, ScoringService, ScoringUnixServer, parse_address
+
+    sockets = []
+    if http_address:
+        sockets.append(("http", listen_tcp(parse_address(http_address))))
+        logger.info(f"Scoring server listening on http://{http_address} with {workers} workers")
+    if unix_path:
+        sockets.append(("unix", listen_unix(unix_path)))
+        logger.info(f"Scoring server listening on unix://{unix_path} with {workers} workers")
+    if not sockets:
+        raise ValueError("At least one of http_address or unix_path is required")
+
+    registry = get_registry(model_dir, max_entries=cache_entries, max_bytes=cache_mb * 1024 * 1024)
+    if cascade:
+        fraud_detection.CASCADE_ENABLED = True
+
+    def load():
+        # Workers inherit everything the parent holds, so only keep what they serve
+        registry.clear()
+        for model_type in preload:
+            get_models(model_type)
+
+    def worker_main(ready):
+        registry.pin_current()
+        # Threads don't survive fork, so everything that starts one is built here
+        batcher = MicroBatcher(batch_size, batch_wait_ms) if batch_size > 0 else None
+        score_cache = (ScoreCache(score_cache_entries, score_cache_ttl, score_cache_path)
+                       if score_cache_entries > 0 else None)
+        ensemble = Ensemble(ensemble_members, ensemble_rule, shadows, shadow_log)
+        service = ScoringService(model_dir=model_dir, batcher=batcher, score_cache=score_cache,
+                                 ensemble=ensemble)
+        servers = []
+        for kind, sock in sockets:
+            if kind == "http":
+                server = ScoringHTTPServer(sock.getsockname(), service, sock=sock)
+            else:
+                server = ScoringUnixServer(unix_path, service, sock=sock)
+            # Join in-flight request threads on shutdown
+            server.daemon_threads = False
+            servers.append(server)
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers]
+        for thread in threads:
+            thread.start()
+        ready()
+        stop.wait()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        if batcher is not None:
+            batcher.close()
+        ensemble.close()
+        if score_cache is not None:
+            score_cache.close()
+
+    pool = PreforkPool(worker_main, workers, load=load, graceful_timeout=graceful_timeout)
+    stop = threading.Event()
+    roll = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGHUP, lambda signum, frame: roll.set())
+
+    pool.start()
+    served_version = (registry.current_version(), registry.current_version("autoencoder"))
+    next_report = time.monotonic()
+    try:
+        while not stop.wait(poll_interval):
+            pool.reap()
+            version = (registry.current_version(), registry.current_version("autoencoder"))
+            if roll.is_set() or version != served_version:
+                logger.info(f"Rolling scoring workers from version {served_version} to {version}")
+                roll.clear()
+                served_version = version
+                pool.roll()
+            if memory_interval and time.monotonic() >= next_report:
+                next_report = time.monotonic() + memory_interval
+                log_memory(pool.stats(), stats_file)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Shutting down scoring workers")
+        pool.stop()
+        for _, sock in sockets:
+            sock.close()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
@@ -1,11 +1,17 @@
 package main
 
 import (
+	"bufio"
 	"bytes"
+	"context"
+	"encoding/binary"
 	"encoding/json"
 	"fmt"
+	"io"
 	"log"
+	"math"
 	"math/rand"
+	"net"
 	"net/http"
 	"os"
 	"os/exec"
@@ -41,6 +47,9 @@ type FraudResponse struct {
 	IsFraud       bool                   `json:"is_fraud"`
 	ModelType     string                 `json:"model_type,omitempty"`
 	ModelVersion  string                 `json:"model_version,omitempty"`
+	Status        string                 `json:"status,omitempty"`
+	Fallback      bool                   `json:"fallback,omitempty"`
+	FallbackReason string                `json:"fallback_reason,omitempty"`
 	Error         string                 `json:"error,omitempty"`
 }
 
@@ -80,6 +89,24 @@ func ProcessTransaction(tx Transaction, modelType string, modelVersion string) (
 		"distance_to_recipient_km": tx.DistanceToRecipientKm,
 	}
 
+	// Account ids and payment time let the scorer's feature store fill in
+	// and update the sender's history
+	if tx.SenderID != "" && tx.RecipientID != "" {
+		features["sender_id"] = tx.SenderID
+		features["recipient_id"] = tx.RecipientID
+		features["timestamp"] = transactionTime(tx)
+
+		// Values sent on the request take precedence over the store's, so
+		// unset (zero) behavioural features are left for it to fill in
+		if scorerFeatureStore {
+			for _, name := range storeFeatureNames {
+				if features[name] == 0.0 {
+					delete(features, name)
+				}
+			}
+		}
+	}
+
 	// Add additional features if available
 	if tx.UserAccountAgeDays > 0 {
 		features["user_account_age_days"] = tx.UserAccountAgeDays
@@ -97,6 +124,12 @@ func ProcessTransaction(tx Transaction, modelType string, modelVersion string) (
 		"model_type":   modelType,
 		"model_version": modelVersion,
 	}
+	// Lets the scorer answer a retried transaction from its score cache
+	if tx.ID != "" {
+		requestPayload["transaction_id"] = tx.ID
+	}
+	// The async scorer answers with a fallback before our own timeout fires
+	requestPayload["timeout_ms"] = scorerDeadline.Milliseconds()
 
 	// Use circuit breaker to prevent cascading failures
 	result, err := CircuitBreakers.MLModel.Execute(func() (interface{}, error) {
@@ -109,13 +142,22 @@ func ProcessTransaction(tx Transaction, modelType string, modelVersion string) (
 	}
 
 	response := result.(*FraudResponse)
+	if response.Error != "" {
+		return nil, fmt.Errorf("ML model error: %s", response.Error)
+	}
 
 	// Update the transaction with fraud results
 	tx.FraudScore = response.FraudScore
 	tx.ModelType = response.ModelType
 	tx.ModelVersion = response.ModelVersion
 
-	if response.IsFraud {
+	if response.Fallback {
+		log.Printf("Transaction %s scored by fallback (%s)", tx.ID, response.FallbackReason)
+	}
+	if response.Status == "review" {
+		// No score was available in time; hold the payment for manual review
+		tx.Status = "review"
+	} else if response.IsFraud {
 		tx.Status = "flagged"
 	} else {
 		tx.Status = "completed"
@@ -130,20 +172,248 @@ func ProcessTransaction(tx Transaction, modelType string, modelVersion string) (
 	return response, nil
 }
 
-// callMLModel executes the Python ML model and returns the result
+// scorerTimeout bounds a single request to the resident scoring server
+const scorerTimeout = 2 * time.Second
+
+// scorerDeadline is the per-request deadline sent to the scorer, leaving
+// time for its fallback answer to arrive within scorerTimeout
+const scorerDeadline = 1500 * time.Millisecond
+
+// predictTimeout bounds a predict.py run, including interpreter startup
+const predictTimeout = 10 * time.Second
+
+var scorerHTTPClient = &http.Client{Timeout: scorerTimeout}
+
+// callMLModel scores the payload with the resident Python scoring server when
+// ML_SCORER_ADDR is set, falling back to running predict.py per transaction
+// only when the server cannot be reached or does not answer in time. An error
+// response from the server is returned as is.
 func callMLModel(requestPayload map[string]interface{}) (*FraudResponse, error) {
 	featuresJSON, err := json.Marshal(requestPayload)
 	if err != nil {
 		return nil, fmt.Errorf("error marshaling features: %v", err)
 	}
 
-	cmd := exec.Command("python3", "ml_model/predict.py")
+	if scorerAddr := os.Getenv("ML_SCORER_ADDR"); scorerAddr != "" {
+		var response *FraudResponse
+		// Binary frames skip the feature store, so they are only sent without one
+		if os.Getenv("ML_SCORER_PROTOCOL") == "binary" && !scorerFeatureStore {
+			response, err = callScoringServerBinary(scorerAddr, requestPayload)
+		} else {
+			response, err = callScoringServer(scorerAddr, featuresJSON)
+		}
+		if err == nil {
+			return response, nil
+		}
+		log.Printf("Scoring server unavailable, falling back to predict.py: %v", err)
+
+		if scorerFeatureStore {
+			// predict.py has no feature store to take these from
+			features, _ := requestPayload["transaction"].(map[string]interface{})
+			for _, name := range storeFeatureNames {
+				if _, ok := features[name]; !ok {
+					features[name] = 0.0
+				}
+			}
+			for _, name := range []string{"user_account_age_days", "recipient_account_age_days"} {
+				if _, ok := features[name]; !ok {
+					features[name] = rand.Float64() * 1000
+				}
+			}
+			if featuresJSON, err = json.Marshal(requestPayload); err != nil {
+				return nil, fmt.Errorf("error marshaling features: %v", err)
+			}
+		}
+	}
+
+	return callPredictScript(featuresJSON)
+}
+
+// callScoringServer sends one request to ml_model/scoring_server.py. The
+// address is either an HTTP base URL (http://127.0.0.1:8500) or a Unix
+// socket speaking line-delimited JSON (unix:///tmp/fraud-scorer.sock), and
+// ml_model/async_scoring.py serves the same framing over TCP as well
+// (tcp://127.0.0.1:8501).
+func callScoringServer(scorerAddr string, featuresJSON []byte) (*FraudResponse, error) {
+	var body []byte
+
+	if network, address, ok := strings.Cut(scorerAddr, "://"); ok && (network == "unix" || network == "tcp") {
+		conn, err := net.DialTimeout(network, address, scorerTimeout)
+		if err != nil {
+			return nil, fmt.Errorf("error connecting to scoring server: %v", err)
+		}
+		defer conn.Close()
+		conn.SetDeadline(time.Now().Add(scorerTimeout))
+
+		if _, err := conn.Write(append(featuresJSON, '\n')); err != nil {
+			return nil, fmt.Errorf("error writing to scoring server: %v", err)
+		}
+		body, err = bufio.NewReader(conn).ReadBytes('\n')
+		if err != nil {
+			return nil, fmt.Errorf("error reading from scoring server: %v", err)
+		}
+	} else {
+		resp, err := scorerHTTPClient.Post(strings.TrimRight(scorerAddr, "/")+"/score", "application/json", bytes.NewReader(featuresJSON))
+		if err != nil {
+			return nil, fmt.Errorf("error calling scoring server: %v", err)
+		}
+		defer resp.Body.Close()
+
+		var buf bytes.Buffer
+		if _, err := buf.ReadFrom(resp.Body); err != nil {
+			return nil, fmt.Errorf("error reading from scoring server: %v", err)
+		}
+		body = buf.Bytes()
+	}
+
+	// An error field is the scorer's answer, not a failure to reach it
+	var response FraudResponse
+	if err := json.Unmarshal(body, &response); err != nil {
+		return nil, fmt.Errorf("error parsing scoring server response: %v", err)
+	}
+
+	return &response, nil
+}
+
+// scorerFeatureNames is the column order of binary frames, FEATURE_NAMES in
+// ml_model/fraud_detection.py
+var scorerFeatureNames = []string{
+	"amount", "hour_of_day", "time_since_last_tx", "recipient_frequency",
+	"distance_to_recipient_km", "user_account_age_days",
+	"recipient_account_age_days", "is_foreign_transaction",
+}
+
+// Frame layout constants, see ml_model/wire_protocol.py
+const (
+	frameRequestMagic  = "FRQ1"
+	frameResponseMagic = "FRS1"
+	frameContentType   = "application/x-fraud-frame"
+	frameFlagFraud     = 1
+	frameFlagInvalid   = 2
+)
+
+// encodeScoringFrame packs the payload's transaction as one float64 row of a
+// binary request frame. A feature missing from the transaction is sent as NaN,
+// which the scorer reports as an invalid row.
+func encodeScoringFrame(requestPayload map[string]interface{}) []byte {
+	features, _ := requestPayload["transaction"].(map[string]interface{})
+	modelType, _ := requestPayload["model_type"].(string)
+	modelVersion, _ := requestPayload["model_version"].(string)
+
+	header := 8 + 12 + len(modelType) + len(modelVersion)
+	records := (header + 7) &^ 7
+	frame := make([]byte, records+8*len(scorerFeatureNames))
+	copy(frame, frameRequestMagic)
+	binary.LittleEndian.PutUint32(frame[4:], uint32(len(frame)-8))
+	frame[8] = 8
+	frame[9] = byte(len(modelType))
+	frame[10] = byte(len(modelVersion))
+	binary.LittleEndian.PutUint32(frame[12:], 1)
+	binary.LittleEndian.PutUint16(frame[16:], uint16(len(scorerFeatureNames)))
+	copy(frame[20:], modelType)
+	copy(frame[20+len(modelType):], modelVersion)
+
+	for i, name := range scorerFeatureNames {
+		value := math.NaN()
+		switch v := features[name].(type) {
+		case float64:
+			value = v
+		case int:
+			value = float64(v)
+		}
+		binary.LittleEndian.PutUint64(frame[records+8*i:], math.Float64bits(value))
+	}
+	return frame
+}
+
+// decodeScoringFrame reads a binary response frame for a single row. An error
+// frame or an invalid row comes back as a response with Error set.
+func decodeScoringFrame(reader io.Reader, modelType string) (*FraudResponse, error) {
+	prefix := make([]byte, 8)
+	if _, err := io.ReadFull(reader, prefix); err != nil {
+		return nil, fmt.Errorf("error reading from scoring server: %v", err)
+	}
+	if string(prefix[:4]) != frameResponseMagic {
+		return nil, fmt.Errorf("unexpected scoring server frame %q", prefix[:4])
+	}
+	body := make([]byte, binary.LittleEndian.Uint32(prefix[4:]))
+	if _, err := io.ReadFull(reader, body); err != nil {
+		return nil, fmt.Errorf("error reading from scoring server: %v", err)
+	}
+	if len(body) < 8 {
+		return nil, fmt.Errorf("short scoring server frame")
+	}
+
+	status := body[0]
+	textLength := int(binary.LittleEndian.Uint16(body[2:]))
+	rows := int(binary.LittleEndian.Uint32(body[4:]))
+	if len(body) < 8+textLength+2*rows {
+		return nil, fmt.Errorf("short scoring server frame")
+	}
+	text := string(body[8 : 8+textLength])
+	if status != 0 {
+		return &FraudResponse{ModelType: modelType, Error: text}, nil
+	}
+	if rows != 1 {
+		return nil, fmt.Errorf("scoring server returned %d rows for one transaction", rows)
+	}
+	score, flags := body[8+textLength], body[8+textLength+1]
+	if flags&frameFlagInvalid != 0 {
+		return &FraudResponse{ModelType: modelType, Error: "invalid transaction features"}, nil
+	}
+
+	return &FraudResponse{
+		FraudScore:   int(score),
+		IsFraud:      flags&frameFlagFraud != 0,
+		ModelType:    modelType,
+		ModelVersion: text,
+	}, nil
+}
+
+// callScoringServerBinary is callScoringServer with binary frames in place of
+// JSON (ML_SCORER_PROTOCOL=binary). scoring_server.py accepts them over HTTP
+// and its Unix socket; async_scoring.py only speaks JSON.
+func callScoringServerBinary(scorerAddr string, requestPayload map[string]interface{}) (*FraudResponse, error) {
+	frame := encodeScoringFrame(requestPayload)
+	modelType, _ := requestPayload["model_type"].(string)
+
+	if network, address, ok := strings.Cut(scorerAddr, "://"); ok && (network == "unix" || network == "tcp") {
+		conn, err := net.DialTimeout(network, address, scorerTimeout)
+		if err != nil {
+			return nil, fmt.Errorf("error connecting to scoring server: %v", err)
+		}
+		defer conn.Close()
+		conn.SetDeadline(time.Now().Add(scorerTimeout))
+
+		if _, err := conn.Write(frame); err != nil {
+			return nil, fmt.Errorf("error writing to scoring server: %v", err)
+		}
+		return decodeScoringFrame(bufio.NewReader(conn), modelType)
+	}
+
+	resp, err := scorerHTTPClient.Post(strings.TrimRight(scorerAddr, "/")+"/score", frameContentType, bytes.NewReader(frame))
+	if err != nil {
+		return nil, fmt.Errorf("error calling scoring server: %v", err)
+	}
+	defer resp.Body.Close()
+	return decodeScoringFrame(resp.Body, modelType)
+}
+
+// callPredictScript executes the Python ML model once and returns the result
+func callPredictScript(featuresJSON []byte) (*FraudResponse, error) {
+	ctx, cancel := context.WithTimeout(context.Background(), predictTimeout)
+	defer cancel()
+
+	cmd := exec.CommandContext(ctx, "python3", "ml_model/predict.py")
 	cmd.Stdin = bytes.NewBuffer(featuresJSON)
 	var stdout, stderr bytes.Buffer
 	cmd.Stdout = &stdout
 	cmd.Stderr = &stderr
 
-	err = cmd.Run()
+	err := cmd.Run()
+	if ctx.Err() == context.DeadlineExceeded {
+		return nil, fmt.Errorf("ML model timed out after %v", predictTimeout)
+	}
 	if err != nil {
 		log.Printf("Error running ML model: %v\nStderr: %s", err, stderr.String())
 		return nil, fmt.Errorf("error running ML model: %v", err)
@@ -158,16 +428,39 @@ func callMLModel(requestPayload map[string]interface{}) (*FraudResponse, error)
 	return &response, nil
 }
 
+// scorerFeatureStore is set (ML_SCORER_FEATURE_STORE=1) when the scoring
+// server runs with --feature-store. Account ages are then left to the ages it
+// stores per account, since values sent on the request take precedence.
+var scorerFeatureStore = os.Getenv("ML_SCORER_ADDR") != "" && os.Getenv("ML_SCORER_FEATURE_STORE") == "1"
+
+// storeFeatureNames are the behavioural features the scorer's feature store
+// derives from the sender's history and the payment time
+var storeFeatureNames = []string{
+	"hour_of_day", "time_since_last_tx", "recipient_frequency", "distance_to_recipient_km",
+}
+
+// transactionTime returns the payment time in epoch seconds, from the RFC 3339
+// date when it has one and otherwise now
+func transactionTime(tx Transaction) float64 {
+	if date, err := time.Parse(time.RFC3339, tx.Date); err == nil {
+		return float64(date.UnixNano()) / 1e9
+	}
+	return float64(time.Now().UnixNano()) / 1e9
+}
+
 // enrichTransactionFeatures adds derived features that might help fraud detection
 func enrichTransactionFeatures(tx *Transaction) {
-	// If account age not provided, generate reasonable values
-	if tx.UserAccountAgeDays == 0 {
-		// Generate a random value - in production, this would come from a database
-		tx.UserAccountAgeDays = rand.Float64() * 1000
-	}
+	// If account age not provided, generate reasonable values, unless the
+	// scorer's feature store has the real ones
+	if !scorerFeatureStore {
+		if tx.UserAccountAgeDays == 0 {
+			// Generate a random value - in production, this would come from a database
+			tx.UserAccountAgeDays = rand.Float64() * 1000
+		}
 
-	if tx.RecipientAccountAgeDays == 0 {
-		tx.RecipientAccountAgeDays = rand.Float64() * 1000
+		if tx.RecipientAccountAgeDays == 0 {
+			tx.RecipientAccountAgeDays = rand.Float64() * 1000
+		}
 	}
 
 	// If foreign transaction flag not set, determine based on IDs